@@ -0,0 +1,301 @@
+import os
+import pickle
+
+import numpy as np
+
+from conversion_factors import file_checksum
+from footprint import CATEGORIES, CATEGORY_ACTIVITIES, FootprintEngine
+from imputation import impute, masked
+from instrumentation import stage
+from units import CONVERSIONS, unit_code, unit_codes
+
+# Workbook with every person's survey answers and the emissions worked out from them
+DEFAULT_ACTIVITY_WORKBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DIY Carbon Footprint.xlsx')
+
+# Bump whenever the layout of the cached store changes
+STORE_VERSION = 1
+
+# People shown in the group charts (the workbook can hold more person sheets)
+GROUP = ['Jonathan', 'Connor', 'Agnel']
+
+# Columns of the store: text columns are categorical codes into a dictionary of distinct strings.
+# 'text' holds non-numeric answers such as the car type or fuel ('' for numeric ones).
+TEXT_COLUMNS = ['person', 'section', 'activity', 'measure', 'unit', 'text']
+
+# Section of each person sheet holding the worked-out emissions, and the measure they are stored under
+EMISSIONS_SECTION = 'Annual Carbon Footprint'
+EMISSIONS_MEASURE = 'kg CO2e'
+
+# Sections where column C names the activity ('Shower'); in the others column B names the activity
+# ('Car') and column C what was measured about it ('Distance Travelled')
+ITEM_SECTIONS = ['Setup', 'Household']
+
+# Measure used for answers that are the quantity itself (Household and Setup rows)
+INPUT_MEASURE = 'Input'
+
+# Workbook wording -> activity names used by the charts
+ACTIVITY_ALIASES = {
+    'Dishwasher': 'Cleaning Dishes',
+    'Cleaning Usage (Dishes)': 'Cleaning Dishes',
+    'Other - Fish Tank Water Change': 'Fish Tank',
+}
+
+# Category totals use the water emissions from the emissions section, which the workbook only gives as a whole
+CATEGORY_EMISSIONS = {
+    'Residential Energy': CATEGORY_ACTIVITIES['Residential Energy'],
+    'Water': ['Water'],
+    'Transport': ['Car', 'Train'],
+    'Diet': CATEGORY_ACTIVITIES['Diet'],
+}
+
+
+# Columnar store of survey answers: one numpy array per column plus the dictionaries behind the codes
+class ActivityStore:
+    def __init__(self, columns, categories):
+        self.columns = columns  # Column name -> numpy array (codes for text columns, float64 'value')
+        self.categories = categories  # Text column name -> list of distinct strings
+        self._codes = {column: {text: code for code, text in enumerate(values)}
+                       for column, values in categories.items()}
+
+    def __len__(self):
+        return len(self.columns['value'])
+
+    # People in the order their sheets appear in the workbook
+    @property
+    def people(self):
+        return list(self.categories['person'])
+
+    # Boolean mask of the rows matching every given column value
+    def select(self, **wanted):
+        mask = np.ones(len(self), dtype=bool)
+        for column, text in wanted.items():
+            code = self._codes[column].get(text)
+            if code is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.columns[column] == code
+        return mask
+
+    # (people x activities) matrix of one section/measure. Answers left as '-' are NaN (missing data);
+    # activities a person has no row for get absent. With a unit, every answer is converted to it from the unit on
+    # its own row; answers in a unit that can't be converted raise a ValueError.
+    def matrix(self, section, measure, people=None, activities=None, absent=0.0, unit=None):
+        people = self.people if people is None else list(people)
+        rows = np.flatnonzero(self.select(section=section, measure=measure))
+        if activities is None:
+            activities = list(dict.fromkeys(self.categories['activity'][code]
+                                            for code in self.columns['activity'][rows]))
+
+        # Map codes to matrix positions (-1 = not asked for) and scatter every matching row in one go
+        person_position = np.full(len(self.categories['person']), -1, dtype=np.intp)
+        for i, name in enumerate(people):
+            code = self._codes['person'].get(name)
+            if code is None:
+                raise KeyError(f'No sheet for {name}')
+            person_position[code] = i
+        activity_position = np.full(len(self.categories['activity']), -1, dtype=np.intp)
+        for j, activity in enumerate(activities):
+            code = self._codes['activity'].get(activity)
+            if code is not None:
+                activity_position[code] = j
+
+        i = person_position[self.columns['person'][rows]]
+        j = activity_position[self.columns['activity'][rows]]
+        keep = (i >= 0) & (j >= 0)
+        values = self.columns['value'][rows[keep]]
+        if unit is not None:
+            # Only the units in use are looked up, then every answer is converted in one multiply
+            used, positions = np.unique(self.columns['unit'][rows[keep]], return_inverse=True)
+            factors = CONVERSIONS[unit_codes([self.categories['unit'][code] for code in used.tolist()]),
+                                  unit_code(unit)]
+            if np.isnan(factors).any():
+                wrong = [self.categories['unit'][code] for code in used[np.isnan(factors)].tolist()]
+                raise ValueError(f'Cannot convert {", ".join(wrong)} to {unit}')
+            values = values * factors[positions.reshape(-1)]
+        result = np.full((len(people), len(activities)), absent, dtype=np.float64)
+        result[i[keep], j[keep]] = values
+        return people, list(activities), result
+
+    # Quantities from the Household section (kWh, litres ...), in their own units unless one is given
+    def inputs(self, people=None, activities=None, unit=None):
+        return self.matrix('Household', INPUT_MEASURE, people, activities, unit=unit)
+
+    # Worked-out emissions in kgCO₂e, or the emissions unit given
+    def emissions(self, people=None, activities=None, unit=None):
+        return self.matrix(EMISSIONS_SECTION, EMISSIONS_MEASURE, people, activities, unit=unit)
+
+    # Emissions per footprint category in tCO₂e (people x CATEGORIES) as a masked array. Missing answers are filled
+    # in by the imputation policy (see imputation.impute); with policy None a category with a missing answer is
+    # masked.
+    @stage('aggregation')
+    def category_totals(self, people=None, policy='zero', defaults=None):
+        activities = [activity for category in CATEGORIES for activity in CATEGORY_EMISSIONS[category]]
+        categories = [category for category in CATEGORIES for _ in CATEGORY_EMISSIONS[category]]
+        names, _, emissions = self.emissions(people, activities)
+        emissions = masked(emissions) if policy is None else impute(emissions, policy, activities, defaults)
+        engine = FootprintEngine(activities, categories=categories)
+        return names, engine.category_totals(emissions)
+
+    # The store as a pyarrow Table with dictionary-encoded text columns (needs pyarrow)
+    def to_arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError('Arrow export requires pyarrow (pip install pyarrow)') from e
+
+        arrays = {column: pa.DictionaryArray.from_arrays(self.columns[column], self.categories[column])
+                  for column in TEXT_COLUMNS}
+        arrays['value'] = pa.array(self.columns['value'])
+        return pa.table(arrays)
+
+
+# Helper function to turn a cell into a clean string
+def _clean(cell):
+    if cell is None:
+        return ''
+    return ' '.join(str(cell).split())
+
+
+# Parse the left-hand table of every person sheet into flat records
+# (person, section, activity, measure, unit, value, text); the working-out tables on the right are skipped
+def parse_activity_workbook(path=DEFAULT_ACTIVITY_WORKBOOK):
+    import openpyxl  # Only needed on a cache miss
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    records = []
+    try:
+        for person in workbook.sheetnames:
+            rows = list(workbook[person].iter_rows(max_col=5, values_only=True))
+            if not rows or _clean(rows[0][0]) != 'Setup':
+                continue  # Not a person sheet
+            section = group = ''
+            for row in rows:
+                row = tuple(row) + (None,) * (5 - len(row))
+                heading, column_b, column_c, unit, answer = (_clean(cell) for cell in row[:5])
+                if heading:
+                    section, group = heading, ''
+                    continue
+                if column_b in ('Activity', 'Total') or (not column_b and not column_c):
+                    continue  # Header, total and blank rows
+                if section == EMISSIONS_SECTION:
+                    activity, measure, unit, answer = column_b, EMISSIONS_MEASURE, EMISSIONS_MEASURE, row[2]
+                elif section in ITEM_SECTIONS:
+                    activity, measure, answer = column_c, INPUT_MEASURE, row[4]
+                else:
+                    group = column_b or group  # Merged cells: the activity is only on its first row
+                    activity, measure, answer = group, column_c, row[4]
+                if not column_c and section != EMISSIONS_SECTION:
+                    continue  # Column-header rows ('Units', 'Input')
+
+                activity = ACTIVITY_ALIASES.get(activity, activity)
+                if isinstance(answer, (int, float)) and not isinstance(answer, bool):
+                    value, text = float(answer), ''
+                else:
+                    text = _clean(answer)
+                    value, text = np.nan, ('' if text == '-' else text)  # '-' = not answered
+                records.append((person, section, activity, measure, '' if unit == '-' else unit, value, text))
+    finally:
+        workbook.close()
+    return records
+
+
+# Convert parsed records into column arrays with a dictionary per text column
+def build_store(records):
+    columns, categories = {}, {}
+    for position, column in enumerate(TEXT_COLUMNS[:-1]):
+        lookup = {}
+        columns[column] = np.fromiter((lookup.setdefault(record[position], len(lookup)) for record in records),
+                                      dtype=np.int32, count=len(records))
+        categories[column] = list(lookup)
+    lookup = {'': 0}
+    columns['text'] = np.fromiter((lookup.setdefault(record[6], len(lookup)) for record in records),
+                                  dtype=np.int32, count=len(records))
+    categories['text'] = list(lookup)
+    columns['value'] = np.fromiter((record[5] for record in records), dtype=np.float64, count=len(records))
+    return ActivityStore(columns, categories)
+
+
+# Default cache file sits next to the workbook
+def default_cache_path(workbook_path):
+    return workbook_path + '.activities.cache'
+
+
+# Load the store, re-parsing the workbook only when its mtime and checksum changed
+def load_activities(path=DEFAULT_ACTIVITY_WORKBOOK, cache_path=None):
+    if cache_path is None:
+        cache_path = default_cache_path(path)
+    stat = os.stat(path)
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        cached = None
+
+    if cached is not None and cached.get('version') == STORE_VERSION:
+        if cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+            return ActivityStore(cached['columns'], cached['categories'])
+        checksum = file_checksum(path)
+        if cached['checksum'] == checksum:
+            cached['mtime_ns'], cached['size'] = stat.st_mtime_ns, stat.st_size
+            _write_cache(cache_path, cached)
+            return ActivityStore(cached['columns'], cached['categories'])
+    else:
+        checksum = file_checksum(path)
+
+    store = build_store(parse_activity_workbook(path))
+    _write_cache(cache_path, {
+        'version': STORE_VERSION,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'checksum': checksum,
+        'columns': store.columns,
+        'categories': store.categories,
+    })
+    return store
+
+
+# Write the cache atomically so concurrent jobs never read a half-written file
+def _write_cache(cache_path, payload):
+    tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # A read-only checkout still works, it just re-parses every time
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Store loaded once per process for the chart modules
+_group_store = None
+
+
+# The nested {'Jonathan': {'Shower': ...}} dictionary the chart modules plot, read from the workbook.
+# kind is 'inputs' (quantities) or 'emissions' (kgCO₂e), converted to unit when one is given (see units.py);
+# missing answers come back as None unless an imputation policy fills them in.
+def group_data(kind, activities, people=GROUP, scale=1.0, policy=None, defaults=None, unit=None):
+    global _group_store
+    if _group_store is None:
+        _group_store = load_activities()
+    names, _, matrix = getattr(_group_store, kind)(people, activities, unit)
+    values = masked(matrix) if policy is None else impute(matrix, policy, activities, defaults)
+    return {name: dict(zip(activities, row)) for name, row in zip(names, (values * scale).tolist())}
+
+
+# Per-person category totals in tCO₂e as {'Jonathan': [energy, water, transport, diet]}; None for a category
+# left missing
+def group_category_totals(people=GROUP, policy='zero', defaults=None):
+    global _group_store
+    if _group_store is None:
+        _group_store = load_activities()
+    names, totals = _group_store.category_totals(people, policy, defaults)
+    return {name: row for name, row in zip(names, totals.tolist())}
+
+
+if __name__ == '__main__':
+    store = load_activities()
+    print(f'{len(store)} answers from {len(store.people)} people: {", ".join(store.people)}')
+    names, totals = store.category_totals()
+    for name, row in zip(names, totals):
+        print(f'{name}: ' + ', '.join(f'{category} {value:.3f} t' for category, value in zip(CATEGORIES, row)))
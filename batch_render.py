@@ -0,0 +1,159 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chart_spec import CHART_SPECS, chart_files
+from instrumentation import METRICS, stage
+
+# Every chart the project produces, keyed by chart type (see chart_spec.py)
+CHARTS = CHART_SPECS
+
+# Cohort name used for the data hard-coded in the chart modules
+DEFAULT_COHORT = 'group'
+
+# Per-worker pool of reusable figures (only used in pooled mode)
+_figure_pool = None
+
+# Per-worker render caches, keyed by cache directory
+_render_caches = {}
+
+
+# Source files of the code in a module: the module itself plus the project modules it imports from
+def _source_files(module):
+    root = os.path.dirname(os.path.abspath(__file__))
+    names = {getattr(value, '__module__', None) for value in vars(module).values()} | {module.__name__}
+    files = set()
+    for name in names:
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path and os.path.dirname(os.path.abspath(path)) == root:
+            files.add(path)
+    return sorted(files)
+
+
+# Runs once in every worker process: render off-screen, never open a window
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+# Render one (chart type, cohort) job into output_dir/cohort and return how long it took.
+# Cohorts larger than a page are drawn page by page (see chart_spec.chart_files for the file names).
+# In pooled mode, each worker reuses one compiled figure per chart type instead of building a new one.
+# With a cache_dir, outputs whose data, spec and drawing code are unchanged are copied from the render cache.
+def render_job(chart, cohort, data=None, output_dir='charts', pooled=False, cache_dir=None,
+               cache_size=None):
+    global _figure_pool
+    from figure_pool import FigurePool, render_pages
+    from render_cache import DEFAULT_MAX_BYTES, RenderCache, cache_key
+
+    spec = CHARTS[chart]
+    if data is None:
+        data = importlib.import_module(spec['module']).load_data()  # The values the module charts
+
+    cohort_dir = os.path.join(output_dir, cohort)
+    os.makedirs(cohort_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    pooled = pooled and FigurePool.supports(chart)
+    files = chart_files(chart, len(data))
+    key = cache = None
+    if cache_dir is not None:
+        cache = _render_caches.get(cache_dir)
+        if cache is None:
+            cache = _render_caches[cache_dir] = RenderCache(cache_dir, cache_size or DEFAULT_MAX_BYTES)
+        sources = _source_files(sys.modules['figure_pool'])
+        key = cache_key(chart, data, dict(spec, pooled=pooled), sources)
+        with stage('write'):
+            if cache.fetch(key, cohort_dir, files) is not None:
+                return chart, cohort, time.perf_counter() - start
+
+    if pooled and _figure_pool is None:
+        _figure_pool = FigurePool()
+    # Without a pool each job's figures are closed straight away, since workers render thousands of them
+    for _ in render_pages(chart, data, cohort_dir, _figure_pool if pooled else None):
+        pass
+
+    if cache is not None:
+        with stage('write'):
+            cache.store(key, [os.path.join(cohort_dir, name) for name in files])
+    return chart, cohort, time.perf_counter() - start
+
+
+# Run render_job (job is its argument tuple) and return its result with the stage counters of the job, for the
+# parent process to merge. With a profile_dir the job is run under cProfile and its statistics are dumped there;
+# trace_memory adds allocation peaks to the counters.
+def instrumented_job(job, profile_dir=None, trace_memory=False):
+    METRICS.reset()
+    if trace_memory != METRICS.memory:
+        METRICS.trace_memory(trace_memory)
+    if profile_dir is None:
+        result = render_job(*job)
+    else:
+        chart, cohort = job[:2]
+        with METRICS.profile(os.path.join(profile_dir, f'{cohort}.{chart}.{os.getpid()}.prof')):
+            result = render_job(*job)
+    return result, METRICS.snapshot()
+
+
+# One job per chart type for a cohort; data maps chart type -> that chart's data (missing = module data)
+def cohort_jobs(cohort, data=None, charts=None):
+    data = data or {}
+    return [(chart, cohort, data.get(chart)) for chart in (charts or CHARTS)]
+
+
+# Render every job across a process pool, yielding (chart, cohort, seconds) as each one finishes.
+# With instrument, the workers' stage counters are merged into this process's METRICS (see instrumented_job).
+def render_batch(jobs, output_dir='charts', max_workers=None, pooled=False, cache_dir=None, cache_size=None,
+                 instrument=False, profile_dir=None, trace_memory=False):
+    os.environ.setdefault('MPLBACKEND', 'Agg')  # Also covers start methods that re-import this module
+    instrument = instrument or profile_dir is not None or trace_memory
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+        futures = []
+        for chart, cohort, data in jobs:
+            job = (chart, cohort, data, output_dir, pooled, cache_dir, cache_size)
+            if instrument:
+                futures.append(executor.submit(instrumented_job, job, profile_dir, trace_memory))
+            else:
+                futures.append(executor.submit(render_job, *job))
+        for future in as_completed(futures):
+            result = future.result()
+            if instrument:
+                result, snapshot = result
+                METRICS.merge(snapshot)
+            yield result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render every chart headlessly across all cores.')
+    parser.add_argument('output_dir', nargs='?', default='charts', help='directory for the PNG/SVG outputs')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--charts', nargs='*', choices=sorted(CHARTS), help='only render these chart types')
+    parser.add_argument('--pooled', action='store_true', help='reuse pre-laid-out figures between outputs')
+    parser.add_argument('--cache', help='render cache directory; unchanged charts are copied from it')
+    parser.add_argument('--cache-size', type=int, default=2048, help='render cache size limit in MB')
+    parser.add_argument('--metrics', help='write per-stage timings to this file (Prometheus text if it ends in '
+                                          '.prom, JSON otherwise)')
+    parser.add_argument('--profile', metavar='DIR', help='cProfile every job and dump the statistics to DIR')
+    parser.add_argument('--trace-memory', action='store_true', help='also record per-stage allocation peaks')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    jobs = cohort_jobs(DEFAULT_COHORT, charts=args.charts)
+    for chart, cohort, seconds in render_batch(jobs, args.output_dir, args.workers, args.pooled,
+                                                 args.cache, args.cache_size * 1024 ** 2, args.metrics is not None,
+                                                 args.profile, args.trace_memory):
+        print(f'{cohort}/{chart}: {seconds:.2f}s')
+    elapsed = time.perf_counter() - start
+    print(f'Rendered {len(jobs)} charts in {elapsed:.2f}s')
+
+    if args.metrics:
+        for name, values in METRICS.snapshot().items():
+            print(f'  {name:<14} {values["calls"]:>6} calls  {values["seconds"]:8.3f}s')
+        with open(args.metrics, 'w') as f:
+            if args.metrics.endswith('.prom'):
+                f.write(METRICS.to_prometheus())
+            else:
+                f.write(METRICS.to_json(jobs=len(jobs), seconds=elapsed))
@@ -0,0 +1,244 @@
+import argparse
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+
+from footprint import CATEGORY_ACTIVITIES
+
+# Cohort sizes benchmarked by default: the survey group, a town, a region and a national survey wave
+COHORT_SIZES = [3, 1_000, 100_000, 1_000_000]
+
+# Share of synthetic answers left blank (missing data)
+MISSING_RATE = 0.02
+
+# People per pie/bar figure, as in the chart modules
+PEOPLE_PER_FIGURE = 3
+
+# Layout is timed on at most this many figures per cohort and projected to the rest
+MAX_LAYOUT_FIGURES = 200
+
+# Timing runs aim to last at least this long, so short calls are repeated within one run
+MIN_RUN_SECONDS = 0.02
+
+
+# Time function(*args): the best and mean seconds per call over repeat runs
+def timed(function, *args, repeat=5):
+    def run(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        return time.perf_counter() - start
+
+    number = 1
+    seconds = run(number)
+    while seconds < MIN_RUN_SECONDS and number < 1_000_000:
+        number *= 10
+        seconds = run(number)
+    runs = [seconds / number] + [run(number) / number for _ in range(repeat - 1)]
+    return {'best': min(runs), 'mean': sum(runs) / len(runs), 'number': number, 'repeat': repeat}
+
+
+# Synthetic cohort around the survey group: each activity varies log-normally around the group's mean
+# and a few answers are missing. Returns the group's engine, names and quantities.
+def synthetic_cohort(people, seed=0):
+    from footprint_graph import group_cohort
+
+    engine, _, group = group_cohort()
+    rng = np.random.default_rng(seed)
+    typical = np.nanmean(group, axis=0)
+    quantities = typical * rng.lognormal(0.0, 0.5, (people, len(typical)))
+    quantities[rng.random(quantities.shape) < MISSING_RATE] = np.nan
+    names = [f'Person {i}' for i in range(people)]
+    return engine, names, quantities
+
+
+# Factor table load (from its cache), attach (shared memory-mapped export) and single lookups;
+# skipped when the workbook is not there
+def bench_factors(repeat=5):
+    import conversion_factors
+    from conversion_factors import ACTIVITY_FACTORS, DEFAULT_WORKBOOK, load_factors, shared_factors
+
+    if not os.path.exists(DEFAULT_WORKBOOK):
+        return {'skipped': f'{os.path.basename(DEFAULT_WORKBOOK)} not found'}
+    table = load_factors()  # Builds the cache on the first run
+    shared_factors()  # Writes the shared export on the first run
+
+    def attach():
+        conversion_factors._attached.clear()
+        shared_factors()
+
+    return {
+        'load': timed(load_factors, repeat=repeat),
+        'attach': timed(attach, repeat=repeat),
+        'lookup': timed(table.activity_factor, 'Electricity', repeat=repeat),
+        'activity_factors': timed(lambda: [table.activity_factor(name) for name in ACTIVITY_FACTORS],
+                                  repeat=repeat),
+    }
+
+
+# Footprint aggregation for a whole cohort: per-activity, per-category and per-person totals
+def bench_aggregation(engine, quantities, repeat=5):
+    result = {
+        'score': timed(engine.score, quantities, repeat=repeat),
+        'category_totals': timed(engine.category_totals, quantities, repeat=repeat),
+    }
+    result['people_per_second'] = len(quantities) / result['score']['best']
+    return result
+
+
+# Wedge angles and label anchors of one diet pie per person, computed from the value matrix in one go
+def bench_pie_geometry(quantities, activities, repeat=5):
+    from pie_geometry import PieGeometry
+
+    diet = quantities[:, [activities.index(activity) for activity in CATEGORY_ACTIVITIES['Diet']]]
+    result = timed(PieGeometry, diet, repeat=repeat)
+    result['pies_per_second'] = len(diet) / result['best']
+    return result
+
+
+# Label layout of the diet pies: wedge geometry and label placement for each figure, without drawing it.
+# Large cohorts are timed on the first MAX_LAYOUT_FIGURES figures and projected to the whole cohort.
+def bench_label_layout(names, quantities, activities, repeat=3):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from figure_pool import PieTemplate
+
+    columns = [activities.index(activity) for activity in CATEGORY_ACTIVITIES['Diet']]
+    figures = math.ceil(len(names) / PEOPLE_PER_FIGURE)
+    timed_figures = min(figures, MAX_LAYOUT_FIGURES)
+    batches = []
+    for k in range(timed_figures):
+        rows = range(k * PEOPLE_PER_FIGURE, min((k + 1) * PEOPLE_PER_FIGURE, len(names)))
+        batches.append({names[i]: {activity: (None if np.isnan(quantities[i, j]) else quantities[i, j])
+                                   for activity, j in zip(CATEGORY_ACTIVITIES['Diet'], columns)}
+                        for i in rows})
+
+    template = PieTemplate('diet_pie', PEOPLE_PER_FIGURE)
+    template.update(batches[0])  # First update also lays the figure out
+
+    def layout_all():
+        for batch in batches:
+            template.update(batch)
+
+    result = timed(layout_all, repeat=repeat)
+    plt.close(template.fig)
+    per_figure = result['best'] / timed_figures
+    return dict(result, figures=figures, timed_figures=timed_figures, per_figure=per_figure,
+                projected=per_figure * figures)
+
+
+# Draw every chart from its spec with its module's data, then time PNG and SVG output of the finished figure
+# separately, with SVG both from matplotlib and from svg_writer
+def bench_rendering(charts=None, repeat=3):
+    import importlib
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from chart_spec import CHART_SPECS
+    from figure_pool import render_chart
+    from svg_writer import save_figure
+
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for chart in charts or CHART_SPECS:
+            data = importlib.import_module(CHART_SPECS[chart]['module']).load_data()
+
+            def draw():
+                plt.close(render_chart(chart, data, output_dir))
+
+            fig = render_chart(chart, data, output_dir)
+            results[chart] = {
+                'draw_and_save': timed(draw, repeat=repeat),
+                'png': timed(fig.savefig, os.path.join(output_dir, 'bench.png'), repeat=repeat),
+                'svg': timed(fig.savefig, os.path.join(output_dir, 'bench.svg'), repeat=repeat),
+                'svg_writer': timed(save_figure, fig, [os.path.join(output_dir, 'bench.svg')], repeat=repeat),
+            }
+            plt.close(fig)
+    return results
+
+
+# Run the whole suite and return the results as a JSON-serialisable dictionary
+def run_benchmarks(sizes=None, repeat=5, render=True, factors=True, seed=0):
+    import matplotlib
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'matplotlib': matplotlib.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'cohorts': {},
+    }
+    if factors:
+        results['factors'] = bench_factors(repeat)
+    for people in sizes or COHORT_SIZES:
+        engine, names, quantities = synthetic_cohort(people, seed)
+        results['cohorts'][str(people)] = {
+            'aggregation': bench_aggregation(engine, quantities, repeat),
+            'pie_geometry': bench_pie_geometry(quantities, engine.activities, repeat),
+            'label_layout': bench_label_layout(names, quantities, engine.activities, max(1, repeat // 2)),
+        }
+    if render:
+        results['rendering'] = bench_rendering(repeat=max(1, repeat // 2))
+    return results
+
+
+# Helper function to flatten nested results into {'cohorts/3/aggregation/score': seconds, ...} (best times)
+def _best_times(results, prefix=''):
+    times = {}
+    for key, value in results.items():
+        if key == 'meta' or not isinstance(value, dict):
+            continue
+        if 'best' in value:
+            times[prefix + key] = value['best']
+        else:
+            times.update(_best_times(value, f'{prefix}{key}/'))
+    return times
+
+
+# Compare two result sets: (benchmark, old seconds, new seconds, new / old) for every benchmark in both
+def compare_results(old, new):
+    old_times, new_times = _best_times(old), _best_times(new)
+    return [(name, old_times[name], new_times[name], new_times[name] / old_times[name])
+            for name in sorted(old_times) if name in new_times and old_times[name] > 0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark footprint calculation, label layout and rendering.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=COHORT_SIZES, help='cohort sizes (people)')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per benchmark')
+    parser.add_argument('--output', default='benchmarks.json', help='JSON file for the results')
+    parser.add_argument('--compare', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=1.1, help='slowdown ratio reported as a regression')
+    parser.add_argument('--skip-render', action='store_true', help='leave out PNG/SVG rendering')
+    parser.add_argument('--skip-factors', action='store_true', help='leave out the conversion factor table')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.repeat, not args.skip_render, not args.skip_factors)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Wrote {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+        regressions = 0
+        for name, old, new, ratio in compare_results(previous, results):
+            flag = ''
+            if ratio > args.threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f'{name}: {old * 1e3:.3f} ms -> {new * 1e3:.3f} ms ({ratio:.2f}x){flag}')
+        print(f'{regressions} regression(s) above {args.threshold:.2f}x')
@@ -0,0 +1,161 @@
+import os
+
+from footprint import CATEGORIES, CATEGORY_ACTIVITIES
+
+# Every chart the project draws, described as data: its type, the module holding its default data, the files it
+# writes, and its categories, colors, hatches, layout and missing-data handling. Anything left out comes from the
+# defaults of its type below. Pie label rules: small wedges get an external label with a dashed leader line,
+# larger ones a label inside the wedge.
+CHART_SPECS = {
+    'water_pie': {
+        'type': 'pie', 'module': 'main',
+        'files': ['carbon_footprint_water_consumption.png', 'carbon_footprint_water_consumption.svg'],
+        'title': 'Water Consumption Breakdown',
+        'labels': CATEGORY_ACTIVITIES['Water'],
+        'colors': ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0'],
+        'hatches': ['x', '-', '/', '\\', 'o', '|', '+'],
+        'internal_distance': 0.73, 'min_angle': 15,
+    },
+    'transport_pie': {
+        'type': 'pie', 'module': 'transport',
+        'files': ['carbon_footprint_transport.png', 'carbon_footprint_transport.svg'],
+        'title': 'Transport Breakdown',
+        'labels': CATEGORY_ACTIVITIES['Transport'],
+        'colors': ['#ff9999', '#66b3ff', '#99ff99'],
+        'hatches': ['x', '-', '/'],
+        'hide_zero': True, 'legend_patches': True,
+    },
+    'diet_pie': {
+        'type': 'pie', 'module': 'diet_consumption_pie_chart',
+        'files': ['carbon_footprint_diet.png', 'carbon_footprint_diet.svg'],
+        'title': 'Diet Breakdown',
+        'labels': CATEGORY_ACTIVITIES['Diet'],
+        'colors': ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb3e6', '#c4e17f'],
+        'hatches': ['x', '-', '/', '\\', '|', '+', 'o'],
+        'internal_distance': 0.6, 'skip_pct': 0.1, 'title_y': -0.05,
+        'leader_start': 0.85,
+    },
+    'energy_pie': {
+        'type': 'pie', 'module': 'energy_usage',
+        'files': ['energy_usage_pie_charts.png'],
+        'title': 'Energy Usage',
+        'labels': CATEGORY_ACTIVITIES['Residential Energy'],
+        'colors': ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99'],
+        'hatches': [],
+        'external': False, 'min_angle': 15, 'label_size': 12, 'name_text_size': 16, 'main_title_y': 0.9,
+        'legend_style': {'fontsize': 15},
+    },
+    'energy_pie_no_agnel': {
+        'type': 'pie', 'module': 'energy_usage_no_agnel',
+        'files': ['carbon_footprint_residential_energy_usage.png', 'carbon_footprint_residential_energy_usage.svg'],
+        'title': 'Residential Energy Consumption Breakdown',
+        'labels': ['Heating Oil', 'Electricity'],
+        'colors': ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99'],
+        'hatches': ['x', '-', '/', '\\', '|', '+', 'o'],
+        'figsize': (11, 5), 'page_size': 2,
+    },
+    'category_bar': {
+        'type': 'bar', 'module': 'bar_charts',
+        'files': ['carbon_footprint_comparison.png', 'carbon_footprint_comparison.svg'],
+        'title': 'Carbon Footprint Comparison',
+        'activities': ['Residential\nEnergy', 'Water', 'Transport', 'Diet'], 'keys': CATEGORIES,
+        'colors': ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99'],
+    },
+    'diet_bar': {
+        'type': 'bar', 'module': 'bar_chart_diet',
+        'files': ['carbon_footprint_bar_chart_diet_tonnes.png', 'carbon_footprint_bar_chart_diet_tonnes.svg'],
+        'title': 'Diet Carbon Footprint Comparison',
+        'activities': CATEGORY_ACTIVITIES['Diet'],
+        'colors': ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb3e6', '#c4e17f'],
+        'xlabel': 'Food', 'tick_size': 15, 'value_size': 15,
+    },
+    'energy_bar': {
+        'type': 'bar', 'module': 'bar_chart_residential_energy_consumption',
+        'files': ['carbon_footprint_bar_chart_energy.png', 'carbon_footprint_bar_chart_energy.svg'],
+        'title': 'Residential Energy Consumption Carbon Footprint Comparison',
+        'activities': CATEGORY_ACTIVITIES['Residential Energy'],
+        'colors': ['#ff9999', '#66b3ff'],
+    },
+    'transport_bar': {
+        'type': 'bar', 'module': 'bar_chart_transport',
+        'files': ['carbon_footprint_bar_chart_transport.png', 'carbon_footprint_bar_chart_transport.svg'],
+        'title': 'Transport Carbon Footprint Comparison',
+        'activities': ['Train', 'Car'],
+        'colors': ['#ff9999', '#66b3ff'],
+        'grid': (1, 2), 'figsize': (18, 8), 'zero_ylim': 0.1,
+    },
+    'water_bar': {
+        'type': 'total', 'module': 'bar_chart_water_consumption',
+        'files': ['carbon_footprint_comparison_bar_chart_water.png', 'carbon_footprint_comparison_bar_chart_water.svg'],
+        'title': 'Water Consumption Carbon Footprint Comparison', 'keys': ['Water'],
+        'figsize': (12, 6), 'value_format': '.3f', 'value_size': 18,
+    },
+    'total_bar': {
+        'type': 'total', 'module': 'bar_chart_total',
+        'files': ['carbon_footprint_total_comparison.png', 'carbon_footprint_total_comparison.svg'],
+        'title': 'Total Carbon Footprint Comparison', 'keys': CATEGORIES,
+    },
+}
+
+# Defaults of every chart type. page_size is how many people one figure holds; larger cohorts are drawn
+# over several pages.
+SPEC_DEFAULTS = {
+    # One pie per person in a row, with the legend on the right
+    'pie': {
+        'page_size': 3, 'figsize': (15, 5), 'wedge_gap': 1, 'title_size': 25, 'name_text_size': 20,
+        'title_y': -0.1, 'main_title_y': 0.95, 'label_size': 15, 'min_pct': 5, 'min_angle': 0, 'skip_pct': 0,
+        'internal_distance': 0.75, 'external': True, 'external_distance': 1.2, 'leader_start': 0.9,
+        'label_gap': 0.05, 'hide_zero': False, 'legend_patches': False, 'unavailable_text': 'N/A',
+        'legend_style': {'fontsize': 15, 'handlelength': 2, 'handleheight': 2, 'markerscale': 2},
+    },
+    # A grid with one bar chart per person; None values are drawn as 'N/A'. A page fills the grid. Bars given
+    # confidence intervals get error bars drawn in error_style. keys names the entries of {'activity': value}
+    # rows in bar order when they differ from the bar labels (activities).
+    'bar': {
+        'page_size': None, 'keys': None, 'grid': (2, 2), 'figsize': (18, 12), 'xlabel': 'Activity', 'tick_size': 20,
+        'value_size': 20, 'zero_ylim': None, 'unavailable_text': 'N/A',
+        'error_style': {'color': 'black', 'linewidth': 2, 'markersize': 20, 'markeredgewidth': 2},
+    },
+    # One bar per person with the sum of their values; a sum with a missing value is drawn as 'N/A'. keys names
+    # the entries a {'key': value} row must have (None sums whatever a row holds).
+    'total': {
+        'page_size': 10, 'keys': None, 'figsize': (10, 6), 'colors': ['#ff9999', '#66b3ff', '#99ff99'],
+        'xlabel': 'Group Member', 'value_format': '.2f', 'value_size': 20, 'unavailable_text': 'N/A',
+        'error_style': {'color': 'black', 'linewidth': 2, 'markersize': 20, 'markeredgewidth': 2},
+    },
+}
+
+# Keys describing a chart rather than styling it; they can't be overridden when drawing
+FIXED_KEYS = ['type', 'module', 'files']
+
+
+# Resolve a chart's spec against the defaults of its type. overrides change the styling for one drawing
+# (e.g. title_y=-0.2); unknown keys are refused so typos don't go unnoticed.
+def compile_spec(chart, **overrides):
+    spec = CHART_SPECS.get(chart)
+    if spec is None:
+        raise KeyError(f'Unknown chart: {chart}')
+    options = dict(SPEC_DEFAULTS[spec['type']], **spec)
+    for key in overrides:
+        if key not in options or key in FIXED_KEYS:
+            raise TypeError(f'{chart} has no option {key!r}')
+    options.update(overrides)
+    if options['page_size'] is None:
+        rows, columns = options['grid']
+        options['page_size'] = rows * columns
+    return options
+
+
+# Output file names of one page (numbered from 1) of a chart drawn over several pages
+def page_files(chart, page):
+    return [f'{stem}_page{page:04d}{ext}' for stem, ext in map(os.path.splitext, CHART_SPECS[chart]['files'])]
+
+
+# Every output file of a chart drawn for the given number of people; a chart that fits on one page keeps the
+# spec's file names
+def chart_files(chart, people, page_size=None):
+    page_size = page_size or compile_spec(chart)['page_size']
+    if people <= page_size:
+        return list(CHART_SPECS[chart]['files'])
+    pages = -(-people // page_size)
+    return [name for page in range(1, pages + 1) for name in page_files(chart, page)]
@@ -0,0 +1,366 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+
+import numpy as np
+
+from instrumentation import stage
+
+# Workbook published by DESNZ/DEFRA with every UK GHG conversion factor for 2024
+DEFAULT_WORKBOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'ghg-conversion-factors-2024_full_set__for_advanced_users_.xlsx')
+
+# Bump whenever the layout of the cached columns or index changes
+CACHE_VERSION = 1
+
+# Shared binary export: 8-byte magic, uint32 layout version and uint32 header length, a JSON header
+# (strings, array offsets, source workbook) and then the raw arrays, each aligned to MMAP_ALIGNMENT bytes
+MMAP_MAGIC = b'GHGFACT\x00'
+MMAP_VERSION = 1
+MMAP_ALIGNMENT = 64
+
+# Text columns are stored as categorical codes plus a list of distinct strings.
+# 'fuel' holds the workbook's second key column (Fuel / Type / Country / Material ...)
+# and 'variant' the group heading above the value column (Diesel, Petrol, With RF ...)
+TEXT_COLUMNS = ['scope', 'category', 'activity', 'fuel', 'variant', 'unit', 'ghg']
+
+# Workbook rows that the hand-worked kgCO₂e values in the chart modules were based on
+# (category, fuel, unit, variant)
+ACTIVITY_FACTORS = {
+    'Electricity': ('UK electricity', 'Electricity: UK', 'kWh', None),
+    'Heating Oil': ('Fuels', 'Burning oil', 'litres', None),
+    'Car': ('Business travel- land', 'Average car', 'km', 'Unknown'),
+    'Train': ('Business travel- land', 'National rail', 'passenger.km', None),
+    'Water Supply': ('Water supply', 'Water supply', 'cubic metres', None),
+    'Water Treatment': ('Water treatment', 'Water treatment', 'cubic metres', None),
+}
+
+
+# In-memory factor table: one numpy array per column plus a hash index
+class FactorTable:
+    def __init__(self, columns, categories, index):
+        self.columns = columns  # Column name -> numpy array (codes for text columns)
+        self.categories = categories  # Text column name -> list of distinct strings
+        self.index = index  # (scope, category, fuel, unit) -> numpy array of row numbers
+        self._codes = {column: {text: code for code, text in enumerate(values)}
+                       for column, values in categories.items()}  # Reverse of categories
+        self._scopes = {}  # Category -> scope, so callers don't have to know the scope
+        for scope, category, _, _ in index:
+            self._scopes.setdefault(category, scope)
+
+    def __len__(self):
+        return len(self.columns['value'])
+
+    # Decode one text column of a single row
+    def text(self, column, row):
+        return self.categories[column][self.columns[column][row]]
+
+    # Return a row as a plain dictionary (handy for debugging and reports)
+    def row(self, row):
+        record = {column: self.text(column, row) for column in TEXT_COLUMNS}
+        record['value'] = float(self.columns['value'][row])
+        return record
+
+    # Return the row numbers for a (category, fuel, unit) combination, narrowed by activity/variant/ghg
+    def find(self, category, fuel, unit, scope=None, activity=None, variant=None, ghg='kg CO2e'):
+        if scope is None:
+            scope = self._scopes.get(category)
+        rows = self.index.get((scope, category, fuel, unit))
+        if rows is None:
+            return rows
+        for column, wanted in (('activity', activity), ('variant', variant), ('ghg', ghg)):
+            if wanted is None:
+                continue
+            code = self._codes[column].get(wanted)
+            if code is None:
+                return rows[:0]
+            rows = rows[self.columns[column][rows] == code]
+        return rows
+
+    # Look up a single emission factor in kgCO₂e per unit
+    def lookup(self, category, fuel, unit, scope=None, activity=None, variant=None, ghg='kg CO2e'):
+        rows = self.find(category, fuel, unit, scope=scope, activity=activity, variant=variant, ghg=ghg)
+        if rows is None or len(rows) == 0:
+            raise KeyError((scope, category, fuel, unit, activity, variant, ghg))
+        if variant is None and len(rows) > 1:
+            # Several variants (e.g. Diesel/Petrol) share the row - prefer the one without a heading
+            blank = self._codes['variant'].get('', -1)
+            plain = rows[self.columns['variant'][rows] == blank]
+            if len(plain):
+                rows = plain
+        return float(self.columns['value'][rows[0]])
+
+    # Look up the factor behind one of the chart activities ('Electricity', 'Car', ...)
+    def activity_factor(self, name):
+        category, fuel, unit, variant = ACTIVITY_FACTORS[name]
+        return self.lookup(category, fuel, unit, variant=variant)
+
+
+# Helper function to calculate the SHA-256 checksum of the workbook
+def file_checksum(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Helper function to turn a header cell into a clean string
+def _clean(cell):
+    if cell is None:
+        return ''
+    return ' '.join(str(cell).split())
+
+
+# Parse every factor table in the workbook into flat records
+def parse_workbook(path=DEFAULT_WORKBOOK):
+    import openpyxl  # Only needed on a cache miss
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    records = []
+    try:
+        for sheet_name in workbook.sheetnames:
+            rows = list(workbook[sheet_name].iter_rows(values_only=True))
+            scope = ''
+            previous = ()
+            key_columns = value_columns = None
+            for row in rows:
+                first = _clean(row[0]) if row else ''
+                if first == 'Scope:':
+                    scope = _clean(row[1])
+                elif first == 'Activity':
+                    # A new table starts: columns before 'Unit' are keys, 'kg CO2e...' columns are values
+                    headers = [_clean(cell) for cell in row]
+                    if 'Unit' not in headers:
+                        key_columns = None
+                        continue
+                    unit_column = headers.index('Unit')
+                    key_columns = list(range(unit_column))
+
+                    # The group heading row above spans several value columns, so fill it forward
+                    groups, group = [], ''
+                    for i in range(len(headers)):
+                        cell = _clean(previous[i]) if i < len(previous) else ''
+                        group = cell or group
+                        groups.append(group if i > unit_column else '')
+                    value_columns = [(i, groups[i], headers[i]) for i in range(unit_column + 1, len(headers))
+                                     if headers[i].startswith('kg CO2e')]
+                    keys = [''] * len(key_columns)
+                    unit_at = unit_column
+                elif key_columns is not None and row:
+                    # Blank cells under a key column repeat the value above (merged cells in Excel),
+                    # and a new value in an outer key column resets the inner ones
+                    for i in key_columns:
+                        if i < len(row) and row[i] is not None:
+                            keys[i:] = [_clean(row[i])] + [''] * (len(keys) - i - 1)
+                    unit = _clean(row[unit_at]) if unit_at < len(row) else ''
+                    if unit:
+                        fuel = ' / '.join(k for k in keys[1:] if k)
+                        for i, variant, ghg in value_columns:
+                            value = row[i] if i < len(row) else None
+                            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                                records.append((scope, sheet_name, keys[0], fuel, variant, unit, ghg, float(value)))
+                previous = row or ()
+    finally:
+        workbook.close()
+    return records
+
+
+# Convert parsed records into column arrays and build the hash index
+def build_table(records):
+    columns, categories = {}, {}
+    for position, column in enumerate(TEXT_COLUMNS):
+        lookup = {}
+        codes = np.fromiter((lookup.setdefault(record[position], len(lookup)) for record in records),
+                            dtype=np.int32, count=len(records))
+        columns[column] = codes
+        categories[column] = list(lookup)
+    columns['value'] = np.fromiter((record[-1] for record in records), dtype=np.float64, count=len(records))
+
+    groups = {}
+    for row, record in enumerate(records):
+        groups.setdefault((record[0], record[1], record[3], record[5]), []).append(row)
+    index = {key: np.asarray(rows, dtype=np.int32) for key, rows in groups.items()}
+    return FactorTable(columns, categories, index)
+
+
+# Default cache file sits next to the workbook
+def default_cache_path(workbook_path):
+    return workbook_path + '.factors.cache'
+
+
+# Load the factor table, re-parsing the workbook only when its mtime and checksum changed
+@stage('factor_lookup')
+def load_factors(path=DEFAULT_WORKBOOK, cache_path=None):
+    if cache_path is None:
+        cache_path = default_cache_path(path)
+    stat = os.stat(path)
+
+    cached = None
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        cached = None
+
+    if cached is not None and cached.get('version') == CACHE_VERSION:
+        # Same mtime and size: trust the cache without hashing the workbook
+        if cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+            return FactorTable(cached['columns'], cached['categories'], cached['index'])
+        # Touched but identical contents: keep the cache and refresh its mtime
+        checksum = file_checksum(path)
+        if cached['checksum'] == checksum:
+            cached['mtime_ns'], cached['size'] = stat.st_mtime_ns, stat.st_size
+            _write_cache(cache_path, cached)
+            return FactorTable(cached['columns'], cached['categories'], cached['index'])
+    else:
+        checksum = file_checksum(path)
+
+    table = build_table(parse_workbook(path))
+    _write_cache(cache_path, {
+        'version': CACHE_VERSION,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'checksum': checksum,
+        'columns': table.columns,
+        'categories': table.categories,
+        'index': table.index,
+    })
+    return table
+
+
+# Write the cache atomically so concurrent jobs never read a half-written file
+def _write_cache(cache_path, payload):
+    tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # A read-only checkout still works, it just re-parses every time
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Default shared export sits next to the workbook
+def default_mmap_path(workbook_path):
+    return workbook_path + '.factors.bin'
+
+
+# Write the table to a fixed-layout binary file that worker processes can memory-map (see attach_factors).
+# source is stored in the header so stale exports can be recognised.
+def export_factors(table, path, source=None):
+    keys = list(table.index)
+    codes = table._codes
+    arrays = dict(table.columns)
+    arrays['index_keys'] = np.array([(codes['scope'][scope], codes['category'][category], codes['fuel'][fuel],
+                                      codes['unit'][unit]) for scope, category, fuel, unit in keys],
+                                    dtype=np.int32).reshape(len(keys), 4)
+    arrays['index_offsets'] = np.concatenate([[0], np.cumsum([len(table.index[key]) for key in keys])]).astype(
+        np.int64)
+    arrays['index_rows'] = (np.concatenate([table.index[key] for key in keys]) if keys
+                            else np.zeros(0, dtype=np.int32)).astype(np.int32)
+
+    # The header holds the array offsets, which depend on the header's own length: repeat until they agree
+    layout, header, start = {}, b'', None
+    while start != _align(16 + len(header)):
+        start = offset = _align(16 + len(header))
+        for name, array in arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+        header = json.dumps({'categories': table.categories, 'arrays': layout, 'source': source},
+                            separators=(',', ':')).encode('utf-8')
+
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MMAP_MAGIC + struct.pack('<II', MMAP_VERSION, len(header)) + header)
+            for name, array in arrays.items():
+                f.write(b'\0' * (layout[name]['offset'] - f.tell()))
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp_path, path)  # Workers attached to an older export keep their mapping
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Helper function to round a file offset up to the array alignment
+def _align(offset):
+    return -(-offset // MMAP_ALIGNMENT) * MMAP_ALIGNMENT
+
+
+# Helper function to read the JSON header of an export, or None if the file is not a current export
+def _read_mmap_header(path):
+    try:
+        with open(path, 'rb') as f:
+            start = f.read(16)
+            if len(start) < 16 or start[:8] != MMAP_MAGIC:
+                return None
+            version, length = struct.unpack('<II', start[8:])
+            if version != MMAP_VERSION:
+                return None
+            return json.loads(f.read(length))
+    except (OSError, ValueError):
+        return None
+
+
+# Memory-map an export read-only: the columns and index point straight into the shared page cache,
+# so every worker that attaches the same file shares one copy of the factors
+@stage('factor_lookup')
+def attach_factors(path):
+    header = _read_mmap_header(path)
+    if header is None:
+        raise ValueError(f'{path} is not a conversion factor export (version {MMAP_VERSION})')
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        start = spec['offset']
+        arrays[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+    categories = header['categories']
+    keys, offsets, rows = arrays.pop('index_keys'), arrays.pop('index_offsets'), arrays.pop('index_rows')
+    index = {}
+    for (scope, category, fuel, unit), start, stop in zip(keys.tolist(), offsets[:-1].tolist(),
+                                                         offsets[1:].tolist()):
+        key = (categories['scope'][scope], categories['category'][category], categories['fuel'][fuel],
+               categories['unit'][unit])
+        index[key] = rows[start:stop]
+    table = FactorTable(arrays, categories, index)
+    table.source = header['source']
+    return table
+
+
+# Tables attached in this process, keyed by export path
+_attached = {}
+
+
+# The factor table for worker processes: attach the shared export of the workbook, (re)writing it first
+# when it is missing or older than the workbook. Later calls in the same process reuse the mapping.
+def shared_factors(path=DEFAULT_WORKBOOK, mmap_path=None):
+    if mmap_path is None:
+        mmap_path = default_mmap_path(path)
+    stat = os.stat(path)
+    source = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    table = _attached.get(mmap_path)
+    if table is not None and table.source == source:
+        return table
+    header = _read_mmap_header(mmap_path)
+    if header is None or header['source'] != source:
+        try:
+            export_factors(load_factors(path), mmap_path, source)
+        except OSError:
+            return load_factors(path)  # Read-only checkout: fall back to a private copy
+    table = _attached[mmap_path] = attach_factors(mmap_path)
+    return table
+
+
+if __name__ == '__main__':
+    factors = load_factors()
+    print(f'{len(factors)} conversion factors loaded')
+    for name in ACTIVITY_FACTORS:
+        print(f'{name}: {factors.activity_factor(name)} kgCO₂e per {ACTIVITY_FACTORS[name][2]}')
@@ -0,0 +1,401 @@
+import itertools
+import os
+
+import numpy as np
+
+from chart_spec import CHART_SPECS, compile_spec, page_files
+from imputation import masked
+from instrumentation import stage
+from label_layout import place_pie_labels
+from pie_geometry import PieGeometry
+from svg_writer import save_figure
+
+
+# Helper function to turn {'name': (lower, upper)} confidence intervals into lower and upper arrays of the given
+# shape, one row per name; NaN where there is no interval
+def _interval_bounds(errors, names, shape):
+    lower, upper = np.full(shape, np.nan), np.full(shape, np.nan)
+    for k, name in enumerate(names):
+        bounds = errors.get(name)
+        if bounds is not None:
+            lower[k], upper[k] = masked(bounds[0]).filled(np.nan), masked(bounds[1]).filled(np.nan)
+    return lower, upper
+
+
+# Helper function to show the error bar of every bar with a confidence interval and hide the others
+def _set_whiskers(bars, whiskers, lower, upper, missing):
+    for bar, whisker, low, high, is_missing in zip(bars, whiskers, lower.tolist(), upper.tolist(), missing.tolist()):
+        shown = not (is_missing or np.isnan(low) or np.isnan(high))
+        if shown:
+            x = bar.get_x() + bar.get_width() / 2
+            whisker.set_data([x, x], [low, high])
+        whisker.set_visible(shown)
+
+
+# Helper function to turn rows of [values] or {'key': value} into a masked (people x keys) array. Dict rows are
+# read by key, so their order doesn't matter, and a key a row lacks is missing; keys=None takes a dict row's values
+# as they come.
+def _rows(chart, rows, keys):
+    values = []
+    for row in rows:
+        if isinstance(row, dict):
+            unknown = [key for key in row if keys is not None and key not in keys]
+            if unknown:
+                raise ValueError(f'{chart} has no bar for {", ".join(map(repr, unknown))}')
+            row = list(row.values()) if keys is None else [row.get(key) for key in keys]
+        values.append(row)
+    return masked(values)
+
+
+# Helper function to refuse data for more people than a template has room for, rather than leave some out
+def _check_people(chart, data, room):
+    if len(data) > room:
+        raise ValueError(f'{chart} has room for {room} people per figure, not {len(data)}; use render_pages')
+
+
+# A pie chart spec compiled into a figure once; later outputs only move wedge angles and label text
+class PieTemplate:
+    def __init__(self, chart, people, **overrides):
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Patch, Wedge
+
+        self.chart = chart
+        self.options = options = compile_spec(chart, **overrides)
+        labels = options['labels']
+        hatches = options['hatches']
+
+        self.fig, axs = plt.subplots(1, people, figsize=options['figsize'], squeeze=False)
+        self.axes = list(axs[0])
+        self.fig.suptitle(options['title'], fontsize=options['title_size'], fontweight='bold',
+                          y=options['main_title_y'])
+
+        text_style = {'ha': 'center', 'va': 'center', 'fontsize': options['label_size'], 'fontweight': 'bold'}
+        self.wedges, self.texts, self.lines, self.titles, self.missing = [], [], [], [], []
+        self.inside = [[True] * len(labels) for _ in self.axes]  # Whether each label is wanted inside its wedge
+        for ax in self.axes:
+            # Placeholder pie with one wedge per label; the angles are replaced on every update
+            wedges, _ = ax.pie(np.ones(len(labels)), labels=None, colors=options['colors'], startangle=90,
+                               wedgeprops={'edgecolor': 'white', 'linewidth': options['wedge_gap']})
+            for i, wedge in enumerate(wedges):
+                if hatches:
+                    wedge.set_hatch(hatches[i % len(hatches)])
+            self.wedges.append(wedges)
+            self.titles.append(ax.set_title('', fontsize=options['name_text_size'], fontweight='bold',
+                                            y=options['title_y']))
+
+            # One label and one leader line per wedge, hidden until needed
+            self.texts.append([ax.text(0, 0, '', visible=False, **text_style) for _ in labels])
+            self.lines.append([ax.plot([0, 0], [0, 0], color='black', linestyle='dashed', visible=False)[0]
+                               for _ in labels])
+
+            # Grey placeholder shown instead of the pie when a person's data is missing
+            grey = Wedge((0, 0), 1, 0, 360, facecolor='#d3d3d3', edgecolor='white',
+                         linewidth=options['wedge_gap'], visible=False)
+            ax.add_patch(grey)
+            self.missing.append((grey, ax.text(0, 0, options['unavailable_text'], ha='center', va='center',
+                                               fontsize=14, fontweight='bold', visible=False)))
+
+        if options['legend_patches']:
+            handles = [Patch(facecolor=color, label=label, hatch=hatches[i] if i < len(hatches) else '',
+                             edgecolor='white')
+                       for i, (label, color) in enumerate(zip(labels, options['colors']))]
+            self.fig.legend(handles=handles, loc='center left', bbox_to_anchor=(0.8, 0.5),
+                            **options['legend_style'])
+        else:
+            self.fig.legend(labels, loc='center left', bbox_to_anchor=(0.8, 0.5), **options['legend_style'])
+
+        # Layout is computed once, on the first update, and reused for every later output
+        self.laid_out = False
+
+    # Redraw the template for a new {'name': {'label': value}} dictionary
+    def update(self, data, errors=None):
+        if errors:
+            raise ValueError(f'{self.chart} is a pie chart and has no error bars')
+        options = self.options
+        labels = options['labels']
+        _check_people(self.chart, data, len(self.axes))
+        people = list(data.items())
+
+        # Wedge angles and label anchors of every pie in one go; None (missing data) becomes NaN
+        values = np.array([[activities.get(label, 0) for label in labels] for _, activities in people],
+                          dtype=np.float64).reshape(-1, len(labels))
+        geometry = PieGeometry(values, options['internal_distance'], options['external_distance'],
+                               options['leader_start'])
+        for k, ax in enumerate(self.axes):
+            visible = k < len(people)
+            ax.set_visible(visible)
+            if not visible:
+                continue
+            self.titles[k].set_text(people[k][0])
+            self._update_pie(k, geometry)
+        if not self.laid_out:
+            self.fig.tight_layout(rect=[0, 0, 0.75, 0.95])
+            self.laid_out = True
+
+        # Labels are placed against the final layout, since their sizes in data units depend on it
+        if options['external']:
+            renderer = self.fig.canvas.get_renderer()
+            for k in range(len(people)):
+                place_pie_labels(self.axes[k], self.wedges[k], self.texts[k], self.lines[k], self.inside[k],
+                                 options['internal_distance'], options['external_distance'],
+                                 options['leader_start'], options['label_gap'], renderer, geometry.directions[k])
+
+    def _update_pie(self, k, geometry):
+        options = self.options
+        wedges, texts, lines = self.wedges[k], self.texts[k], self.lines[k]
+        grey, unavailable = self.missing[k]
+
+        # Missing data: grey circle with the 'unavailable' text instead of wedges
+        is_missing = geometry.missing[k]
+        grey.set_visible(is_missing)
+        unavailable.set_visible(is_missing)
+        for artist in wedges + texts + lines:
+            artist.set_visible(not is_missing)
+        if is_missing:
+            return
+
+        values, pcts = geometry.values[k], geometry.pcts[k]
+        theta1, theta2, spans = geometry.theta1[k], geometry.theta2[k], geometry.spans[k]
+        inside = self.inside[k]
+        for i, wedge in enumerate(wedges):
+            wedge.set_theta1(theta1[i])
+            wedge.set_theta2(theta2[i])
+            wedge.set_visible(not (options['hide_zero'] and values[i] == 0))
+            texts[i].set_visible(False)
+            lines[i].set_visible(False)
+
+            pct = pcts[i]
+            if pct == 0 or pct < options['skip_pct']:
+                continue
+            if options['external'] and pct < options['min_pct']:
+                inside[i] = False  # Placed outside with a leader line once the layout is known
+            elif pct >= options['min_pct'] and spans[i] >= options['min_angle']:
+                inside[i] = True
+                texts[i].set_position(tuple(geometry.internal[k, i]))
+            else:
+                continue
+            texts[i].set_text(f'{pct:.1f}%')
+            texts[i].set_visible(True)
+
+    # Save the current state to every output file of the chart (or to the given file names) with a single draw
+    def save(self, output_dir='.', files=None):
+        paths = [os.path.join(output_dir, name) for name in files or self.options['files']]
+        return save_figure(self.fig, paths, tight=True)
+
+
+# A bar chart spec compiled into a grid of per-person charts once; later outputs only change bar heights,
+# limits and value labels
+class BarTemplate:
+    def __init__(self, chart, people, **overrides):
+        import matplotlib.pyplot as plt
+
+        self.chart = chart
+        self.options = options = compile_spec(chart, **overrides)
+        rows, columns = options['grid']
+        if people > rows * columns:
+            raise ValueError(f'{chart} has a {rows} x {columns} grid, too small for {people} people per figure')
+        self.fig, axs = plt.subplots(rows, columns, figsize=options['figsize'], squeeze=False)
+        self.axes = list(axs.flat)
+        for ax in self.axes[people:]:
+            self.fig.delaxes(ax)
+        self.axes = self.axes[:people]
+
+        self.bars, self.texts, self.titles, self.whiskers = [], [], [], []
+        for ax in self.axes:
+            bars = ax.bar(options['activities'], np.ones(len(options['activities'])), color=options['colors'])
+            self.titles.append(ax.set_title('', fontsize=20, fontweight='bold'))
+            ax.set_xlabel(options['xlabel'], fontweight='bold', fontsize=20)
+            ax.set_ylabel('GHG Emission (tCO₂e)', fontweight='bold', fontsize=20)
+            ax.grid(True)
+            ax.tick_params(axis='x', labelsize=options['tick_size'])
+            ax.tick_params(axis='y', labelsize=options['tick_size'])
+            self.bars.append(list(bars))
+            self.texts.append([ax.text(0, 0, '', ha='center', va='bottom', fontweight='bold',
+                                       fontsize=options['value_size']) for _ in bars])
+
+            # Error bar of each bar (a whisker with caps), hidden unless the update has its confidence interval
+            self.whiskers.append([ax.plot([0, 0], [0, 0], marker='_', visible=False, scalex=False, scaley=False,
+                                          **options['error_style'])[0] for _ in bars])
+
+        self.fig.suptitle(options['title'], fontsize=25, fontweight='bold', y=0.95)
+
+        # Layout is computed once, on the first update, and reused for every later output
+        self.laid_out = False
+
+    # Redraw the template for a new {'name': [values]} (or {'name': {'activity': value}}) dictionary; missing
+    # values (None, NaN, masked or an activity a row leaves out) are drawn as 'N/A'. errors adds error bars from
+    # confidence intervals, {'name': ([lower values], [upper values])}, with the value labels above them.
+    def update(self, data, errors=None):
+        options = self.options
+        _check_people(self.chart, data, len(self.axes))
+        people = list(data.items())
+        values = _rows(self.chart, [row for _, row in people], options['keys'] or options['activities'])
+        values = values.reshape(-1, len(options['activities']))
+        lower, upper = _interval_bounds(errors or {}, [name for name, _ in people], values.shape)
+
+        # Axis limits, bar heights and label positions of the whole page at once
+        zero_ylim = options['zero_ylim']
+        max_values = values.max(axis=1).filled(0 if zero_ylim is not None else 1)
+        tops = max_values * 1.15
+        if errors:
+            tops = np.fmax(max_values, np.fmax.reduce(upper, axis=1)) * 1.15
+        if zero_ylim is not None:
+            tops[max_values == 0] = zero_ylim
+        heights = values.filled(0.0)
+        missing = np.ma.getmaskarray(values)
+        label_heights = np.fmax(heights, upper) if errors else heights
+        for k, (ax, bars, texts, title) in enumerate(zip(self.axes, self.bars, self.texts, self.titles)):
+            if k >= len(people):
+                break
+            title.set_text(people[k][0])
+            ax.set_ylim(0, tops[k])
+            for bar, text, height, is_missing in zip(bars, texts, heights[k].tolist(), missing[k].tolist()):
+                bar.set_height(height)
+                text.set_text(options['unavailable_text'] if is_missing else f'{height:.2f}')
+            _set_whiskers(bars, self.whiskers[k], lower[k], upper[k], missing[k])
+            for bar, text, label_height in zip(bars, texts, label_heights[k].tolist()):
+                text.set_position((bar.get_x() + bar.get_width() / 2, label_height + max_values[k] * 0.02))
+        if not self.laid_out:
+            self.fig.tight_layout(rect=[0, 0, 1, 0.95], h_pad=2.5)
+            self.laid_out = True
+
+    # Save the current state to every output file of the chart (or to the given file names) with a single draw
+    def save(self, output_dir='.', files=None):
+        paths = [os.path.join(output_dir, name) for name in files or self.options['files']]
+        return save_figure(self.fig, paths)
+
+
+# A single bar chart with one bar per person showing the sum of their values, compiled once; later outputs
+# change the bar heights, names and value labels
+class TotalTemplate:
+    def __init__(self, chart, people, **overrides):
+        import matplotlib.pyplot as plt
+
+        self.chart = chart
+        self.options = options = compile_spec(chart, **overrides)
+        self.fig = plt.figure(figsize=options['figsize'])
+        self.ax = ax = self.fig.add_subplot()
+        self.bars = list(ax.bar(range(people), np.ones(people), color=options['colors']))
+        ax.set_xticks(range(people), [''] * people)
+        ax.set_title(options['title'], fontsize=25, fontweight='bold', pad=20, y=1.05)
+        ax.set_xlabel(options['xlabel'], fontsize=20, fontweight='bold')
+        ax.set_ylabel('GHG Emissions (tCO₂e)', fontsize=20, fontweight='bold')
+        self.texts = [ax.text(0, 0, '', ha='center', va='bottom', fontweight='bold', fontsize=options['value_size'])
+                      for _ in self.bars]
+        self.whiskers = [ax.plot([0, 0], [0, 0], marker='_', visible=False, scalex=False, scaley=False,
+                                 **options['error_style'])[0] for _ in self.bars]
+        ax.tick_params(axis='x', labelsize=18)
+        ax.tick_params(axis='y', labelsize=16)
+        ax.grid(True)
+
+        # Layout is computed once, on the first update, and reused for every later output
+        self.laid_out = False
+
+    # Redraw the template for a new {'name': [values]} (or {'name': {'key': value}}) dictionary; a person with a
+    # missing value (None, NaN, masked or one of the spec's keys left out) has a missing total, drawn as 'N/A'.
+    # errors adds error bars from confidence intervals of the totals, {'name': (lower, upper)}, with the value
+    # labels above them.
+    def update(self, data, errors=None):
+        _check_people(self.chart, data, len(self.bars))
+        values = _rows(self.chart, data.values(), self.options['keys'])
+        missing = np.ma.getmaskarray(values).any(axis=1)
+        totals = values.filled(0.0).sum(axis=1)
+        totals[missing] = 0.0
+        lower, upper = _interval_bounds(errors or {}, list(data), totals.shape)
+        upper[missing] = np.nan
+        label_heights = np.fmax(totals, upper * 1.03)  # Clear of the error bar's cap
+        self.ax.set_xticks(range(len(self.bars)), list(data))
+        self.ax.set_ylim(0, (label_heights.max(initial=0) or 1) * 1.15)
+        options = self.options
+        for bar, text, total, label_height, is_missing in zip(self.bars, self.texts, totals.tolist(),
+                                                              label_heights.tolist(), missing.tolist()):
+            bar.set_height(total)
+            text.set_position((bar.get_x() + bar.get_width() / 2, label_height))
+            text.set_text(options['unavailable_text'] if is_missing else format(total, options['value_format']))
+        _set_whiskers(self.bars, self.whiskers, lower, upper, missing)
+        if not self.laid_out:
+            self.fig.tight_layout(rect=[0, 0, 1, 0.95])
+            self.laid_out = True
+
+    # Save the current state to every output file of the chart (or to the given file names) with a single draw
+    def save(self, output_dir='.', files=None):
+        paths = [os.path.join(output_dir, name) for name in files or self.options['files']]
+        return save_figure(self.fig, paths)
+
+
+# Template class compiling each chart type
+TEMPLATE_TYPES = {'pie': PieTemplate, 'bar': BarTemplate, 'total': TotalTemplate}
+
+
+# Draw one chart from its spec on a fresh figure and save its files; overrides change the spec's styling and
+# errors gives bar charts error bars (see BarTemplate.update). Cohorts larger than one page need render_pages.
+def render_chart(chart, data, output_dir='.', show=False, errors=None, **overrides):
+    page_size = compile_spec(chart, **overrides)['page_size']
+    if len(data) > page_size:
+        raise ValueError(f'{chart} holds {page_size} people per figure, not {len(data)}; use render_pages')
+    template = TEMPLATE_TYPES[CHART_SPECS[chart]['type']](chart, len(data), **overrides)
+    with stage('layout'):
+        template.update(data, errors)
+    template.save(output_dir)
+    if show:
+        import matplotlib.pyplot as plt
+        plt.show()
+    return template.fig
+
+
+# Pool of templates, one per (chart type, number of people); figures stay open for reuse
+class FigurePool:
+    def __init__(self):
+        self.templates = {}
+
+    # Whether a chart type can be rendered from a pooled template
+    @staticmethod
+    def supports(chart):
+        return chart in CHART_SPECS
+
+    def get(self, chart, people):
+        key = (chart, people)
+        template = self.templates.get(key)
+        if template is None:
+            template = self.templates[key] = TEMPLATE_TYPES[CHART_SPECS[chart]['type']](chart, people)
+        return template
+
+    # Update the pooled figure with new data and write its output files
+    def render(self, chart, data, output_dir='.', files=None, errors=None):
+        template = self.get(chart, len(data))
+        with stage('layout'):
+            template.update(data, errors)
+        return template.save(output_dir, files)
+
+    # Close every pooled figure
+    def close(self):
+        import matplotlib.pyplot as plt
+
+        for template in self.templates.values():
+            plt.close(template.fig)
+        self.templates.clear()
+
+
+# Draw a cohort of any size as fixed-size pages, writing each page to disk as soon as it is drawn, so memory holds
+# one page's figure however many people there are. data is a {'name': values} dictionary or an iterable of
+# (name, values) pairs, which lets a cohort be streamed in. Yields the paths written for each page; a cohort that
+# fits on one page keeps the spec's file names (see chart_spec.chart_files). errors adds error bars to bar charts,
+# as in render_chart.
+def render_pages(chart, data, output_dir='.', pool=None, page_size=None, errors=None):
+    page_size = page_size or compile_spec(chart)['page_size']
+    people = iter(data.items() if isinstance(data, dict) else data)
+    own_pool = pool is None
+    if own_pool:
+        pool = FigurePool()
+    try:
+        page = dict(itertools.islice(people, page_size))
+        following = dict(itertools.islice(people, page_size))
+        paged = bool(following)
+        number = 1
+        while page:
+            yield pool.render(chart, page, output_dir, page_files(chart, number) if paged else None, errors)
+            page, following = following, dict(itertools.islice(people, page_size))
+            number += 1
+    finally:
+        if own_pool:
+            pool.close()
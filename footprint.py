@@ -0,0 +1,114 @@
+import numpy as np
+
+from instrumentation import stage
+from units import KG_CO2E, T_CO2E, conversion_factor
+
+# Convert kgCO₂e to tCO₂e
+KG_TO_TONNES = conversion_factor(KG_CO2E, T_CO2E)
+
+# Footprint categories in the order used by the comparison bar charts
+CATEGORIES = ['Residential Energy', 'Water', 'Transport', 'Diet']
+
+# Activities tracked for every person, grouped by category
+CATEGORY_ACTIVITIES = {
+    'Residential Energy': ['Electricity', 'Heating Oil'],
+    'Water': ['Shower', 'Cleaning Dishes', 'Washing Machine', 'Toilet', 'Fish Tank'],
+    'Transport': ['Car', 'Train', 'Walking'],
+    'Diet': ['Beef', 'Pig Meat', 'Fish', 'Poultry', 'Rice', 'Potatoes', 'Pasta'],
+}
+
+# Category of every activity
+ACTIVITY_CATEGORIES = {activity: category
+                       for category, activities in CATEGORY_ACTIVITIES.items()
+                       for activity in activities}
+
+
+# Build a (people x activities) matrix from a nested {'Jonathan': {'Beef': ...}, ...} dictionary.
+# Activities a person doesn't have count as 0, None (missing data) becomes NaN.
+def quantity_matrix(data, activities=None):
+    names = list(data)
+    if activities is None:
+        activities = []
+        for values in data.values():
+            activities.extend(activity for activity in values if activity not in activities)
+    matrix = np.zeros((len(names), len(activities)))
+    for i, name in enumerate(names):
+        for j, activity in enumerate(activities):
+            value = data[name].get(activity, 0.0)
+            matrix[i, j] = np.nan if value is None else value
+    return names, list(activities), matrix
+
+
+# Turn a (people x activities) matrix back into the nested dictionary used by the chart modules; missing values
+# (NaN or masked) become None
+def matrix_to_data(names, activities, matrix):
+    rows = np.ma.masked_invalid(matrix).tolist()
+    return {name: dict(zip(activities, row)) for name, row in zip(names, rows)}
+
+
+# Vectorised footprint calculation: quantities (people x activities) times a factor vector.
+# Quantities can be a masked array (see imputation.masked); a missing quantity then makes its category total and
+# its person's total missing (masked) too, instead of counting as nothing.
+# units names the unit of each activity's quantities (see units.py), so records in other units can be converted
+# to them at ingest; None leaves them unchecked, except that quantities without factors are kgCO₂e.
+class FootprintEngine:
+    def __init__(self, activities, factors=None, categories=None, scale=KG_TO_TONNES, units=None):
+        self.activities = list(activities)
+        if factors is None:
+            factors = np.ones(len(self.activities))  # Quantities are already kgCO₂e
+            units = [KG_CO2E] * len(self.activities) if units is None else units
+        if categories is None:
+            categories = [ACTIVITY_CATEGORIES[activity] for activity in self.activities]
+        self.factors = np.asarray(factors, dtype=np.float64)  # kgCO₂e per unit of each activity
+        self.units = list(units) if units is not None else [None] * len(self.activities)
+
+        # Fold the unit conversion into the factors so scoring is a single multiply
+        self.scale = scale
+        self.weights = self.factors * scale
+
+        # Order activities by category so category totals are one np.add.reduceat call.
+        # (A one-hot matrix product would spread a single NaN into every category.)
+        self.categories = []
+        for category in categories:
+            if category not in self.categories:
+                self.categories.append(category)
+        codes = np.array([self.categories.index(category) for category in categories], dtype=np.intp)
+        self.activity_categories = codes
+        self._order = np.argsort(codes, kind='stable')
+        self._starts = np.searchsorted(codes[self._order], np.arange(len(self.categories)))
+
+    # Emissions per activity (people x activities), in tCO₂e by default
+    def emissions(self, quantities):
+        if np.ma.isMaskedArray(quantities):
+            return quantities * self.weights
+        return np.asarray(quantities, dtype=np.float64) * self.weights
+
+    # Emissions per category (people x categories)
+    def category_totals(self, quantities=None, emissions=None):
+        if emissions is None:
+            emissions = self.emissions(quantities)
+        if np.ma.isMaskedArray(emissions):
+            totals = np.add.reduceat(emissions.filled(0.0)[:, self._order], self._starts, axis=1)
+            missing = np.logical_or.reduceat(np.ma.getmaskarray(emissions)[:, self._order], self._starts, axis=1)
+            return np.ma.array(totals, mask=missing)
+        return np.add.reduceat(emissions[:, self._order], self._starts, axis=1)
+
+    # Total emissions per person
+    def person_totals(self, quantities=None, emissions=None):
+        if emissions is None:
+            emissions = self.emissions(quantities)
+        if np.ma.isMaskedArray(emissions):
+            return np.ma.array(emissions.filled(0.0).sum(axis=1), mask=np.ma.getmaskarray(emissions).any(axis=1))
+        return emissions.sum(axis=1)
+
+    # Score a whole batch at once: per-activity, per-category and per-person totals
+    @stage('aggregation')
+    def score(self, quantities):
+        emissions = self.emissions(quantities)
+        by_category = self.category_totals(emissions=emissions)
+        return emissions, by_category, self.person_totals(emissions=by_category)  # Same sum, over the categories
+
+    # Score a nested {'Jonathan': {...}} dictionary, returning people names alongside the arrays
+    def score_data(self, data):
+        names, _, matrix = quantity_matrix(data, self.activities)
+        return (names,) + self.score(matrix)
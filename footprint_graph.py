@@ -0,0 +1,189 @@
+import numpy as np
+
+from footprint import CATEGORIES, CATEGORY_ACTIVITIES, FootprintEngine
+from units import KG_CO2E, conversion_factor
+
+# What each chart is drawn from:
+#   ('activities', category, order) - one value per activity of a category (pies use raw quantities)
+#   ('categories',)                 - the four category subtotals per person
+#   ('category', category)          - a single category subtotal per person
+#   ('total',)                      - each person's total
+# 'skip_missing' drops people with missing data in the category (energy_usage_no_agnel.py)
+# 'skip_empty' drops people with nothing to show in the category (transport.py, bar_chart_transport.py)
+CHART_INPUTS = {
+    'water_pie': {'source': ('activities', 'Water'), 'quantities': True},
+    'transport_pie': {'source': ('activities', 'Transport'), 'quantities': True, 'skip_empty': True},
+    'diet_pie': {'source': ('activities', 'Diet'), 'quantities': True},
+    'energy_pie': {'source': ('activities', 'Residential Energy'), 'quantities': True},
+    'energy_pie_no_agnel': {'source': ('activities', 'Residential Energy'), 'quantities': True,
+                            'order': ['Heating Oil', 'Electricity'], 'skip_missing': True},
+    'diet_bar': {'source': ('activities', 'Diet'), 'as_dict': True},
+    'energy_bar': {'source': ('activities', 'Residential Energy')},
+    'transport_bar': {'source': ('activities', 'Transport'), 'order': ['Train', 'Car'], 'skip_empty': True},
+    'category_bar': {'source': ('categories',)},
+    'water_bar': {'source': ('category', 'Water')},
+    'total_bar': {'source': ('total',)},
+}
+
+
+# kgCO₂e per litre of mains water: the water supply and water treatment factors (per cubic metre) of the DEFRA
+# conversion factor workbook
+def water_factor_per_litre(table=None):
+    if table is None:
+        from conversion_factors import load_factors
+        table = load_factors()
+    per_cubic_metre = table.activity_factor('Water Supply') + table.activity_factor('Water Treatment')
+    return per_cubic_metre / conversion_factor('cubic metres', 'litres')
+
+
+# Engine over every tracked activity: water in litres, walking in km, everything else already in kgCO₂e. table is
+# the conversion factor table (see conversion_factors.load_factors), loaded when not given.
+def cohort_engine(table=None):
+    activities = [activity for category in CATEGORIES for activity in CATEGORY_ACTIVITIES[category]]
+    water_factor = water_factor_per_litre(table)
+    factors, units = [], []
+    for activity in activities:
+        if activity in CATEGORY_ACTIVITIES['Water']:
+            factors.append(water_factor)  # main.py holds litres of water
+            units.append('litres')
+        elif activity == 'Walking':
+            factors.append(0.0)  # km walked, no emissions
+            units.append('km')
+        else:
+            factors.append(1.0)  # The other modules already hold kgCO₂e
+            units.append(KG_CO2E)
+    return FootprintEngine(activities, factors, units=units)
+
+
+# Engine taking every activity in its own unit: energy and travel as metered (kWh, litres of oil, km,
+# passenger.km), water in litres and walking in km, with the factors of the conversion factor table. Diet stays in
+# kgCO₂e, since the table has no food factors.
+def activity_engine(table=None):
+    from conversion_factors import ACTIVITY_FACTORS, load_factors
+
+    if table is None:
+        table = load_factors()
+    engine = cohort_engine(table)
+    factors, units = engine.factors.copy(), list(engine.units)
+    for j, activity in enumerate(engine.activities):
+        if activity in ACTIVITY_FACTORS:
+            factors[j] = table.activity_factor(activity)
+            units[j] = ACTIVITY_FACTORS[activity][2]
+    return FootprintEngine(engine.activities, factors, units=units)
+
+
+# Build the group's quantities from the data in the chart modules
+def group_cohort():
+    import diet_consumption_pie_chart
+    import energy_usage
+    import main
+    import transport
+
+    engine = cohort_engine()
+    activities = engine.activities
+    water = main.load_data()
+    names = list(water)
+    quantities = np.zeros((len(names), len(activities)))
+    for module_data in (water, transport.load_data(), diet_consumption_pie_chart.load_data(), energy_usage.load_data()):
+        for i, name in enumerate(names):
+            for activity, value in module_data.get(name, {}).items():
+                quantities[i, activities.index(activity)] = np.nan if value is None else value
+    return engine, names, quantities
+
+
+# Dependency graph activity -> category subtotal -> person total -> charts.
+# Changing one value recomputes only the aggregates it feeds and marks only the charts that use them.
+class FootprintGraph:
+    def __init__(self, engine, names, quantities):
+        self.engine = engine
+        self.names = list(names)
+        self._people = {name: i for i, name in enumerate(self.names)}
+        self._activities = {activity: j for j, activity in enumerate(engine.activities)}
+        self.quantities = np.array(quantities, dtype=np.float64)
+
+        # Columns of each category, so one subtotal can be recomputed on its own
+        self._columns = [np.flatnonzero(engine.activity_categories == c) for c in range(len(engine.categories))]
+
+        # Full computation once; missing values (NaN) contribute nothing to the subtotals
+        self.emissions = engine.emissions(self.quantities)
+        self.subtotals = engine.category_totals(emissions=np.nan_to_num(self.emissions))
+        self.totals = self.subtotals.sum(axis=1)
+
+        # Which charts read which node of the graph
+        self._activity_charts, self._subtotal_charts, self._total_charts = {}, {}, []
+        for chart, spec in CHART_INPUTS.items():
+            kind = spec['source'][0]
+            if kind == 'activities':
+                self._activity_charts.setdefault(spec['source'][1], []).append(chart)
+            elif kind == 'category':
+                self._subtotal_charts.setdefault(spec['source'][1], []).append(chart)
+            elif kind == 'categories':
+                for category in engine.categories:
+                    self._subtotal_charts.setdefault(category, []).append(chart)
+            else:
+                self._total_charts.append(chart)
+        self.dirty = set(CHART_INPUTS)  # Nothing has been drawn yet
+
+    # Change one activity value (None = missing) and return the charts that now need redrawing
+    def set(self, person, activity, value):
+        i, j = self._people[person], self._activities[activity]
+        value = np.nan if value is None else float(value)
+        old = self.quantities[i, j]
+        if value == old or (np.isnan(value) and np.isnan(old)):
+            return set()
+
+        category_code = self.engine.activity_categories[j]
+        category = self.engine.categories[category_code]
+        changed = set(self._activity_charts.get(category, []))
+
+        # activity -> category subtotal
+        self.quantities[i, j] = value
+        self.emissions[i, j] = value * self.engine.weights[j]
+        subtotal = np.nansum(self.emissions[i, self._columns[category_code]])
+        if subtotal != self.subtotals[i, category_code]:
+            self.subtotals[i, category_code] = subtotal
+            changed.update(self._subtotal_charts.get(category, []))
+
+            # category subtotal -> person total
+            total = self.subtotals[i].sum()
+            if total != self.totals[i]:
+                self.totals[i] = total
+                changed.update(self._total_charts)
+
+        self.dirty |= changed
+        return changed
+
+    # The data a chart module expects, taken from the current state of the graph
+    def chart_data(self, chart):
+        spec = CHART_INPUTS[chart]
+        kind = spec['source'][0]
+        data = {}
+        for i, name in enumerate(self.names):
+            if kind == 'activities':
+                category = spec['source'][1]
+                order = spec.get('order', CATEGORY_ACTIVITIES[category])
+                columns = [self._activities[activity] for activity in order]
+                row = (self.quantities if spec.get('quantities') else self.emissions)[i, columns]
+                if spec.get('skip_missing') and np.isnan(row).any():
+                    continue
+                if spec.get('skip_empty') and not np.nan_to_num(row).any():
+                    continue
+                values = np.ma.masked_invalid(row).tolist()  # Missing values become None
+                data[name] = dict(zip(order, values)) if spec.get('quantities') or spec.get('as_dict') else values
+            elif kind == 'categories':
+                data[name] = self.subtotals[i].tolist()
+            elif kind == 'category':
+                data[name] = [float(self.subtotals[i, self.engine.categories.index(spec['source'][1])])]
+            else:
+                data[name] = self.subtotals[i].tolist()  # The total chart sums the subtotals itself
+        return data
+
+    # Redraw only the charts marked dirty, using the pooled figures where possible
+    def redraw(self, output_dir='charts', cohort='group', pooled=True):
+        from batch_render import render_job
+
+        redrawn = sorted(self.dirty)
+        for chart in redrawn:
+            render_job(chart, cohort, self.chart_data(chart), output_dir, pooled=pooled)
+        self.dirty.clear()
+        return redrawn
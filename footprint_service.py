@@ -0,0 +1,553 @@
+import argparse
+import asyncio
+import json
+import math
+import mimetypes
+import multiprocessing
+import os
+import shutil
+import tempfile
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+from footprint import CATEGORIES
+from footprint_graph import activity_engine
+from imputation import impute, masked
+from instrumentation import METRICS
+from units import conversion_factor
+
+# Largest number of requests scored in one vectorised batch
+MAX_BATCH = 512
+
+# How long the first request of a batch waits for others to join it (seconds)
+MAX_DELAY = 0.002
+
+# Request bodies larger than this are refused
+MAX_BODY_BYTES = 1 << 20
+
+# Render jobs queued or running at once; further ones are turned away with 503 instead of piling up in memory
+MAX_PENDING_RENDERS = 32
+
+# Finished render jobs kept for download; the oldest are deleted beyond this
+MAX_FINISHED_RENDERS = 256
+
+# Chunk size when streaming rendered files
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+# Raised for requests the service can't answer; becomes an HTTP error response
+class RequestError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+# Response of a route: a JSON payload (plain text when it is a string), or a file to stream when path is set
+class Reply:
+    def __init__(self, payload=None, status=HTTPStatus.OK, path=None, headers=None, release=None):
+        self.payload = payload
+        self.status = status
+        self.path = path
+        self.headers = headers or {}
+        self.release = release  # Called once the reply has been sent or has failed
+
+
+# Coalesces concurrent footprint requests into micro-batches: each request adds one row to a quantity matrix
+# and the whole matrix is scored with a single FootprintEngine call. Quantities are taken in the units of the
+# engine's activities (footprint_graph.activity_engine by default).
+class FootprintBatcher:
+    def __init__(self, engine=None, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.engine = engine or activity_engine()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._columns = {activity: j for j, activity in enumerate(self.engine.activities)}
+        self._queue = asyncio.Queue()
+        self._worker = None
+        self.batches = 0  # Batches scored so far, and the requests in them
+        self.requests = 0
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    # Turn one {'Electricity': 311.2, 'Car': {'quantity': 20, 'unit': 'miles'}, ...} payload into a row of the
+    # quantity matrix. A bare number is in the activity's own unit (self.engine.units); a quantity given with a
+    # unit is converted to it. Unlisted activities count as 0 and null values are missing data.
+    def quantities(self, activities):
+        if not isinstance(activities, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "'activities' must be an object of activity: quantity")
+        row = np.zeros(len(self._columns))
+        for activity, value in activities.items():
+            j = self._columns.get(activity)
+            if j is None:
+                raise RequestError(HTTPStatus.BAD_REQUEST, f'Unknown activity: {activity}')
+            if isinstance(value, dict):
+                if set(value) != {'quantity', 'unit'} or not isinstance(value['unit'], str):
+                    raise RequestError(HTTPStatus.BAD_REQUEST,
+                                       f"Quantity for {activity} must be an object with 'quantity' and 'unit'")
+                try:
+                    factor = conversion_factor(value['unit'], self.engine.units[j])
+                except ValueError as e:
+                    raise RequestError(HTTPStatus.BAD_REQUEST, f'{activity}: {e}')
+                quantity = self._number(activity, value['quantity'])
+                row[j] = quantity * factor
+            else:
+                row[j] = self._number(activity, value)
+        return row
+
+    # Helper function to check one quantity: a finite number, or None for missing data (NaN)
+    @staticmethod
+    def _number(activity, value):
+        if value is None:
+            return np.nan
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            try:
+                value = float(value)
+            except OverflowError:
+                value = math.inf  # An integer too large for a float
+            if math.isfinite(value):
+                return value
+        raise RequestError(HTTPStatus.BAD_REQUEST, f'Quantity for {activity} must be a finite number or null')
+
+    # Footprint of one payload, waiting for the batch it joins to be scored
+    async def score(self, activities):
+        return await self.score_row(self.quantities(activities))
+
+    # Footprint of one row made by quantities()
+    async def score_row(self, row):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+
+            try:
+                results = self._score_batch(np.stack([row for row, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():  # The client may have gone away
+                    future.set_result(result)
+            self.batches += 1
+            self.requests += len(batch)
+
+    # Score a (requests x activities) matrix. Missing quantities count as nothing, as in the bar charts,
+    # and are listed in each result.
+    def _score_batch(self, quantities):
+        quantities = masked(quantities)
+        missing = np.ma.getmaskarray(quantities)
+        _, by_category, totals = self.engine.score(impute(quantities, 'zero'))
+        order = [self.engine.categories.index(category) for category in CATEGORIES]
+        by_category = by_category[:, order].tolist()
+        results = []
+        for i, total in enumerate(totals.tolist()):
+            results.append({
+                'categories': dict(zip(CATEGORIES, by_category[i])),
+                'total': total,
+                'missing': [self.engine.activities[j] for j in np.flatnonzero(missing[i])],
+                'unit': 'tCO2e',
+            })
+        return results
+
+
+# One chart render: its own directory under the queue's root, and a future resolved when the worker is done
+class RenderJob:
+    def __init__(self, job_id, chart, directory, files):
+        self.id = job_id
+        self.chart = chart
+        self.directory = directory
+        self.files = files
+        self.status = 'pending'  # Queued or being drawn
+        self.error = None
+        self.done = asyncio.get_running_loop().create_future()
+        self.downloads = 0  # Files being sent; the job is not deleted until they are
+
+    def describe(self):
+        result = {'job': self.id, 'chart': self.chart, 'status': self.status,
+                  'files': {name: f'/render/{self.id}/{name}' for name in self.files}}
+        if self.error is not None:
+            result['error'] = self.error
+        return result
+
+
+# Renders charts in a bounded process pool so drawing never blocks the event loop.
+# Jobs beyond max_pending are refused (the caller sheds load); finished jobs are kept for download until
+# max_finished newer ones have completed and nobody is downloading them.
+class RenderQueue:
+    def __init__(self, max_workers=None, max_pending=MAX_PENDING_RENDERS, max_finished=MAX_FINISHED_RENDERS,
+                 root=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.root = root
+        self._owns_root = root is None
+        self._executor = None
+        self.jobs = {}
+        self._finished = OrderedDict()  # Job ids in the order they finished
+        self.pending = 0
+
+    def start(self):
+        from batch_render import _init_worker
+
+        if self._executor is None:
+            os.environ.setdefault('MPLBACKEND', 'Agg')
+            if self.root is None:
+                self.root = tempfile.mkdtemp(prefix='footprint-renders-')
+            # Workers come from a forkserver: forked from the server on first use, they would inherit its
+            # listening and client sockets and hold connections open after the server has closed them
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context('forkserver'))
+
+    async def stop(self):
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+            self._executor = None
+        if self._owns_root and self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+
+    # Queue a render of chart with data (the chart module's own data when None) and return the job
+    def submit(self, chart, data=None):
+        from batch_render import CHARTS, instrumented_job
+        from chart_spec import chart_files
+
+        if chart not in CHARTS:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f'Unknown chart: {chart} (choose from {", ".join(CHARTS)})')
+        if data is not None and (not isinstance(data, dict) or not data):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "'data' must be a non-empty object of name: values")
+        if self.pending >= self.max_pending:
+            raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, 'Render queue is full, try again later',
+                               {'Retry-After': '1'})
+
+        job_id = uuid.uuid4().hex
+        files = chart_files(chart, len(data)) if data else CHARTS[chart]['files']
+        job = RenderJob(job_id, chart, os.path.join(self.root, job_id), files)
+        self.jobs[job_id] = job
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, instrumented_job, (chart, job_id, data, self.root, True))
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _finish(self, job, future):
+        self.pending -= 1
+        error = future.exception()
+        if error is None:
+            job.status = 'done'
+            METRICS.merge(future.result()[1])  # The worker's stage timings
+        else:
+            job.status, job.error = 'failed', f'{type(error).__name__}: {error}'
+        job.done.set_result(None)
+
+        self._finished[job.id] = job
+        self._evict()
+
+    # Helper function to delete the oldest finished jobs beyond max_finished; jobs being downloaded are kept and
+    # not counted
+    def _evict(self):
+        idle = [old for old in self._finished.values() if not old.downloads]
+        for old in idle[:max(0, len(idle) - self.max_finished)]:
+            del self._finished[old.id]
+            del self.jobs[old.id]
+            shutil.rmtree(old.directory, ignore_errors=True)
+
+    # Keep job's files until the returned function is called
+    def hold(self, job):
+        job.downloads += 1
+
+        def release():
+            job.downloads -= 1
+            if not job.downloads:
+                self._evict()
+
+        return release
+
+    def job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, f'No render job {job_id}')
+        return job
+
+
+# HTTP/1.1 front end: POST /footprint with {"activities": {...}} (or a list of them) returns per-category
+# and total tCO₂e; GET /units lists the unit each activity is taken in, GET /health reports batching statistics
+# and GET /metrics the per-stage timings in Prometheus text format, render workers included. Connections are kept
+# alive between requests.
+# With a render queue, POST /render {"chart": ..., "data": ...} queues a chart and returns its job id,
+# GET /render/<job> reports its status and GET /render/<job>/<file> streams the PNG/SVG once it is ready.
+class FootprintService:
+    def __init__(self, batcher=None, renders=None):
+        self.batcher = batcher or FootprintBatcher()
+        self.renders = renders
+        self.routes = {
+            ('POST', '/footprint'): self.footprint,
+            ('GET', '/units'): self.units,
+            ('GET', '/health'): self.health,
+            ('GET', '/metrics'): self.metrics,
+        }
+        self.prefix_routes = {}  # (method, path prefix) -> handler(body, rest of the path)
+        if renders is not None:
+            self.routes[('POST', '/render')] = self.render
+            self.prefix_routes[('GET', '/render/')] = self.render_status
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.batcher.start()
+        if self.renders is not None:
+            self.renders.start()
+        self._server = await asyncio.start_server(self._connection, host, port)
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+        if self.renders is not None:
+            await self.renders.stop()
+
+    # POST /footprint: the body is {"activities": {activity: quantity, ...}} or a list of them, answered with
+    # {"categories": {...}, "total": ..., "missing": [...], "unit": "tCO2e"} for each. A quantity is one of
+    #   a number        - in the activity's unit (GET /units): kWh of electricity, litres of heating oil and of
+    #                     water, km by car or on foot, passenger.km by train, kgCO₂e of each food
+    #   {"quantity": 20, "unit": "miles"} - in any unit that converts to the activity's unit
+    #   null            - not known: scored as nothing and listed under "missing"
+    # Unknown activities, units that don't convert and quantities that aren't finite numbers are refused with 400.
+    async def footprint(self, body):
+        if isinstance(body, list):
+            # Every item is checked before any is queued, so a bad one fails the request without leaving others behind
+            rows = [self.batcher.quantities(self._activities(item)) for item in body]
+            return list(await asyncio.gather(*(self.batcher.score_row(row) for row in rows)))
+        return await self.batcher.score(self._activities(body))
+
+    async def units(self, body):
+        return dict(zip(self.batcher.engine.activities, self.batcher.engine.units))
+
+    async def health(self, body):
+        result = {'status': 'ok', 'batches': self.batcher.batches, 'requests': self.batcher.requests}
+        if self.renders is not None:
+            result['renders_pending'] = self.renders.pending
+        return result
+
+    async def metrics(self, body):
+        return METRICS.to_prometheus()
+
+    async def render(self, body):
+        if not isinstance(body, dict) or 'chart' not in body:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Expected an object with 'chart'")
+        job = self.renders.submit(body['chart'], body.get('data'))
+        return Reply(job.describe(), HTTPStatus.ACCEPTED, headers={'Location': f'/render/{job.id}'})
+
+    # GET /render/<job> is the job's status; GET /render/<job>/<file> waits for the job and streams the file
+    async def render_status(self, body, rest):
+        job_id, _, name = rest.partition('/')
+        job = self.renders.job(job_id)
+        if not name:
+            return job.describe()
+        if name not in job.files:
+            raise RequestError(HTTPStatus.NOT_FOUND, f'Job {job_id} has no file {name}')
+        await asyncio.shield(job.done)
+        if job.status == 'failed':
+            raise RequestError(HTTPStatus.INTERNAL_SERVER_ERROR, job.error)
+        if self.renders.jobs.get(job_id) is not job:
+            # Deleted to make room for newer jobs while this request waited
+            raise RequestError(HTTPStatus.NOT_FOUND, f'Render job {job_id} has been deleted')
+        return Reply(path=os.path.join(job.directory, name), release=self.renders.hold(job))
+
+    # Helper function to pull the activity quantities out of one request object
+    @staticmethod
+    def _activities(item):
+        if not isinstance(item, dict) or 'activities' not in item:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Expected an object with 'activities'")
+        return item['activities']
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except RequestError as e:
+                    await self._respond(writer, Reply({'error': str(e)}, e.status, headers=e.headers), False)
+                    break
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    await self._respond(writer, Reply({'error': 'Internal server error'},
+                                                      HTTPStatus.INTERNAL_SERVER_ERROR), False)
+                    break
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                await self._respond(writer, await self._dispatch(method, path, body), keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # Read one request: (method, path, parsed JSON body or None, keep-alive), or None at end of stream
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'Malformed request line')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+        if length < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+        if length > MAX_BODY_BYTES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+        body = None
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                raise RequestError(HTTPStatus.BAD_REQUEST, 'Request body must be JSON')
+            except RecursionError:
+                raise RequestError(HTTPStatus.BAD_REQUEST, 'Request body is nested too deeply')
+        return method, target.split('?', 1)[0], body, keep_alive
+
+    async def _dispatch(self, method, path, body):
+        handler, args = self.routes.get((method, path)), (body,)
+        if handler is None:
+            for (route_method, prefix), prefix_handler in self.prefix_routes.items():
+                if route_method == method and path.startswith(prefix):
+                    handler, args = prefix_handler, (body, path[len(prefix):])
+                    break
+        if handler is None:
+            known = [route_path for _, route_path in self.routes]
+            if path in known or any(path.startswith(prefix) for _, prefix in self.prefix_routes):
+                return Reply({'error': f'{method} not allowed on {path}'}, HTTPStatus.METHOD_NOT_ALLOWED)
+            return Reply({'error': f'No route for {path}'}, HTTPStatus.NOT_FOUND)
+        try:
+            reply = await handler(*args)
+        except RequestError as e:
+            return Reply({'error': str(e)}, e.status, headers=e.headers)
+        except Exception:
+            # A bug in a handler still gets the client a response
+            traceback.print_exc()
+            return Reply({'error': 'Internal server error'}, HTTPStatus.INTERNAL_SERVER_ERROR)
+        return reply if isinstance(reply, Reply) else Reply(reply)
+
+    @staticmethod
+    async def _respond(writer, reply, keep_alive):
+        try:
+            await FootprintService._write_reply(writer, reply, keep_alive)
+        finally:
+            if reply.release is not None:
+                reply.release()
+
+    @staticmethod
+    async def _write_reply(writer, reply, keep_alive):
+        if isinstance(reply.payload, str):
+            body = reply.payload.encode('utf-8')
+            content_type, length = 'text/plain; version=0.0.4; charset=utf-8', len(body)
+        elif reply.path is None:
+            body = json.dumps(reply.payload).encode('utf-8')
+            content_type, length = 'application/json', len(body)
+        else:
+            content_type = mimetypes.guess_type(reply.path)[0] or 'application/octet-stream'
+            length = os.path.getsize(reply.path)
+        headers = {'Content-Type': content_type, 'Content-Length': length,
+                   'Connection': 'keep-alive' if keep_alive else 'close', **reply.headers}
+        head = f'HTTP/1.1 {reply.status.value} {reply.status.phrase}\r\n'
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+        writer.write(head.encode('latin-1'))
+        if reply.path is None:
+            writer.write(body)
+        else:
+            # Stream the file in chunks, waiting for the client to keep up
+            with open(reply.path, 'rb') as f:
+                while chunk := f.read(STREAM_CHUNK_BYTES):
+                    writer.write(chunk)
+                    await writer.drain()
+        await writer.drain()
+
+
+async def serve(host, port, max_batch=MAX_BATCH, max_delay=MAX_DELAY, render=False, render_workers=None,
+                max_pending=MAX_PENDING_RENDERS):
+    renders = RenderQueue(render_workers, max_pending) if render else None
+    service = FootprintService(FootprintBatcher(max_batch=max_batch, max_delay=max_delay), renders)
+    server = await service.start(host, port)
+    print(f'Serving footprints on http://{host}:{port}/footprint')
+    if render:
+        print(f'Rendering charts on http://{host}:{port}/render')
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local HTTP API returning per-category and total tCO₂e.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='most requests scored in one batch')
+    parser.add_argument('--max-delay', type=float, default=MAX_DELAY * 1000,
+                        help='how long a batch waits for more requests (ms)')
+    parser.add_argument('--render', action='store_true', help='also serve chart images from a render queue')
+    parser.add_argument('--render-workers', type=int, default=None,
+                        help='render worker processes (default: all cores)')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING_RENDERS,
+                        help='render jobs queued or running before new ones are refused')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_delay / 1000, args.render,
+                          args.render_workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,225 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from footprint_graph import cohort_engine
+from ingest import DEFAULT_CHUNK_SIZE, activity_columns, activity_quantities, iter_chunks, split_file
+from instrumentation import stage
+
+# Percentiles of the per-person totals reported for every group unless asked otherwise
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+# What a group's charts can show: the category totals of the whole group or of its average person
+CHART_STATISTICS = ('sum', 'mean')
+
+# Charts drawn per group; the groups take the place of the people
+GROUP_CHARTS = ('category_bar', 'total_bar')
+
+# The file is split into this many shares per worker, so one slow share doesn't hold the others up
+PARTS_PER_WORKER = 4
+
+
+# Helper function to number the distinct combinations of equally long label arrays. Returns the label arrays of
+# every combination (in sorted order) and the combination of each row.
+def _combinations(keys):
+    codes = np.empty((len(keys[0]), len(keys)), dtype=np.intp)
+    combination = np.zeros(len(keys[0]), dtype=np.int64)
+    labels = []
+    for k, key in enumerate(keys):
+        # A dictionary numbers the labels far faster than sorting an object array; only the distinct ones are sorted
+        lookup = {}
+        first_seen = np.fromiter((lookup.setdefault(value, len(lookup)) for value in key), dtype=np.intp,
+                                 count=len(key))
+        distinct = np.empty(len(lookup), dtype=object)
+        distinct[:] = list(lookup)
+        order = np.argsort(distinct)
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        codes[:, k] = rank[first_seen]
+        labels.append(distinct[order])
+
+        # Renumber the combinations so far after every key, so the combined code never overflows
+        _, combination = np.unique(combination * len(order) + codes[:, k], return_inverse=True)
+        combination = combination.reshape(-1)
+    _, rows = np.unique(combination, return_index=True)
+    return [label[codes[rows, k]] for k, label in enumerate(labels)], combination
+
+
+# Helper function to add up the rows of values (n x columns) of each combination
+def _sum_rows(inverse, values, groups):
+    return np.column_stack([np.bincount(inverse, weights=column, minlength=groups) for column in values.T])
+
+
+# Per-person category emissions (tCO₂e by default) within each group of one or more key columns. Aggregates of
+# separate chunks or processes merge into the aggregate of all their records (see merge_aggregates): a person's
+# total is only final once every share of the file has been added up, so percentiles are taken at the end.
+class GroupAggregate:
+    def __init__(self, keys, categories, groups=None, people=None, totals=None, skipped=0):
+        self.keys = list(keys)
+        self.categories = list(categories)
+        self.groups = groups if groups is not None else [np.empty(0, dtype=object) for _ in self.keys]
+        self.people = people if people is not None else np.empty(0, dtype=object)
+        self.totals = totals if totals is not None else np.zeros((0, len(self.categories)))
+        self.skipped = skipped  # Records without a quantity
+
+    def __len__(self):
+        return len(self.people)
+
+    # Sum, mean and percentiles of every group
+    def statistics(self, percentiles=DEFAULT_PERCENTILES):
+        return GroupStatistics(self, percentiles)
+
+
+# Sum, mean and percentiles of the groups of an aggregate. sum and mean are (groups x categories) arrays in the
+# aggregate's category order; percentiles is (groups x percentiles), over the totals of the people in a group.
+class GroupStatistics:
+    def __init__(self, aggregate, percentiles=DEFAULT_PERCENTILES):
+        self.keys = aggregate.keys
+        self.categories = aggregate.categories
+        self.levels = list(percentiles)
+        if not len(aggregate):
+            self.groups = [key[:0] for key in aggregate.groups]
+            self.people = np.zeros(0, dtype=np.intp)
+            self.sum = self.mean = np.zeros((0, len(self.categories)))
+            self.percentiles = np.zeros((0, len(self.levels)))
+            return
+
+        self.groups, inverse = _combinations(aggregate.groups)
+        count = len(self.groups[0])
+        self.people = np.bincount(inverse, minlength=count)
+        self.sum = _sum_rows(inverse, aggregate.totals, count)
+        self.mean = self.sum / self.people[:, None]
+
+        # Percentiles of every group at once (linear interpolation, as np.percentile): the person totals sorted
+        # within each group, then the two values either side of each percentile's position
+        totals = aggregate.totals.sum(axis=1)
+        ordered = totals[np.lexsort((totals, inverse))]
+        offsets = np.concatenate(([0], np.cumsum(self.people)[:-1]))
+        positions = (self.people[:, None] - 1) * (np.asarray(self.levels, dtype=np.float64) / 100)
+        below = np.floor(positions).astype(np.intp)
+        above = np.ceil(positions).astype(np.intp)
+        low, high = ordered[offsets[:, None] + below], ordered[offsets[:, None] + above]
+        self.percentiles = low + (high - low) * (positions - below)
+
+    def __len__(self):
+        return len(self.people)
+
+    # Name of every group: its key value, or its key values joined by ' / '
+    def labels(self):
+        return [' / '.join(map(str, values)) for values in zip(*self.groups)]
+
+    # Per-group category values as {'group': [energy, water, transport, diet]}, the data of bar_charts.py and
+    # bar_chart_total.py with groups in place of people; statistic is 'sum' or 'mean'
+    def chart_data(self, statistic='mean'):
+        if statistic not in CHART_STATISTICS:
+            raise ValueError(f'Unknown statistic {statistic!r}; expected one of {", ".join(CHART_STATISTICS)}')
+        return dict(zip(self.labels(), getattr(self, statistic).tolist()))
+
+    # One row per group: key values, people, total sum and mean, then the percentiles
+    def rows(self):
+        header = self.keys + ['people', 'sum', 'mean'] + [f'p{level:g}' for level in self.levels]
+        rows = [header]
+        for values, people, total, mean, percentiles in zip(zip(*self.groups), self.people.tolist(),
+                                                            self.sum.sum(axis=1).tolist(),
+                                                            self.mean.sum(axis=1).tolist(), self.percentiles.tolist()):
+            rows.append(list(values) + [people, total, mean] + percentiles)
+        return rows
+
+
+# Aggregate one chunk of records (see ingest.iter_chunks) by the key columns; records without a quantity are
+# skipped, and the others are converted to the units of the engine's activities
+@stage('aggregation')
+def aggregate_chunk(chunk, keys, engine):
+    quantity = chunk['quantity']
+    keep = ~np.isnan(quantity)
+    skipped = int(len(quantity) - keep.sum())
+    if not keep.any():
+        return GroupAggregate(keys, engine.categories, skipped=skipped)
+
+    columns = activity_columns(chunk['activity'][keep], engine.activities)
+    quantity = activity_quantities(quantity[keep], chunk['unit'][keep], columns, engine.units)
+    emissions = quantity * engine.weights[columns]
+    by_category = np.zeros((len(emissions), len(engine.categories)))
+    by_category[np.arange(len(emissions)), engine.activity_categories[columns]] = emissions
+
+    labels, inverse = _combinations([chunk[key][keep] for key in keys] + [chunk['person'][keep]])
+    totals = _sum_rows(inverse, by_category, len(labels[0]))
+    return GroupAggregate(keys, engine.categories, labels[:-1], labels[-1], totals, skipped)
+
+
+# Merge aggregates of separate shares of the records into one
+def merge_aggregates(aggregates):
+    aggregates = list(aggregates)
+    first = aggregates[0]
+    skipped = sum(aggregate.skipped for aggregate in aggregates)
+    aggregates = [aggregate for aggregate in aggregates if len(aggregate)]
+    if len(aggregates) < 2:
+        kept = aggregates[0] if aggregates else first
+        return GroupAggregate(first.keys, first.categories, kept.groups, kept.people, kept.totals, skipped)
+
+    keys = [np.concatenate([aggregate.groups[k] for aggregate in aggregates]) for k in range(len(first.keys))]
+    keys.append(np.concatenate([aggregate.people for aggregate in aggregates]))
+    labels, inverse = _combinations(keys)
+    totals = _sum_rows(inverse, np.concatenate([aggregate.totals for aggregate in aggregates]), len(labels[0]))
+    return GroupAggregate(first.keys, first.categories, labels[:-1], labels[-1], totals, skipped)
+
+
+# Aggregate one share of a file (see ingest.split_file), or the whole file when part is None. The chunks are
+# merged once at the end: merging after every chunk would renumber everything so far each time.
+def aggregate_part(path, keys, engine, chunk_size=DEFAULT_CHUNK_SIZE, part=None):
+    chunks = iter_chunks(path, chunk_size, keys=keys, part=part)
+    aggregates = [GroupAggregate(keys, engine.categories)] + [aggregate_chunk(chunk, keys, engine) for chunk in chunks]
+    return merge_aggregates(aggregates)
+
+
+# Group-by over a whole activity file: per-person category emissions added up within each group of the key columns
+# (e.g. ['postcode'] or ['region', 'household']). The file is split into shares aggregated across a process pool,
+# and their partial aggregates are merged.
+def group_by(path, keys, engine=None, chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    engine = cohort_engine() if engine is None else engine
+    workers = max_workers or os.cpu_count() or 1
+    parts = split_file(path, workers * PARTS_PER_WORKER) if workers > 1 else [None]
+    if len(parts) == 1:
+        return aggregate_part(path, keys, engine, chunk_size, parts[0])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(aggregate_part, path, keys, engine, chunk_size, part) for part in parts]
+        return merge_aggregates(future.result() for future in futures)
+
+
+# Draw the per-group charts (category bars and totals, one bar chart per group) from the statistic of every group;
+# many groups are drawn over several pages. Returns the paths written.
+def plot_group_charts(statistics, output_dir='charts', statistic='mean', charts=GROUP_CHARTS):
+    from figure_pool import FigurePool, render_pages
+
+    data = statistics.chart_data(statistic)
+    os.makedirs(output_dir, exist_ok=True)
+    pool = FigurePool()
+    written = []
+    try:
+        for chart in charts:
+            for paths in render_pages(chart, data, output_dir, pool):
+                written.extend(paths)
+    finally:
+        pool.close()
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Group activity records by any columns and summarise their tCO₂e')
+    parser.add_argument('records', help='CSV or Parquet file of activity records')
+    parser.add_argument('--by', nargs='+', required=True, help='columns to group by, e.g. postcode')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: all cores)')
+    parser.add_argument('--percentiles', type=float, nargs='+', default=list(DEFAULT_PERCENTILES))
+    parser.add_argument('--charts', metavar='DIR', help='also draw the per-group charts into DIR')
+    parser.add_argument('--statistic', choices=CHART_STATISTICS, default='mean', help='what the charts show')
+    args = parser.parse_args()
+
+    result = group_by(args.records, args.by, max_workers=args.workers).statistics(args.percentiles)
+    for row in result.rows():
+        print('\t'.join(format(value, '.4f') if isinstance(value, float) else str(value) for value in row))
+    if args.charts:
+        written = plot_group_charts(result, args.charts, args.statistic)
+        print(f'{len(written)} chart files in {args.charts}')
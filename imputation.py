@@ -0,0 +1,33 @@
+import numpy as np
+
+# Ways of filling in missing answers:
+# 'zero'    - count them as nothing (what the category totals always did)
+# 'median'  - the cohort median of the activity, over the people who answered
+# 'default' - a per-activity default for the region, supplied by the caller
+IMPUTATION_POLICIES = ('zero', 'median', 'default')
+
+
+# Mask the missing values (NaN or None) of a (people x activities) array
+def masked(values):
+    if np.ma.isMaskedArray(values):
+        return values
+    return np.ma.masked_invalid(np.asarray(values, dtype=np.float64))
+
+
+# Fill the missing values of a (people x activities) array by an imputation policy, returning a masked array in
+# which only the values nothing could be imputed from stay masked (an activity no one in the cohort answered, or
+# one without a regional default). defaults maps activity names to values, with activities naming the columns.
+def impute(values, policy, activities=None, defaults=None):
+    values = masked(values)
+    if policy == 'zero':
+        fill = np.zeros(values.shape[-1])
+    elif policy == 'median':
+        fill = np.ma.median(values, axis=0).filled(np.nan) if values.shape[0] else np.full(values.shape[-1], np.nan)
+    elif policy == 'default':
+        if defaults is None or activities is None:
+            raise ValueError("The 'default' policy needs activities and per-activity defaults")
+        fill = np.array([defaults.get(activity, np.nan) for activity in activities], dtype=np.float64)
+    else:
+        raise ValueError(f'Unknown imputation policy {policy!r}; expected one of {", ".join(IMPUTATION_POLICIES)}')
+    filled = np.where(np.ma.getmaskarray(values), fill, values.filled(0.0))
+    return np.ma.masked_invalid(filled)
@@ -0,0 +1,204 @@
+import csv
+import os
+
+import numpy as np
+
+from units import convert_column, unit_codes
+
+# Columns every activity record carries, whatever the file format
+RECORD_FIELDS = ['person', 'category', 'activity', 'quantity', 'unit']
+
+# Extra column of dated records (daily meter readings, trips): the day the quantity was used, as an ISO date
+DATE_FIELD = 'date'
+
+# Rows read per chunk unless the caller asks otherwise
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+# Columns read from a file: the record fields, the date column for dated records, then any extra text columns
+# (keys) such as a household, postcode or region to group by
+def _fields(dated, keys=()):
+    fields = RECORD_FIELDS + [DATE_FIELD] if dated else list(RECORD_FIELDS)
+    return fields + [key for key in keys if key not in fields]
+
+
+# Helper function to turn lists of raw values into one chunk of column arrays; dates (ISO strings, dates or
+# datetimes) become numpy days
+def _make_chunk(fields, columns):
+    chunk = {}
+    for field, values in zip(fields, columns):
+        if field == 'quantity':
+            chunk[field] = np.asarray(values, dtype=np.float64)
+        elif field == DATE_FIELD:
+            chunk[field] = np.asarray(values, dtype='datetime64').astype('datetime64[D]')
+        else:
+            chunk[field] = np.asarray(values, dtype=object)
+    return chunk
+
+
+# Helper function to yield the lines of a CSV file (after its header) whose first byte lies in [start, end)
+def _lines_in_range(f, start, end):
+    if start > f.tell():
+        f.seek(start - 1)
+        f.readline()  # The line the range starts inside belongs to the previous range
+    while end is None or f.tell() < end:
+        line = f.readline()
+        if not line:
+            return
+        yield line.decode('utf-8')
+
+
+# Stream activity records from a CSV file with a header row, chunk_size rows at a time. Dated records also read
+# the date column, and keys names extra text columns to read. part is a (start, end) byte range from split_file,
+# for reading one share of the file.
+def iter_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, dated=False, keys=(), part=None):
+    fields = _fields(dated, keys)
+    start, end = part or (0, None)
+    with open(path, 'rb') as f:
+        # utf-8-sig drops the byte order mark spreadsheet exports put before the first column name
+        header = next(csv.reader([f.readline().decode('utf-8-sig')]), None)
+        if header is None:
+            return
+        header = [name.strip().lower() for name in header]
+        missing = [field for field in fields if field not in header]
+        if missing:
+            raise ValueError(f'{path} is missing columns: {", ".join(missing)}')
+        positions = [header.index(field) for field in fields]
+
+        columns = [[] for _ in fields]
+        for row in csv.reader(_lines_in_range(f, start, end)):
+            if not row:
+                continue
+            for column, position in zip(columns, positions):
+                column.append(row[position])
+            if len(columns[0]) == chunk_size:
+                yield _make_chunk(fields, _parse_quantities(columns))
+                columns = [[] for _ in fields]
+        if columns[0]:
+            yield _make_chunk(fields, _parse_quantities(columns))
+
+
+# Helper function to convert the quantity column of a CSV chunk; blank cells become NaN (missing data)
+def _parse_quantities(columns):
+    quantity = columns[3]
+    columns[3] = [float(value) if value.strip() else np.nan for value in quantity]
+    return columns
+
+
+# Stream activity records from a Parquet file, chunk_size rows at a time (needs pyarrow). part is a list of row
+# groups from split_file, for reading one share of the file.
+def iter_parquet_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, dated=False, keys=(), part=None):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError('Reading Parquet files requires pyarrow (pip install pyarrow)') from e
+
+    fields = _fields(dated, keys)
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=part, columns=fields):
+        columns = batch.to_pydict()
+        columns['quantity'] = [np.nan if value is None else value for value in columns['quantity']]
+        yield _make_chunk(fields, [columns[field] for field in fields])
+
+
+# Helper function to tell the file type from the extension
+def _file_type(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.csv', '.txt'):
+        return 'csv'
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    raise ValueError(f'Unsupported activity file type: {extension}')
+
+
+# Pick the reader from the file extension
+def iter_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, dated=False, keys=(), part=None):
+    if _file_type(path) == 'csv':
+        return iter_csv_chunks(path, chunk_size, dated, keys, part)
+    return iter_parquet_chunks(path, chunk_size, dated, keys, part)
+
+
+# Split a file into at most parts shares that separate processes can read with iter_chunks(..., part=share):
+# byte ranges of a CSV file (quoted fields must not span lines) or lists of row groups of a Parquet file
+def split_file(path, parts):
+    if _file_type(path) == 'parquet':
+        import pyarrow.parquet as pq
+
+        groups = pq.ParquetFile(path).metadata.num_row_groups
+        return [shares.tolist() for shares in np.array_split(np.arange(groups), min(parts, groups) or 1)]
+    size = os.path.getsize(path)
+    bounds = np.linspace(0, size, max(1, min(parts, size)) + 1).astype(np.int64).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Column of every record's activity in the engine's activity order
+def activity_columns(values, activities):
+    columns = {activity: j for j, activity in enumerate(activities)}
+    activity_names, activity_codes = np.unique(values, return_inverse=True)
+    unknown = [name for name in activity_names if name not in columns]
+    if unknown:
+        raise ValueError(f'Unknown activities: {", ".join(map(str, unknown))}')
+    column_of = np.array([columns[name] for name in activity_names], dtype=np.intp)
+    return column_of[activity_codes]
+
+
+# Quantities of records converted to the units of their activities (activity_units, one per activity as in
+# FootprintEngine.units) in one multiply; a record whose unit can't be converted is rejected with a ValueError.
+# Records without a unit are taken to be in their activity's unit already.
+def activity_quantities(quantities, units, columns, activity_units):
+    return convert_column(quantities, units, unit_codes(activity_units)[columns])
+
+
+# Pivot one chunk of records into a (people x activities) quantity matrix for the engine, converting quantities
+# to the activity units when given. Records without a quantity are skipped: (names, matrix, records skipped).
+def chunk_to_matrix(chunk, activities, units=None):
+    quantities = chunk['quantity']
+    keep = ~np.isnan(quantities)
+    skipped = int(len(quantities) - keep.sum())
+    columns = activity_columns(chunk['activity'][keep], activities)
+    quantities = quantities[keep]
+    if units is not None:
+        quantities = activity_quantities(quantities, chunk['unit'][keep], columns, units)
+    names, rows = np.unique(chunk['person'][keep], return_inverse=True)
+    matrix = np.zeros((len(names), len(activities)))
+    np.add.at(matrix, (rows, columns), quantities)
+    return list(names), matrix, skipped
+
+
+# Running per-person category totals that grow as new people turn up in later chunks
+class FootprintAccumulator:
+    def __init__(self, categories):
+        self.categories = list(categories)
+        self.names = []
+        self._rows = {}
+        self.totals = np.zeros((0, len(self.categories)))
+        self.skipped = 0  # Records without a quantity
+
+    def add(self, names, category_totals, skipped=0):
+        self.skipped += skipped
+        rows = np.empty(len(names), dtype=np.intp)
+        for i, name in enumerate(names):
+            row = self._rows.get(name)
+            if row is None:
+                row = self._rows[name] = len(self.names)
+                self.names.append(name)
+            rows[i] = row
+        if len(self.names) > len(self.totals):
+            grown = np.zeros((max(len(self.names), 2 * len(self.totals)), len(self.categories)))
+            grown[:len(self.totals)] = self.totals
+            self.totals = grown
+        np.add.at(self.totals, rows, category_totals)
+
+    # Per-person category totals and overall totals for everyone seen so far, and the records skipped
+    def result(self):
+        by_category = self.totals[:len(self.names)]
+        return list(self.names), by_category, by_category.sum(axis=1), self.skipped
+
+
+# Stream a whole activity file through the footprint engine, one chunk at a time
+def stream_footprints(path, engine, chunk_size=DEFAULT_CHUNK_SIZE):
+    accumulator = FootprintAccumulator(engine.categories)
+    for chunk in iter_chunks(path, chunk_size):
+        names, matrix, skipped = chunk_to_matrix(chunk, engine.activities, engine.units)
+        accumulator.add(names, engine.category_totals(matrix), skipped)
+    return accumulator.result()
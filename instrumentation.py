@@ -0,0 +1,180 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Pipeline stages, in pipeline order. They are always exported, with zero counts until they run, so every series
+# exists from the start.
+#   factor_lookup - the conversion-factor table loaded (from its cache or the workbook) or attached
+#   aggregation   - quantities scored into per-activity, per-category and per-person emissions
+#   layout        - a figure updated for new data: wedge geometry, labels, axis limits, tight_layout
+#   draw          - the Agg draw of a finished figure
+#   encode        - PNG compression and SVG generation
+#   write         - output files written or copied into place
+STAGES = ['factor_lookup', 'aggregation', 'layout', 'draw', 'encode', 'write']
+
+# Metric names in the Prometheus export start with this
+PROMETHEUS_PREFIX = 'footprint_stage'
+
+
+# Counters of one stage: calls, total/min/max seconds and, while memory is traced, the largest peak of
+# allocations made during one call
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.min_seconds = float('inf')
+        self.max_seconds = 0.0
+        self.peak_bytes = 0
+
+    def add(self, calls, seconds, min_seconds, max_seconds, peak_bytes=0):
+        self.calls += calls
+        self.seconds += seconds
+        self.min_seconds = min(self.min_seconds, min_seconds)
+        self.max_seconds = max(self.max_seconds, max_seconds)
+        self.peak_bytes = max(self.peak_bytes, peak_bytes)
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'min_seconds': self.min_seconds if self.calls else 0.0,
+            'max_seconds': self.max_seconds,
+            'mean_seconds': self.seconds / self.calls if self.calls else 0.0,
+            'peak_bytes': self.peak_bytes,
+        }
+
+
+# Times one stage; used as a context manager or as a decorator
+class _Stage(contextlib.ContextDecorator):
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self._starts = threading.local()
+
+    def __enter__(self):
+        starts = self._starts.__dict__.setdefault('stack', [])
+        memory = None
+        if self.metrics.memory and tracemalloc.is_tracing():
+            # The peak is reset, so a nested stage's peak is exact and its enclosing stage's is a lower bound
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        starts.append((time.perf_counter(), memory))
+        return self
+
+    def __exit__(self, *exc):
+        start, memory = self._starts.stack.pop()
+        seconds = time.perf_counter() - start
+        peak = 0
+        if memory is not None and tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - memory)
+        self.metrics.record(self.name, seconds, peak)
+        return False
+
+
+# Per-stage timing of the pipeline within one process. Cheap enough to stay on in production: a stage costs two
+# perf_counter calls and a locked update. Worker processes send snapshots of their counters back to be merged.
+class Instrumentation:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self._lock = threading.Lock()
+        self._stats = {name: StageStats() for name in STAGES}
+        self._stages = {}
+
+    # Context manager and decorator timing a stage: `with METRICS.stage('draw'):` or `@METRICS.stage('layout')`
+    def stage(self, name):
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage(self, name)
+        return stage
+
+    def record(self, name, seconds, peak_bytes=0):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = StageStats()
+            stats.add(1, seconds, seconds, seconds, peak_bytes)
+
+    # Trace memory allocations (tracemalloc) so every stage also reports its peak; slows the pipeline down noticeably
+    def trace_memory(self, enabled=True):
+        self.memory = enabled
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    # Counters of every stage as {'draw': {'calls': ..., 'seconds': ...}, ...}
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+    # Add the counters of another process's snapshot
+    def merge(self, snapshot):
+        with self._lock:
+            for name, values in snapshot.items():
+                if not values['calls']:
+                    continue
+                stats = self._stats.get(name)
+                if stats is None:
+                    stats = self._stats[name] = StageStats()
+                stats.add(values['calls'], values['seconds'], values['min_seconds'], values['max_seconds'],
+                          values['peak_bytes'])
+
+    def reset(self):
+        with self._lock:
+            self._stats = {name: StageStats() for name in STAGES}
+
+    def to_json(self, **meta):
+        return json.dumps(dict(meta, stages=self.snapshot()), indent=2)
+
+    # Prometheus text exposition format: a counter of calls and of seconds per stage, and gauges for the slowest
+    # call and the memory peak
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        series = [
+            ('calls_total', 'counter', 'Calls of each pipeline stage', 'calls'),
+            ('seconds_total', 'counter', 'Seconds spent in each pipeline stage', 'seconds'),
+            ('max_seconds', 'gauge', 'Slowest single call of each pipeline stage', 'max_seconds'),
+            ('peak_bytes', 'gauge', 'Largest allocation peak of one call of each stage (memory tracing only)',
+             'peak_bytes'),
+        ]
+        snapshot = self.snapshot()
+        lines = []
+        for suffix, kind, help_text, key in series:
+            name = f'{prefix}_{suffix}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{{stage="{stage_name}"}} {values[key]!r}' for stage_name, values in snapshot.items())
+        return '\n'.join(lines) + '\n'
+
+    # cProfile everything run inside the block. The statistics are dumped to path (for pstats/snakeviz) when given;
+    # the block's target is a list that receives the report of the slowest functions.
+    @contextlib.contextmanager
+    def profile(self, path=None, sort='cumulative', limit=30):
+        profiler = cProfile.Profile()
+        report = []
+        profiler.enable()
+        try:
+            yield report
+        finally:
+            profiler.disable()
+            if path is not None:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                profiler.dump_stats(path)
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats(sort).print_stats(limit)
+            report.append(text.getvalue())
+
+
+# Counters of this process, shared by every module of the pipeline
+METRICS = Instrumentation()
+
+
+# Time a stage with the process's counters: `with stage('draw'):` or `@stage('aggregation')`
+def stage(name):
+    return METRICS.stage(name)
+
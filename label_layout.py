@@ -0,0 +1,186 @@
+import heapq
+
+import numpy as np
+
+from pie_geometry import bisectors, leader_ends
+
+
+# Size of a text artist in data units of its axes (pie axes have an equal aspect, so one scale fits both)
+def text_size(ax, text, renderer):
+    extent = text.get_window_extent(renderer)
+    (x0, y0), (x1, y1) = ax.transData.transform([(0, 0), (1, 1)])
+    return extent.width / abs(x1 - x0), extent.height / abs(y1 - y0)
+
+
+# Every pair of overlapping boxes (x0, y0, x1, y1), found with a sort-and-sweep along x:
+# boxes are visited by left edge and only compared with the ones whose x-interval is still open
+def find_overlaps(boxes):
+    boxes = [tuple(box) for box in boxes]
+    order = sorted(range(len(boxes)), key=lambda i: boxes[i][0])
+    active = []  # Heap of (right edge, index) of boxes the sweep line is still inside
+    pairs = []
+    for i in order:
+        x0, y0, x1, y1 = boxes[i]
+        while active and active[0][0] <= x0:
+            heapq.heappop(active)
+        for _, j in active:
+            if boxes[j][1] < y1 and y0 < boxes[j][3]:
+                pairs.append((min(i, j), max(i, j)))
+        heapq.heappush(active, (x1, i))
+    return pairs
+
+
+# Centres closest (least squares) to the desired ones that keep labels, given in order along one axis,
+# at least gap apart. Pool-adjacent-violators: linear in the number of labels.
+def spread(desired, heights, gap=0.0):
+    offsets = [0.0]
+    for below, above in zip(heights, heights[1:]):
+        offsets.append(offsets[-1] + (below + above) / 2 + gap)
+
+    # With the offsets removed the constraint is just "non-decreasing", solved by merging blocks
+    blocks = []  # [mean, count]
+    for target in (y - offset for y, offset in zip(desired, offsets)):
+        blocks.append([target, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            mean, count = blocks.pop()
+            blocks[-1][0] = (blocks[-1][0] * blocks[-1][1] + mean * count) / (blocks[-1][1] + count)
+            blocks[-1][1] += count
+    positions = [mean for mean, count in blocks for _ in range(count)]
+    return [y + offset for y, offset in zip(positions, offsets)]
+
+
+# Helper functions to swap the x and y coordinates of a box, so one routine can work along either axis
+def _transpose(box):
+    x0, y0, x1, y1 = box
+    return y0, x0, y1, x1
+
+
+# Helper function to push a box away from a circle of the given radius around the origin: sideways for boxes
+# beside it, up or down for boxes above or below it
+def _clear_circle(box, radius):
+    x0, y0, x1, y1 = box
+    if abs(y0 + y1) > abs(x0 + x1):
+        return _transpose(_clear_circle_sideways(_transpose(box), radius))
+    return _clear_circle_sideways(box, radius)
+
+
+def _clear_circle_sideways(box, radius):
+    x0, y0, x1, y1 = box
+    nearest_y = min(max(0.0, y0), y1)
+    if abs(nearest_y) >= radius:
+        return box
+    inner = np.sqrt(radius ** 2 - nearest_y ** 2)
+    if x0 + x1 >= 0:
+        shift = max(0.0, inner - x0)
+    else:
+        shift = min(0.0, -inner - x1)
+    return x0 + shift, y0, x1 + shift, y1
+
+
+# Move boxes apart so none overlap: each group of transitively overlapping boxes is spread out around where its
+# labels wanted to be, vertically by default. With a radius, boxes are also kept outside that circle (the pie)
+# and groups above or below it are spread horizontally instead.
+# A few passes settle groups that run into each other after being spread.
+def resolve_overlaps(boxes, gap=0.0, radius=None, max_passes=10):
+    boxes = [tuple(float(v) for v in box) for box in boxes]
+    if radius is not None:
+        boxes = [_clear_circle(box, radius) for box in boxes]
+    for _ in range(max_passes):
+        pairs = find_overlaps([(x0 - gap / 2, y0 - gap / 2, x1 + gap / 2, y1 + gap / 2)
+                               for x0, y0, x1, y1 in boxes])
+        if not pairs:
+            break
+
+        # Union-find over the overlapping pairs
+        parent = list(range(len(boxes)))
+
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j in pairs:
+            parent[root(i)] = root(j)
+        groups = {}
+        for i in range(len(boxes)):
+            groups.setdefault(root(i), []).append(i)
+
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+            horizontal = radius is not None and (abs(sum(boxes[i][1] + boxes[i][3] for i in group)) >
+                                                 abs(sum(boxes[i][0] + boxes[i][2] for i in group)))
+            spans = [_transpose(boxes[i]) if horizontal else boxes[i] for i in group]
+            order = sorted(range(len(group)), key=lambda k: spans[k][1] + spans[k][3])
+            sizes = [spans[k][3] - spans[k][1] for k in order]
+            desired = [(spans[k][1] + spans[k][3]) / 2 for k in order]
+            for k, size, centre in zip(order, sizes, spread(desired, sizes, gap)):
+                box = (spans[k][0], centre - size / 2, spans[k][2], centre + size / 2)
+                box = _transpose(box) if horizontal else box
+                boxes[group[k]] = _clear_circle(box, radius) if radius is not None else box
+    return boxes
+
+
+# Whether a text box sits inside a wedge (angles in degrees, counter-clockwise from theta1 to theta2).
+# The midpoints of its sides are tested rather than its corners, since glyphs rarely fill the box corners.
+def fits_in_wedge(box, theta1, theta2, radius=1.0):
+    x0, y0, x1, y1 = box
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    points = np.array([(x0, cy), (x1, cy), (cx, y0), (cx, y1)])
+    if (np.hypot(points[:, 0], points[:, 1]) > radius).any():
+        return False
+    span = theta2 - theta1
+    if span >= 360:
+        return True
+    angles = (np.degrees(np.arctan2(points[:, 1], points[:, 0])) - theta1) % 360
+    return bool((angles <= span).all())
+
+
+# Place the percentage labels of one pie. Visible texts flagged inside go in their wedge when they fit there;
+# every other visible text goes outside with a dashed leader line, and the outside labels are then moved apart
+# so none overlap each other or the pie. texts and lines hold one artist (or None) per wedge.
+# directions are the wedges' unit bisectors (PieGeometry.directions); they are worked out from the wedges if not given.
+def place_pie_labels(ax, wedges, texts, lines, inside, internal_distance=0.75, external_distance=1.2,
+                     leader_start=0.9, gap=0.05, renderer=None, directions=None):
+    if renderer is None:
+        renderer = ax.figure.canvas.get_renderer()
+    ax.apply_aspect()  # Otherwise only applied at draw time, and text sizes would be measured on the wrong scale
+    if directions is None:
+        directions = bisectors([wedge.theta1 for wedge in wedges], [wedge.theta2 for wedge in wedges])
+
+    external, boxes, half_sizes = [], [], []
+    radius = 0
+    for i, wedge in enumerate(wedges):
+        text, line = texts[i], lines[i]
+        if line is not None:
+            line.set_visible(False)
+        if text is None or not text.get_visible() or not wedge.get_visible():
+            continue
+        radius = max(radius, wedge.r)
+        cos, sin = directions[i]
+        width, height = text_size(ax, text, renderer)
+
+        if inside[i]:
+            x, y = internal_distance * cos, internal_distance * sin
+            if fits_in_wedge((x - width / 2, y - height / 2, x + width / 2, y + height / 2),
+                             wedge.theta1, wedge.theta2, wedge.r):
+                text.set_position((x, y))
+                continue
+
+        x, y = external_distance * cos, external_distance * sin
+        external.append(i)
+        boxes.append((x - width / 2, y - height / 2, x + width / 2, y + height / 2))
+        half_sizes.append((width / 2, height / 2))
+    if not external:
+        return
+
+    resolved = np.array(resolve_overlaps(boxes, gap, radius + gap))
+    centres = (resolved[:, :2] + resolved[:, 2:]) / 2
+    starts = leader_start * np.asarray(directions)[external]
+    ends = leader_ends(starts, centres, half_sizes, gap)
+    for i, centre, start, end in zip(external, centres, starts, ends):
+        texts[i].set_position(tuple(centre))
+        if lines[i] is not None:
+            lines[i].set_data([start[0], end[0]], [start[1], end[1]])
+            lines[i].set_visible(True)
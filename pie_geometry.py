@@ -0,0 +1,56 @@
+import numpy as np
+
+# Pies start at 12 o'clock and run counter-clockwise, as drawn with ax.pie(..., startangle=90)
+START_ANGLE = 90
+
+
+# Wedge edges of many pies at once. values is (pies x wedges); returns each wedge's share of its pie and its
+# theta1/theta2 in degrees, as ax.pie would draw them. Pies with nothing to share get zero-width wedges.
+def wedge_angles(values, start_angle=START_ANGLE):
+    values = np.asarray(values, dtype=np.float64)
+    totals = values.sum(axis=-1, keepdims=True)
+    fractions = np.divide(values, totals, out=np.zeros_like(values), where=totals > 0)
+    theta2 = start_angle + 360 * np.cumsum(fractions, axis=-1)
+    theta1 = np.concatenate([np.full(theta2.shape[:-1] + (1,), float(start_angle)), theta2[..., :-1]], axis=-1)
+    return fractions, theta1, theta2
+
+
+# Unit vectors along the bisector of every wedge, shape (..., 2)
+def bisectors(theta1, theta2):
+    mid = np.deg2rad((np.asarray(theta1) + np.asarray(theta2)) / 2)
+    return np.stack([np.cos(mid), np.sin(mid)], axis=-1)
+
+
+# Where leader lines from starts (n x 2) towards label centres (n x 2) meet the label boxes (half sizes n x 2,
+# plus pad), so the line stops just short of the text
+def leader_ends(starts, centres, half_sizes, pad=0.0):
+    starts, centres = np.asarray(starts, dtype=np.float64), np.asarray(centres, dtype=np.float64)
+    deltas = centres - starts
+    reach = np.asarray(half_sizes, dtype=np.float64) + pad
+    fractions = np.divide(reach, np.abs(deltas), out=np.full_like(deltas, np.inf), where=deltas != 0)
+    fraction = np.minimum(fractions.min(axis=-1), 1.0)
+    return centres - deltas * fraction[..., None]
+
+
+# Geometry of a batch of pies computed straight from the value matrix, before any figure exists:
+# wedge angles, percentages, and the internal label, external label and leader-line start anchors of every wedge.
+# Pies with a missing (NaN) value are flagged in missing and get zero-width wedges.
+class PieGeometry:
+    def __init__(self, values, internal_distance=0.75, external_distance=1.2, leader_start=0.9,
+                 start_angle=START_ANGLE):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[np.newaxis]
+        self.missing = np.isnan(values).any(axis=-1)
+        self.values = np.where(self.missing[:, np.newaxis], 0.0, values)
+        self.fractions, self.theta1, self.theta2 = wedge_angles(self.values, start_angle)
+        self.pcts = 100. * self.fractions
+        self.spans = self.theta2 - self.theta1  # Degrees
+
+        self.directions = bisectors(self.theta1, self.theta2)  # (pies x wedges x 2)
+        self.internal = internal_distance * self.directions
+        self.external = external_distance * self.directions
+        self.leader_starts = leader_start * self.directions
+
+    def __len__(self):
+        return len(self.values)
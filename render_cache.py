@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+# Cache size used when none is given (bytes)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+# Helper function to turn chart data/options into something json can serialise deterministically
+# (dicts keyed by tuples, numpy arrays and scalars included)
+def _canonical(value):
+    if isinstance(value, dict):
+        items = [(_canonical(key), _canonical(item)) for key, item in value.items()]
+        return ['__dict__', sorted(items, key=lambda pair: json.dumps(pair[0]))]
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if hasattr(value, 'tolist'):  # numpy arrays and scalars
+        return _canonical(value.tolist())
+    if isinstance(value, float):
+        return repr(value)  # Keeps every bit, and NaN stays serialisable
+    return value
+
+
+# Hash of a source file, so editing a chart module invalidates its cached outputs
+_source_hashes = {}
+
+
+def source_hash(path):
+    digest = _source_hashes.get(path)
+    if digest is None:
+        with open(path, 'rb') as f:
+            digest = _source_hashes[path] = hashlib.sha256(f.read()).hexdigest()
+    return digest
+
+
+# Content address of one chart output: chart type, data, chart parameters and the code that draws it
+def cache_key(chart, data, options, sources=()):
+    payload = json.dumps([chart, _canonical(data), _canonical(options), [source_hash(path) for path in sources]],
+                         separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Helper function to put a copy of src at dst atomically. Never a hard link: writers truncate their output files in
+# place (savefig, the SVG writer), so a file shared with the cache would rewrite the cached entry too.
+def _copy(src, dst):
+    tmp = f'{dst}.{uuid.uuid4().hex}.tmp'
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+# Content-addressed store of rendered chart files with least-recently-used, size-based eviction. Several processes
+# can share one root: the size is measured from the directory, never kept per process.
+class RenderCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    # Every cache entry as (last used, path, size in bytes)
+    def _entries(self):
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                if key.endswith('.tmp'):
+                    continue  # Entry still being written
+                entry = os.path.join(prefix_dir, key)
+                try:
+                    size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+                    yield os.path.getmtime(entry), entry, size
+                except OSError:
+                    continue  # Evicted by another process meanwhile
+
+    # Put the cached files for key into output_dir; returns their paths, or None on a miss
+    def fetch(self, key, output_dir, files):
+        entry = self._entry_dir(key)
+        sources = [os.path.join(entry, name) for name in files]
+        if not all(os.path.exists(path) for path in sources):
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        try:
+            for name, src in zip(files, sources):
+                dst = os.path.join(output_dir, name)
+                _copy(src, dst)
+                paths.append(dst)
+            os.utime(entry)  # Mark as recently used
+        except FileNotFoundError:
+            return None  # Evicted while we were copying
+        return paths
+
+    # Add freshly rendered files under key
+    def store(self, key, paths):
+        entry = self._entry_dir(key)
+        if os.path.isdir(entry):
+            return
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        staging = f'{entry}.{uuid.uuid4().hex}.tmp'
+        os.makedirs(staging)
+        for path in paths:
+            _copy(path, os.path.join(staging, os.path.basename(path)))
+        try:
+            os.rename(staging, entry)  # Atomic, so readers never see a half-written entry
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)  # Another worker stored the same key first
+            return
+        self.evict()
+
+    # Remove least recently used entries until the cache fits in max_bytes, counting what every process sharing the
+    # root has stored; returns the size left
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        for _, entry, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        return total
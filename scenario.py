@@ -0,0 +1,208 @@
+import numpy as np
+
+from footprint import FootprintEngine
+from imputation import masked
+from instrumentation import stage
+from units import KG_CO2E
+
+# Kinds of intervention:
+#   'substitute' - move a fraction of one activity's quantity to another, converted by a ratio (units of the
+#                  target per unit of the source)
+#   'scale'      - multiply an activity's quantity (0.5 halves it)
+#   'factor'     - replace an activity's emission factor (kgCO₂e per unit), e.g. a green electricity tariff
+INTERVENTION_KINDS = ('substitute', 'scale', 'factor')
+
+
+# One what-if change to the activities of one person, or of everyone when person is None
+class Intervention:
+    def __init__(self, kind, activity, value, target=None, ratio=1.0, person=None, label=None):
+        if kind not in INTERVENTION_KINDS:
+            raise ValueError(f'Unknown intervention {kind!r}; expected one of {", ".join(INTERVENTION_KINDS)}')
+        if (kind == 'substitute') != (target is not None):
+            raise ValueError('A substitution, and only a substitution, needs a target activity')
+        self.kind = kind
+        self.activity = activity
+        self.value = float(value)  # Fraction moved, scale, or new factor
+        self.target = target
+        self.ratio = float(ratio)
+        self.person = person
+        self.label = label or self._describe()
+
+    # Helper function to describe the intervention in words
+    def _describe(self):
+        who = f'{self.person}: ' if self.person is not None else ''
+        if self.kind == 'substitute':
+            return f'{who}move {self.value:.0%} of {self.activity} to {self.target}'
+        if self.kind == 'scale':
+            return f'{who}scale {self.activity} by {self.value:g}'
+        return f'{who}use a factor of {self.value:g} for {self.activity}'
+
+    def __repr__(self):
+        return f'<Intervention {self.label}>'
+
+
+# Move a fraction of one activity to another, e.g. substitute('Car', 'Train', 0.5, person='Jonathan')
+def substitute(activity, target, fraction, ratio=1.0, person=None, label=None):
+    return Intervention('substitute', activity, fraction, target, ratio, person, label)
+
+
+# Multiply an activity's quantity, e.g. scale('Beef', 0.5, person='Agnel')
+def scale(activity, factor, person=None, label=None):
+    return Intervention('scale', activity, factor, person=person, label=label)
+
+
+# Replace an activity's emission factor (kgCO₂e per unit)
+def swap_factor(activity, factor, person=None, label=None):
+    return Intervention('factor', activity, factor, person=person, label=label)
+
+
+# Ratio converting quantities of one chart activity into another through their DEFRA factors, for engines that
+# hold activities as kgCO₂e (as the chart modules do):
+# kgCO₂e of car travel -> km -> kgCO₂e of the same km by train
+def factor_ratio(activity, target, table=None):
+    if table is None:
+        from conversion_factors import load_factors
+        table = load_factors()
+    return table.activity_factor(target) / table.activity_factor(activity)
+
+
+# Evaluates what-if interventions against a baseline cohort. Every intervention changes at most two activities of
+# the people it applies to, and its saving is linear in one baseline quantity:
+#   substitute: fraction x quantity x (weight - ratio x target weight)
+#   scale:      (1 - scale) x quantity x weight
+#   factor:     quantity x (weight - new weight)
+# so a whole list is scored in one (people x interventions) product, each intervention on its own against the
+# baseline. apply() combines a list into one scenario instead.
+class ScenarioEngine:
+    def __init__(self, engine, names, quantities):
+        self.engine = engine
+        self.names = list(names)
+        self._people = {name: i for i, name in enumerate(self.names)}
+        self._activities = {activity: j for j, activity in enumerate(engine.activities)}
+        self.quantities = masked(quantities)
+        _, _, self.baseline = engine.score(self.quantities)  # tCO₂e per person
+
+    # Helper function to look an activity up
+    def _activity(self, activity):
+        column = self._activities.get(activity)
+        if column is None:
+            raise KeyError(f'Unknown activity: {activity}')
+        return column
+
+    # Helper function to compile interventions into arrays: the activity each saving is proportional to, the saving
+    # per unit of it, and the person it applies to (-1 for everyone)
+    def _compile(self, interventions):
+        weights = self.engine.weights
+        columns = np.empty(len(interventions), dtype=np.intp)
+        coefficients = np.empty(len(interventions))
+        people = np.empty(len(interventions), dtype=np.intp)
+        for i, intervention in enumerate(interventions):
+            j = columns[i] = self._activity(intervention.activity)
+            if intervention.kind == 'substitute':
+                target = weights[self._activity(intervention.target)]
+                coefficients[i] = intervention.value * (weights[j] - intervention.ratio * target)
+            elif intervention.kind == 'scale':
+                coefficients[i] = (1 - intervention.value) * weights[j]
+            else:
+                coefficients[i] = weights[j] - intervention.value * self.engine.scale
+            if intervention.person is None:
+                people[i] = -1
+            elif intervention.person in self._people:
+                people[i] = self._people[intervention.person]
+            else:
+                raise KeyError(f'Unknown person: {intervention.person}')
+        return columns, coefficients, people
+
+    # tCO₂e each intervention saves for each person (people x interventions), 0 for people it doesn't apply to.
+    # A saving from a missing quantity is masked.
+    @stage('aggregation')
+    def savings(self, interventions):
+        columns, coefficients, people = self._compile(interventions)
+        result = self.quantities[:, columns] * coefficients
+        applies = (people == -1) | (people == np.arange(len(self.names))[:, None])
+        return np.ma.where(applies, result, 0.0)
+
+    # Interventions ranked by tCO₂e saved, largest first, as (intervention, saved) pairs: for one person, or summed
+    # over the cohort (missing quantities counting as nothing). Interventions that can't be scored for the person
+    # come last, with a saving of None.
+    def rank(self, interventions, person=None):
+        interventions = list(interventions)
+        saved = self.savings(interventions)
+        if person is None:
+            saved = saved.sum(axis=0)
+        else:
+            if person not in self._people:
+                raise KeyError(f'Unknown person: {person}')
+            saved = saved[self._people[person]]
+        saved = masked(saved)
+        order = np.argsort(-saved.filled(-np.inf), kind='stable')
+        return [(interventions[i], saved[i] if saved[i] is not np.ma.masked else None) for i in order.tolist()]
+
+    # Best interventions for every person at once: {'name': [(intervention, saved), ...]} with the top ones first.
+    # Interventions for other people are left out of each person's list.
+    def recommend(self, interventions, top=None):
+        interventions = list(interventions)
+        saved = self.savings(interventions)
+        _, _, people = self._compile(interventions)
+        applies = (people == -1) | (people == np.arange(len(self.names))[:, None])
+        ranked = np.ma.where(applies, saved, np.ma.masked).filled(-np.inf)
+        order = np.argsort(-ranked, axis=1, kind='stable')[:, :top]
+        result = {}
+        for i, name in enumerate(self.names):
+            result[name] = [(interventions[j], float(ranked[i, j])) for j in order[i].tolist()
+                            if ranked[i, j] != -np.inf]
+        return result
+
+    # Apply interventions one after another as a single scenario. Returns its engine (with any swapped factors)
+    # and quantities, e.g. for FootprintGraph(engine, names, quantities).chart_data(chart). An activity whose
+    # factor ends up differing between people comes back in kgCO₂e, with a factor of 1.
+    def apply(self, interventions):
+        quantities = self.quantities.copy()
+        factors = np.tile(self.engine.factors, (len(self.names), 1))  # Per person, while interventions apply
+        everyone = np.arange(len(self.names))
+        for intervention in interventions:
+            rows = everyone if intervention.person is None else [self._people[intervention.person]]
+            j = self._activity(intervention.activity)
+            if intervention.kind == 'substitute':
+                moved = quantities[rows, j] * intervention.value
+                quantities[rows, j] -= moved
+                quantities[rows, self._activity(intervention.target)] += moved * intervention.ratio
+            elif intervention.kind == 'scale':
+                quantities[rows, j] *= intervention.value
+            else:
+                factors[rows, j] = intervention.value
+
+        shared = self.engine.factors.copy()
+        units = list(self.engine.units)
+        for j in range(len(shared)):
+            column = factors[:, j]
+            if len(column) and (column == column[0]).all():
+                shared[j] = column[0]
+            else:
+                quantities[:, j] *= column
+                shared[j] = 1.0
+                units[j] = KG_CO2E
+        categories = [self.engine.categories[code] for code in self.engine.activity_categories]
+        engine = FootprintEngine(self.engine.activities, shared, categories, self.engine.scale, units)
+        return engine, quantities
+
+    # Per-person tCO₂e after a combined scenario, and the saving against the baseline
+    def evaluate(self, interventions):
+        engine, quantities = self.apply(interventions)
+        _, _, totals = engine.score(quantities)
+        return totals, self.baseline - totals
+
+
+if __name__ == '__main__':
+    from footprint_graph import group_cohort
+
+    engine, names, quantities = group_cohort()
+    scenarios = ScenarioEngine(engine, names, quantities)
+    interventions = [
+        substitute('Car', 'Train', 0.5, ratio=factor_ratio('Car', 'Train'), person='Jonathan'),
+        scale('Beef', 0.5, person='Agnel'),
+        scale('Beef', 0.5),
+        scale('Heating Oil', 0.8),
+    ]
+    for intervention, saved in scenarios.rank(interventions):
+        print(f'{intervention.label}: ' + ('n/a' if saved is None else f'{saved:.3f} tCO₂e saved'))
@@ -0,0 +1,349 @@
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+from instrumentation import METRICS, stage
+
+# SVG user units are points, as in matplotlib's own SVG output; hatch patterns repeat every inch
+HATCH_SIZE = 72
+
+# SVG path command of every matplotlib path code (CLOSEPOLY is handled separately)
+PATH_COMMANDS = {1: 'M', 2: 'L', 3: 'Q', 4: 'C'}
+
+# Text alignment -> SVG text-anchor, and how far along its line the anchor sits
+TEXT_ANCHORS = {'left': ('start', 0.0), 'center': ('middle', 0.5), 'right': ('end', 1.0)}
+
+# Line styles drawn with a dash pattern, and the rcParams holding the pattern
+DASH_STYLES = {'--': 'dashed', 'dashed': 'dashed', '-.': 'dashdot', 'dashdot': 'dashdot', ':': 'dotted',
+               'dotted': 'dotted'}
+
+# Line styles and markers meaning 'nothing to draw'
+NO_LINE = (None, 'None', 'none', '', ' ')
+
+
+# Helper function to turn an RGBA color into SVG paint and opacity attributes
+def _paint(name, rgba):
+    from matplotlib.colors import to_hex
+
+    if rgba is None or rgba[3] == 0:
+        return f'{name}="none"'
+    paint = f'{name}="{to_hex(rgba)}"'
+    if rgba[3] < 1:
+        paint += f' {name}-opacity="{rgba[3]:.3g}"'
+    return paint
+
+
+# Helper function to format a number for the SVG text
+def _number(value):
+    return f'{value:.3f}'.rstrip('0').rstrip('.')
+
+
+# Helper function to write a matplotlib path as SVG path data; convert maps each segment's vertices (n x 2) to
+# SVG coordinates
+def _path_data(path, transform, convert):
+    from matplotlib.path import Path
+
+    commands = []
+    for vertices, code in path.iter_segments(transform, simplify=False, curves=True):
+        if code == Path.CLOSEPOLY:
+            commands.append('Z')
+        else:
+            commands.append(PATH_COMMANDS[code] + ' '.join(_number(value) for value in convert(vertices).flat))
+    return ' '.join(commands)
+
+
+# Writes the current state of a drawn figure as SVG, straight from the geometry of its artists: patch paths
+# (wedges, bars, spines, legend frames), lines and tick marks, and text as <text> elements. Nothing is drawn
+# again; the figure must have been laid out by a draw, and renderer measures the text. bbox (in pixels) crops
+# the page, as for savefig(..., bbox_inches=...); by default it is the whole figure.
+class SvgFigure:
+    def __init__(self, fig, renderer, bbox=None):
+        self.fig = fig
+        self.renderer = renderer
+        bbox = fig.bbox if bbox is None else bbox
+        self.left, self.top = bbox.x0, bbox.y1
+        self.scale = 72 / fig.dpi  # Pixels -> points
+        self.width, self.height = bbox.width * self.scale, bbox.height * self.scale
+        self.defs, self.body = [], []
+        self.hatches, self.clips = {}, {}
+
+    # Display coordinates (pixels, y up) -> SVG coordinates (points, y down)
+    def points(self, xy):
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        return np.column_stack([(xy[:, 0] - self.left) * self.scale, (self.top - xy[:, 1]) * self.scale])
+
+    # Path data of a matplotlib path, in SVG coordinates
+    def path_data(self, path, transform):
+        return _path_data(path, transform, self.points)
+
+    # clip-path attribute of an artist clipped to its axes
+    def clip(self, artist):
+        box = artist.get_clip_box() if artist.get_clip_on() else None
+        if box is None:
+            return ''
+        (x0, y0), (x1, y1) = self.points([[box.x0, box.y1], [box.x1, box.y0]])
+        key = tuple(_number(value) for value in (x0, y0, x1 - x0, y1 - y0))
+        name = self.clips.get(key)
+        if name is None:
+            name = self.clips[key] = f'clip{len(self.clips)}'
+            self.defs.append(f'<clipPath id="{name}"><rect x="{key[0]}" y="{key[1]}" width="{key[2]}" '
+                             f'height="{key[3]}"/></clipPath>')
+        return f' clip-path="url(#{name})"'
+
+    # Fill of a hatched patch: a pattern tile with the face color and the hatch lines, as matplotlib draws it
+    def hatch(self, hatch, face, color, linewidth):
+        from matplotlib.colors import to_hex
+        from matplotlib.path import Path
+        from matplotlib.transforms import Affine2D
+
+        key = (hatch, tuple(face), tuple(color), linewidth)
+        name = self.hatches.get(key)
+        if name is None:
+            name = self.hatches[key] = f'hatch{len(self.hatches)}'
+            tile = Affine2D().scale(HATCH_SIZE).scale(1.0, -1.0).translate(0, HATCH_SIZE)
+            lines = _path_data(Path.hatch(hatch), tile, np.asarray)
+            background = 'none' if face is None or face[3] == 0 else to_hex(face)
+            self.defs.append(
+                f'<pattern id="{name}" patternUnits="userSpaceOnUse" x="0" y="0" width="{HATCH_SIZE}" '
+                f'height="{HATCH_SIZE}"><rect x="0" y="0" width="{HATCH_SIZE + 1}" height="{HATCH_SIZE + 1}" '
+                f'fill="{background}"/><path d="{lines}" {_paint("fill", color)} '
+                f'{_paint("stroke", color)} stroke-width="{_number(linewidth)}" stroke-linecap="butt" '
+                f'stroke-linejoin="miter"/></pattern>')
+        return f'fill="url(#{name})"'
+
+    # stroke attributes of an outline
+    def stroke(self, color, linewidth, linestyle='-', capstyle='butt', joinstyle='miter'):
+        import matplotlib
+
+        if linewidth == 0 or linestyle in NO_LINE:
+            return 'stroke="none"'
+        attributes = (f'{_paint("stroke", color)} stroke-width="{_number(linewidth)}" '
+                      f'stroke-linecap="{"square" if capstyle == "projecting" else capstyle}" '
+                      f'stroke-linejoin="{joinstyle}"')
+        style = DASH_STYLES.get(linestyle)
+        if style is not None:
+            dashes = np.asarray(matplotlib.rcParams[f'lines.{style}_pattern'], dtype=np.float64)
+            if matplotlib.rcParams['lines.scale_dashes']:
+                dashes = dashes * linewidth
+            attributes += f' stroke-dasharray="{",".join(_number(value) for value in dashes)}"'
+        return attributes
+
+    def add_patch(self, patch):
+        path = self.path_data(patch.get_path(), patch.get_transform())
+        face = patch.get_facecolor()
+        hatch = patch.get_hatch()
+        fill = (self.hatch(hatch, face, patch.get_hatchcolor(), patch.get_hatch_linewidth()) if hatch
+                else _paint('fill', face))
+        stroke = self.stroke(patch.get_edgecolor(), patch.get_linewidth(), patch.get_linestyle(),
+                             patch.get_capstyle(), patch.get_joinstyle())
+        self.body.append(f'<path d="{path}" {fill} {stroke}{self.clip(patch)}/>')
+
+    def add_line(self, line):
+        from matplotlib.colors import to_rgba
+        from matplotlib.markers import MarkerStyle
+
+        xy = line.get_transform().transform(line.get_xydata())
+        clip = self.clip(line)
+        linestyle = line.get_linestyle()
+        if linestyle not in NO_LINE and len(xy) > 1:
+            capstyle = line.get_solid_capstyle() if linestyle in ('-', 'solid') else line.get_dash_capstyle()
+            joinstyle = line.get_solid_joinstyle() if linestyle in ('-', 'solid') else line.get_dash_joinstyle()
+            points = self.points(xy)
+            path = 'M' + ' L'.join(f'{_number(x)} {_number(y)}' for x, y in points)
+            stroke = self.stroke(to_rgba(line.get_color(), line.get_alpha()), line.get_linewidth(), linestyle,
+                                 capstyle, joinstyle)
+            self.body.append(f'<path d="{path}" fill="none" {stroke}{clip}/>')
+
+        if line.get_marker() in NO_LINE or line.get_markersize() == 0:
+            return
+
+        # One marker path, in points around its centre, placed at every data point
+        marker = MarkerStyle(line.get_marker(), line.get_fillstyle())
+        shape = _path_data(marker.get_path(), marker.get_transform().scale(line.get_markersize()),
+                           lambda vertices: vertices.reshape(-1, 2) * [1, -1])
+        face = to_rgba(line.get_markerfacecolor()) if marker.is_filled() else None
+        stroke = self.stroke(to_rgba(line.get_markeredgecolor()), line.get_markeredgewidth(),
+                             joinstyle=marker.get_joinstyle(), capstyle=marker.get_capstyle())
+        # A clip path is in the user space of the element it is set on, so it goes on a group around the translated
+        # markers rather than on the markers themselves
+        if clip:
+            self.body.append(f'<g{clip}>')
+        for x, y in self.points(xy):
+            self.body.append(f'<path d="{shape}" transform="translate({_number(x)} {_number(y)})" '
+                             f'{_paint("fill", face)} {stroke}/>')
+        if clip:
+            self.body.append('</g>')
+
+    # Text as <text> elements, one per line, placed on the line's baseline. Each line is anchored at the point its
+    # alignment refers to, so it stays in place if the viewer's font differs slightly.
+    #
+    # The text's drawn box comes from get_window_extent. Inside the unrotated box the lines share the height
+    # evenly, and each is aligned like the text as a whole. Each baseline sits a font descent (measured on 'lp')
+    # above the bottom of its line. With matplotlib's default line spacing, this is within a pixel of where
+    # Text.draw puts it.
+    def add_text(self, text):
+        from matplotlib.colors import to_rgba
+
+        if not text.get_text():
+            return
+        if text.get_bbox_patch() is not None:
+            self.add_patch(text.get_bbox_patch())
+        box = text.get_window_extent(self.renderer)
+        lines = text.get_text().split('\n')
+        prop = text.get_fontproperties()
+        widths = [self.renderer.get_text_width_height_descent(line, prop, ismath=False)[0] if line else 0.0
+                  for line in lines]
+        _, lp_height, lp_descent = self.renderer.get_text_width_height_descent('lp', prop, ismath=False)
+        angle = text.get_rotation()
+        cos, sin = np.cos(np.deg2rad(angle)), np.sin(np.deg2rad(angle))
+        anchor, fraction = TEXT_ANCHORS[text.get_horizontalalignment()]
+
+        # Height of the unrotated box, from whichever side of the rotated one depends on it more
+        width = max(widths)
+        if abs(cos) >= abs(sin):
+            height = (box.height - width * abs(sin)) / abs(cos)
+        else:
+            height = (box.width - width * abs(cos)) / abs(sin)
+        pitch = height / len(lines)
+        descent = lp_descent + (pitch - lp_height) / 2  # Any line gap is split above and below the line
+
+        style = (f'font-family={quoteattr(text.get_fontname() + ", sans-serif")} '
+                 f'font-size="{_number(text.get_fontsize())}" font-weight="{text.get_fontweight()}" '
+                 f'font-style="{text.get_fontstyle()}" text-anchor="{anchor}" '
+                 f'{_paint("fill", to_rgba(text.get_color(), text.get_alpha()))}')
+        for i, line in enumerate(lines):
+            if not line:
+                continue
+            # Anchor point relative to the box centre, unrotated, then turned and moved onto the drawn box
+            dx, dy = (fraction - 0.5) * width, height / 2 - (i + 1) * pitch + descent
+            (x, y), = self.points((box.x0 + box.width / 2 + dx * cos - dy * sin,
+                                   box.y0 + box.height / 2 + dx * sin + dy * cos))
+            rotation = f' transform="rotate({_number(-angle)} {_number(x)} {_number(y)})"' if angle else ''
+            self.body.append(f'<text x="{_number(x)}" y="{_number(y)}" {style}{rotation}{self.clip(text)}>'
+                             f'{escape(line)}</text>')
+
+    # Artists an artist draws, in the order it draws them
+    def children(self, artist):
+        from matplotlib.axes import Axes
+        from matplotlib.axis import Axis, Tick
+        from matplotlib.figure import Figure
+        from matplotlib.legend import Legend
+
+        if isinstance(artist, (Figure, Axes)):
+            children = [child for child in artist.get_children() if child is not artist.patch]
+            background = [artist.patch]
+            if isinstance(artist, Axes):
+                framed = artist.axison and artist.get_frame_on()
+                hidden = ([] if framed else list(artist.spines.values())) + \
+                         ([] if artist.axison else [artist.xaxis, artist.yaxis])
+                children = [child for child in children if not any(child is h for h in hidden)]
+                background = [artist.patch] if framed else []
+            return background + sorted(children, key=lambda child: child.get_zorder())
+        if isinstance(artist, Axis):
+            ticks = []
+            low, high = sorted(artist.get_view_interval())
+            tolerance = (high - low) * 1e-10
+            for locations, get_ticks in ((artist.get_majorticklocs(), artist.get_major_ticks),
+                                         (artist.get_minorticklocs(), artist.get_minor_ticks)):
+                ticks += [tick for tick in get_ticks(len(locations))
+                          if low - tolerance <= tick.get_loc() <= high + tolerance]
+            return ticks + [artist.label, artist.offsetText]
+        if isinstance(artist, Tick):
+            return [artist.gridline, artist.tick1line, artist.tick2line, artist.label1, artist.label2]
+        if isinstance(artist, Legend):
+            frame = artist.get_frame()
+            return [frame] + [child for child in artist.get_children() if child is not frame]
+        return artist.get_children()
+
+    def add(self, artist):
+        from matplotlib.lines import Line2D
+        from matplotlib.patches import Patch
+        from matplotlib.text import Text
+
+        if not artist.get_visible():
+            return
+        if isinstance(artist, Patch):
+            self.add_patch(artist)
+        elif isinstance(artist, Line2D):
+            self.add_line(artist)
+        elif isinstance(artist, Text):
+            self.add_text(artist)
+        else:
+            for child in self.children(artist):
+                self.add(child)
+
+    def to_string(self):
+        width, height = _number(self.width), _number(self.height)
+        return '\n'.join([
+            '<?xml version="1.0" encoding="utf-8" standalone="no"?>',
+            f'<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{width}pt" height="{height}pt" '
+            f'viewBox="0 0 {width} {height}">',
+            '<defs>', *self.defs, '</defs>',
+            *self.body,
+            '</svg>',
+            '',
+        ])
+
+
+# The SVG document of a drawn figure
+def figure_svg(fig, renderer, bbox=None):
+    document = SvgFigure(fig, renderer, bbox)
+    document.add(fig)
+    return document.to_string()
+
+
+# Save a figure to several files with a single draw. Raster files are written by matplotlib; SVG files are written
+# from the geometry of that same draw by figure_svg, without matplotlib's SVG pipeline. tight crops every file to
+# the drawn content like savefig(..., bbox_inches='tight'); the crop is worked out once for all files.
+# The draw, the encoding (PNG compression, SVG generation) and the SVG writes are timed as separate stages.
+def save_figure(fig, paths, tight=False):
+    import matplotlib
+    from matplotlib.transforms import Bbox
+
+    vectors = [path for path in paths if path.lower().endswith('.svg')]
+    rasters = [path for path in paths if not path.lower().endswith('.svg')]
+    bbox = None
+    if tight:
+        with stage('layout'):
+            bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(matplotlib.rcParams['savefig.pad_inches'])
+
+    if not rasters:
+        with stage('draw'):
+            fig.draw_without_rendering()
+        with stage('encode'):
+            crop = None if bbox is None else Bbox(bbox.get_points() * fig.dpi)
+            document = figure_svg(fig, fig.canvas.get_renderer(), crop)
+    else:
+        # The SVG is read while the raster draw is in progress, when the figure is already cropped to bbox.
+        # savefig draws and then encodes, so the draw event splits its time between the two stages.
+        documents, drawn = [], []
+
+        def on_draw(event):
+            drawn.append(time.perf_counter())
+            if vectors:
+                documents.append(figure_svg(fig, event.renderer))
+
+        connection = fig.canvas.mpl_connect('draw_event', on_draw)
+        start = time.perf_counter()
+        try:
+            fig.savefig(rasters[0], bbox_inches=bbox)
+        finally:
+            fig.canvas.mpl_disconnect(connection)
+        end = time.perf_counter()
+        if drawn:
+            METRICS.record('draw', drawn[-1] - start)
+            METRICS.record('encode', end - drawn[-1])
+        for path in rasters[1:]:
+            with stage('encode'):
+                fig.savefig(path, bbox_inches=bbox)
+        if vectors and not documents:
+            raise RuntimeError(f'Saving {rasters[0]} did not fire a draw event, so there is no SVG to write to '
+                               f'{", ".join(vectors)}')
+        document = documents[-1] if documents else None
+
+    with stage('write'):
+        for path in vectors:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(document)
+    return paths
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules are top-level scripts in the repository root; charts are drawn without a display
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
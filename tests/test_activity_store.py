@@ -0,0 +1,111 @@
+import importlib
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import activity_store
+from activity_store import (DEFAULT_ACTIVITY_WORKBOOK, EMISSIONS_MEASURE, EMISSIONS_SECTION, INPUT_MEASURE,
+                            build_store, load_activities, parse_activity_workbook)
+from chart_spec import CHART_SPECS
+
+RECORDS = [
+    ('Ann', 'Household', 'Shower', INPUT_MEASURE, 'litres', 40.0, ''),
+    ('Ann', 'Household', 'Electricity', INPUT_MEASURE, 'kWh', 3000.0, ''),
+    ('Ann', 'Transport', 'Car', 'Fuel', '', np.nan, 'Petrol'),
+    ('Bob', 'Household', 'Shower', INPUT_MEASURE, 'm3', 0.05, ''),
+    ('Bob', 'Household', 'Electricity', INPUT_MEASURE, 'Wh', np.nan, ''),
+    ('Ann', EMISSIONS_SECTION, 'Beef', EMISSIONS_MEASURE, EMISSIONS_MEASURE, 500.0, ''),
+    ('Ann', EMISSIONS_SECTION, 'Car', EMISSIONS_MEASURE, EMISSIONS_MEASURE, 1000.0, ''),
+    ('Bob', EMISSIONS_SECTION, 'Beef', EMISSIONS_MEASURE, EMISSIONS_MEASURE, np.nan, ''),
+    ('Bob', EMISSIONS_SECTION, 'Train', EMISSIONS_MEASURE, EMISSIONS_MEASURE, 200.0, ''),
+]
+
+
+@pytest.fixture
+def store():
+    return build_store(RECORDS)
+
+
+def test_columns_are_dictionary_encoded(store):
+    assert len(store) == len(RECORDS)
+    assert store.people == ['Ann', 'Bob']
+    assert store.categories['text'] == ['', 'Petrol']
+    assert store.columns['person'].dtype == np.int32
+    np.testing.assert_array_equal(store.select(person='Bob', activity='Shower'), [i == 3 for i in range(9)])
+    assert not store.select(person='Cy').any()
+
+
+def test_matrix_marks_missing_and_absent_answers(store):
+    names, activities, matrix = store.inputs()
+    assert (names, activities) == (['Ann', 'Bob'], ['Shower', 'Electricity'])
+    np.testing.assert_array_equal(matrix, [[40.0, 3000.0], [0.05, np.nan]])
+
+    _, _, matrix = store.inputs(['Bob'], ['Electricity', 'Bath'])
+    np.testing.assert_array_equal(matrix, [[np.nan, 0.0]])  # No Bath row at all
+    with pytest.raises(KeyError):
+        store.inputs(['Cy'])
+
+
+def test_matrix_converts_units(store):
+    _, _, matrix = store.inputs(activities=['Shower'], unit='litres')
+    np.testing.assert_allclose(matrix, [[40.0], [50.0]])
+    _, _, matrix = store.emissions(activities=['Car'], unit='tCO₂e')
+    np.testing.assert_allclose(matrix, [[1.0], [0.0]])
+    with pytest.raises(ValueError, match='Cannot convert litres, m3 to kWh'):
+        store.inputs(activities=['Shower'], unit='kWh')
+
+
+def test_category_totals_policies(store):
+    names, totals = store.category_totals()
+    assert names == ['Ann', 'Bob']
+    np.testing.assert_allclose(totals.filled(np.nan), [[0.0, 0.0, 1.0, 0.5], [0.0, 0.0, 0.2, 0.0]])
+    _, totals = store.category_totals(policy=None)
+    np.testing.assert_array_equal(np.ma.getmaskarray(totals), [[False] * 4, [False, False, False, True]])
+    _, totals = store.category_totals(policy='default', defaults={'Beef': 300.0})
+    assert totals[1, 3] == pytest.approx(0.3)
+
+
+def test_to_arrow_round_trip(store):
+    pytest.importorskip('pyarrow')
+    table = store.to_arrow()
+    assert table.num_rows == len(RECORDS)
+    assert table.column('person').to_pylist()[3] == 'Bob'
+    assert table.column('text').to_pylist()[2] == 'Petrol'
+
+
+def test_load_uses_the_cache_until_the_workbook_changes(tmp_path, monkeypatch):
+    workbook = str(tmp_path / 'answers.xlsx')
+    shutil.copyfile(DEFAULT_ACTIVITY_WORKBOOK, workbook)
+    parses = []
+    monkeypatch.setattr(activity_store, 'parse_activity_workbook',
+                        lambda path: parses.append(path) or parse_activity_workbook(path))
+
+    first = load_activities(workbook)
+    second = load_activities(workbook)
+    assert len(parses) == 1
+    for column in first.columns:
+        np.testing.assert_array_equal(second.columns[column], first.columns[column])
+    assert second.categories == first.categories
+
+    os.utime(workbook, ns=(0, 0))  # Touched, same contents: the checksum still matches
+    load_activities(workbook)
+    assert len(parses) == 1
+
+    with open(workbook, 'ab') as f:
+        f.write(b'\0')  # New contents: parsed again
+    assert load_activities(workbook).categories == first.categories
+    assert len(parses) == 2
+
+
+def test_chart_modules_read_the_workbook_only_when_asked(monkeypatch):
+    loads = []
+    monkeypatch.setattr(activity_store, '_group_store', None)
+    monkeypatch.setattr(activity_store, 'load_activities', lambda *args: loads.append(args) or load_activities())
+    for spec in CHART_SPECS.values():
+        importlib.reload(importlib.import_module(spec['module']))
+    assert loads == []
+    transport = importlib.import_module('transport').load_data()
+    assert len(loads) == 1
+    assert list(transport) == ['Jonathan', 'Connor']  # Agnel only walks: no transport emissions to chart
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from batch_render import CHARTS, DEFAULT_COHORT, cohort_jobs, render_batch, render_job
+from chart_spec import chart_files
+
+
+def test_batch_writes_every_file_of_every_chart(tmp_path):
+    jobs = cohort_jobs(DEFAULT_COHORT)
+    done = list(render_batch(jobs, str(tmp_path), max_workers=2))
+    assert sorted(chart for chart, _, _ in done) == sorted(CHARTS)
+    written = sorted(os.listdir(tmp_path / DEFAULT_COHORT))
+    assert written == sorted(name for chart in CHARTS for name in CHARTS[chart]['files'])
+    assert len(written) == 2 * len(CHARTS) - 1  # A PNG and an SVG each, but the energy pie only has a PNG
+
+
+@pytest.mark.parametrize('pooled', [False, True])
+def test_large_cohorts_are_written_page_by_page(tmp_path, pooled):
+    data = {f'Person {i}': [1.0 + i, 2.0, 3.0, 4.0] for i in range(9)}
+    for chart in ['total_bar', 'category_bar']:
+        render_job(chart, 'large', data, str(tmp_path), pooled=pooled)
+    written = sorted(os.listdir(tmp_path / 'large'))
+    assert written == sorted(chart_files('total_bar', 9) + chart_files('category_bar', 9))
+    assert len(written) == 2 + 2 * 3  # One total chart; three pages of a 2 x 2 grid
+
+
+def test_cached_jobs_write_the_same_files(tmp_path):
+    data = {'Ann': [1.0, 2.0, 3.0, 4.0], 'Bob': [4.0, 3.0, 2.0, 1.0]}
+    jobs = cohort_jobs('small', {chart: data for chart in ['total_bar', 'category_bar']},
+                       charts=['total_bar', 'category_bar'])
+    cache_dir = str(tmp_path / 'cache')
+    list(render_batch(jobs, str(tmp_path / 'first'), max_workers=1, cache_dir=cache_dir))
+    list(render_batch(jobs, str(tmp_path / 'second'), max_workers=1, cache_dir=cache_dir))
+    first, second = (sorted(os.listdir(tmp_path / run / 'small')) for run in ('first', 'second'))
+    assert first == second == sorted(chart_files('total_bar', 2) + chart_files('category_bar', 2))
+    entries = [key for prefix in os.listdir(cache_dir) for key in os.listdir(os.path.join(cache_dir, prefix))]
+    assert len(entries) == len(jobs)  # The second run only read the cache
+    for name in first:
+        assert (tmp_path / 'first' / 'small' / name).read_bytes() == (tmp_path / 'second' / 'small' / name).read_bytes()
@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks import MISSING_RATE, compare_results, run_benchmarks, synthetic_cohort, timed
+
+
+def test_synthetic_cohort_is_reproducible():
+    engine, names, quantities = synthetic_cohort(2000, seed=3)
+    assert quantities.shape == (2000, len(engine.activities))
+    assert names[:2] == ['Person 0', 'Person 1']
+    assert np.isnan(quantities).mean() == pytest.approx(MISSING_RATE, abs=0.01)
+    np.testing.assert_array_equal(synthetic_cohort(2000, seed=3)[2], quantities)
+    assert not np.array_equal(synthetic_cohort(2000, seed=4)[2], quantities, equal_nan=True)
+
+
+def test_timed_repeats_short_calls():
+    result = timed(sum, range(10), repeat=2)
+    assert result['number'] > 1
+    assert result['repeat'] == 2
+    assert 0 < result['best'] <= result['mean']
+
+
+def test_run_and_compare():
+    results = run_benchmarks([3], repeat=1, render=False, factors=False)
+    results = json.loads(json.dumps(results))  # As written to and read back from the results file
+    assert set(results['cohorts']['3']) == {'aggregation', 'pie_geometry', 'label_layout'}
+
+    slower = json.loads(json.dumps(results))
+    slower['cohorts']['3']['pie_geometry']['best'] *= 2
+    compared = {name: ratio for name, _, _, ratio in compare_results(results, slower)}
+    assert compared['cohorts/3/pie_geometry'] == pytest.approx(2.0)
+    assert all(ratio == 1.0 for name, ratio in compared.items() if name != 'cohorts/3/pie_geometry')
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+from chart_spec import CHART_SPECS, chart_files, compile_spec, page_files
+from figure_pool import FigurePool, render_pages
+
+
+def test_compile_spec_applies_defaults_and_overrides():
+    spec = compile_spec('diet_pie', title_y=-0.2)
+    assert spec['title_y'] == -0.2
+    assert spec['page_size'] == 3
+    assert compile_spec('category_bar')['page_size'] == 4  # A bar page fills its 2 x 2 grid
+
+
+@pytest.mark.parametrize('key', ['titel_y', 'files', 'type'])
+def test_compile_spec_refuses_unknown_and_fixed_keys(key):
+    with pytest.raises(TypeError):
+        compile_spec('diet_pie', **{key: None})
+
+
+def test_chart_files_pages_only_large_cohorts():
+    assert chart_files('total_bar', 10) == CHART_SPECS['total_bar']['files']
+    assert chart_files('total_bar', 11) == page_files('total_bar', 1) + page_files('total_bar', 2)
+    assert page_files('total_bar', 2) == ['carbon_footprint_total_comparison_page0002.png',
+                                          'carbon_footprint_total_comparison_page0002.svg']
+
+
+def test_render_pages_writes_every_page(tmp_path):
+    data = ((f'Person {i}', [1.0 + i, 2.0, None if i == 3 else 3.0]) for i in range(5))
+    written = [os.path.basename(path) for paths in render_pages('total_bar', data, str(tmp_path), page_size=2)
+               for path in paths]
+    assert written == chart_files('total_bar', 5, page_size=2)
+    assert sorted(os.listdir(tmp_path)) == sorted(written)
+
+
+def test_render_pages_keeps_the_spec_names_on_one_page(tmp_path):
+    list(render_pages('total_bar', {'Ann': [1.0, 2.0, 3.0]}, str(tmp_path)))
+    assert sorted(os.listdir(tmp_path)) == sorted(CHART_SPECS['total_bar']['files'])
+
+
+# Pool that records the names drawn on every page
+class _RecordingPool(FigurePool):
+    def __init__(self):
+        super().__init__()
+        self.pages = []
+
+    def render(self, chart, data, output_dir='.', files=None, errors=None):
+        paths = super().render(chart, data, output_dir, files, errors)
+        template = self.get(chart, len(data))
+        self.pages.append([title.get_text() for ax, title in zip(template.axes, template.titles) if ax.get_visible()])
+        return paths
+
+
+@pytest.mark.parametrize('chart, page_size', [('category_bar', None), ('diet_pie', None), ('category_bar', 3)])
+def test_render_pages_draws_everyone(chart, page_size, tmp_path):
+    spec = compile_spec(chart)
+    activities = spec.get('keys') or spec.get('activities') or spec['labels']
+    data = {f'Person {i}': {activity: 1.0 + i for activity in activities} for i in range(10)}
+    pool = _RecordingPool()
+    try:
+        list(render_pages(chart, data, str(tmp_path), pool, page_size))
+    finally:
+        pool.close()
+    size = page_size or compile_spec(chart)['page_size']
+    assert [len(page) for page in pool.pages] == [min(size, 10 - i) for i in range(0, 10, size)]
+    assert [name for page in pool.pages for name in page] == list(data)
+
+
+def test_pages_larger_than_the_grid_are_refused(tmp_path):
+    data = {f'Person {i}': [1.0, 2.0, 3.0, 4.0] for i in range(10)}
+    with pytest.raises(ValueError):
+        list(render_pages('category_bar', data, str(tmp_path), page_size=10))
+    pool = FigurePool()
+    try:
+        template = pool.get('category_bar', 4)
+        with pytest.raises(ValueError):
+            template.update(dict(list(data.items())[:5]))
+    finally:
+        pool.close()
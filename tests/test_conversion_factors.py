@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+import conversion_factors
+from conversion_factors import (ACTIVITY_FACTORS, DEFAULT_WORKBOOK, _read_mmap_header, attach_factors,
+                                export_factors, load_factors, shared_factors)
+
+
+@pytest.fixture(scope='module')
+def table():
+    return load_factors()
+
+
+def test_attached_export_matches_the_table(table, tmp_path):
+    path = str(tmp_path / 'factors.bin')
+    export_factors(table, path, source={'test': 1})
+    attached = attach_factors(path)
+
+    assert attached.source == {'test': 1}
+    assert attached.categories == table.categories
+    for column, values in table.columns.items():
+        np.testing.assert_array_equal(attached.columns[column], values)
+        assert isinstance(attached.columns[column], np.memmap)
+        assert not attached.columns[column].flags.writeable
+    assert attached.index.keys() == table.index.keys()
+    for key, rows in table.index.items():
+        np.testing.assert_array_equal(attached.index[key], rows)
+    for name in ACTIVITY_FACTORS:
+        assert attached.activity_factor(name) == table.activity_factor(name)
+    assert os.listdir(tmp_path) == ['factors.bin']  # No temporary file left behind
+
+
+def test_attach_refuses_other_files(tmp_path):
+    path = tmp_path / 'factors.bin'
+    path.write_bytes(b'not an export')
+    with pytest.raises(ValueError):
+        attach_factors(str(path))
+
+
+def test_shared_factors_rewrites_stale_exports(table, tmp_path, monkeypatch):
+    monkeypatch.setattr(conversion_factors, '_attached', {})
+    path = str(tmp_path / 'factors.bin')
+    export_factors(table, path, source={'mtime_ns': 0, 'size': 0})
+
+    shared = shared_factors(DEFAULT_WORKBOOK, path)
+    stat = os.stat(DEFAULT_WORKBOOK)
+    assert _read_mmap_header(path)['source'] == {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    assert shared.activity_factor('Electricity') == table.activity_factor('Electricity')
+    assert shared_factors(DEFAULT_WORKBOOK, path) is shared
@@ -0,0 +1,81 @@
+import importlib
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from PIL import Image
+
+from chart_spec import CHART_SPECS
+from figure_pool import FigurePool, render_chart
+
+
+# Helper function to read a PNG as an array of pixels
+def _pixels(path):
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGBA'))
+
+
+# Helper function to scale every value of chart data, keeping missing ones missing
+def _scaled(data, factor):
+    scaled = {}
+    for name, row in data.items():
+        if isinstance(row, dict):
+            scaled[name] = {key: None if value is None else value * factor for key, value in row.items()}
+        else:
+            scaled[name] = [None if value is None else value * factor for value in row]
+    return scaled
+
+
+@pytest.mark.parametrize('chart', list(CHART_SPECS))
+def test_pooled_figures_draw_what_a_fresh_figure_draws(chart, tmp_path):
+    data = importlib.import_module(CHART_SPECS[chart]['module']).load_data()
+    fresh, pooled = tmp_path / 'fresh', tmp_path / 'pooled'
+    fresh.mkdir()
+    pooled.mkdir()
+    plt.close(render_chart(chart, data, str(fresh)))
+
+    pool = FigurePool()
+    try:
+        # The layout is worked out on a template's first update, so it starts with the same data
+        pool.render(chart, data, str(pooled))
+        pool.render(chart, _scaled(data, 3.0), str(pooled))
+        written = pool.render(chart, data, str(pooled))
+    finally:
+        pool.close()
+    assert sorted(p.name for p in pooled.iterdir()) == sorted(CHART_SPECS[chart]['files'])
+    png = next(name for name in CHART_SPECS[chart]['files'] if name.endswith('.png'))
+    assert str(pooled / png) in written
+    np.testing.assert_array_equal(_pixels(pooled / png), _pixels(fresh / png))
+
+
+def test_render_chart_overrides(tmp_path):
+    data = {'Ann': [1.0, 2.0, 3.0], 'Bob': [2.0, None, 1.0]}
+    fig = render_chart('total_bar', data, str(tmp_path), figsize=(5, 3), colors=['#000000'])
+    try:
+        assert tuple(fig.get_size_inches()) == (5, 3)
+    finally:
+        plt.close(fig)
+    with pytest.raises(TypeError):
+        render_chart('total_bar', data, str(tmp_path), colour='red')
+    with pytest.raises(ValueError):
+        render_chart('total_bar', data, str(tmp_path), page_size=1)
+
+
+def test_dict_rows_are_read_by_key():
+    pool = FigurePool()
+    try:
+        template = pool.get('energy_bar', 2)
+        template.update({'Ann': {'Heating Oil': 2.0, 'Electricity': 1.0}, 'Bob': {'Electricity': 3.0}})
+        heights = [[bar.get_height() for bar in bars] for bars in template.bars]
+        labels = [[text.get_text() for text in texts] for texts in template.texts]
+        assert heights == [[1.0, 2.0], [3.0, 0.0]]  # Bars in spec order, not the order of the row
+        assert labels == [['1.00', '2.00'], ['3.00', 'N/A']]
+        with pytest.raises(ValueError, match='Gas'):
+            template.update({'Ann': {'Electricity': 1.0, 'Gas': 2.0}})
+
+        totals = pool.get('total_bar', 2)
+        totals.update({'Ann': {'Diet': 1.0, 'Water': 2.0, 'Transport': 3.0, 'Residential Energy': 4.0},
+                       'Bob': {'Diet': 1.0}})
+        assert [text.get_text() for text in totals.texts] == ['10.00', 'N/A']
+    finally:
+        pool.close()
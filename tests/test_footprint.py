@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from footprint import CATEGORIES, FootprintEngine, matrix_to_data, quantity_matrix
+from footprint_graph import cohort_engine
+from imputation import masked
+
+# Figures the original chart scripts were written with: per-activity kgCO₂e (litres for water) and the tCO₂e the
+# bar charts showed, rounded to 3 decimals
+BASELINE_ACTIVITIES = {
+    'Jonathan': {'Electricity': 311.20, 'Heating Oil': 8674.61,
+                 'Shower': 16380, 'Cleaning Dishes': 4186, 'Washing Machine': 8112, 'Toilet': 7300, 'Fish Tank': 1664,
+                 'Car': 2217.35, 'Train': 115.45,
+                 'Beef': 7800.00, 'Pig Meat': 0.00, 'Fish': 873.60, 'Poultry': 936.00, 'Rice': 10.92,
+                 'Potatoes': 30.28, 'Pasta': 312.00},
+    'Connor': {'Electricity': 149.56, 'Heating Oil': 5461.32,
+               'Shower': 32760, 'Cleaning Dishes': 2184, 'Washing Machine': 4680, 'Toilet': 26280, 'Fish Tank': 0,
+               'Car': 0.00, 'Train': 40.28,
+               'Beef': 3900.00, 'Pig Meat': 1560.00, 'Fish': 312.00, 'Poultry': 1248.00, 'Rice': 21.84,
+               'Potatoes': 43.26, 'Pasta': 208.00},
+    'Agnel': {'Electricity': 317.50, 'Heating Oil': None,
+              'Shower': 49140, 'Cleaning Dishes': 10192, 'Washing Machine': 2704, 'Toilet': 9125, 'Fish Tank': 0,
+              'Beef': 23400.00, 'Pig Meat': 0.00, 'Fish': 0.00, 'Poultry': 6240.00, 'Rice': 10.92,
+              'Potatoes': 69.22, 'Pasta': 1456.00},
+}
+BASELINE_CATEGORIES = {  # bar_charts.py: [Residential Energy, Water, Transport, Diet]
+    'Jonathan': [8.986, 0.013, 2.333, 9.963],
+    'Connor': [5.611, 0.022, 0.040, 7.293],
+    'Agnel': [0.318, 0.024, 0.000, 31.176],  # Heating oil missing, drawn as nothing
+}
+BASELINE_ENERGY = {'Jonathan': [0.311, 8.675], 'Connor': [0.150, 5.461]}  # bar_chart_residential_energy_consumption.py
+BASELINE_TRANSPORT = {'Jonathan': [0.115, 2.217], 'Connor': [0.040, 0.000]}  # bar_chart_transport.py
+
+
+@pytest.fixture(scope='module')
+def scored():
+    engine = cohort_engine()
+    return engine, engine.score_data(BASELINE_ACTIVITIES)
+
+
+def test_category_totals_match_the_baseline_charts(scored):
+    engine, (names, _, by_category, totals) = scored
+    assert names == list(BASELINE_CATEGORIES)
+    assert engine.categories == CATEGORIES
+    expected = np.array(list(BASELINE_CATEGORIES.values()))
+    np.testing.assert_allclose(by_category[:2], expected[:2], atol=5e-4)
+    np.testing.assert_allclose(totals[:2], expected[:2].sum(axis=1), atol=2e-3)  # bar_chart_total.py
+
+    # The baseline drew Agnel's missing heating oil as nothing
+    _, _, quantities = quantity_matrix(BASELINE_ACTIVITIES, engine.activities)
+    _, by_category, totals = engine.score(np.nan_to_num(quantities))
+    np.testing.assert_allclose(by_category, expected, atol=5e-4)
+    np.testing.assert_allclose(totals, expected.sum(axis=1), atol=2e-3)
+
+
+def test_activity_emissions_match_the_baseline_charts(scored):
+    engine, (names, emissions, _, _) = scored
+    for expected, activities in [(BASELINE_ENERGY, ['Electricity', 'Heating Oil']),
+                                 (BASELINE_TRANSPORT, ['Train', 'Car'])]:
+        columns = [engine.activities.index(activity) for activity in activities]
+        for name, values in expected.items():
+            np.testing.assert_allclose(emissions[names.index(name), columns], values, atol=5e-4)
+
+
+def test_missing_data_spreads_to_its_category_and_total(scored):
+    engine, (names, _, by_category, totals) = scored
+    assert np.isnan(by_category).tolist()[names.index('Agnel')] == [True, False, False, False]
+    assert np.isnan(totals).tolist() == [False, False, True]
+
+    _, _, quantities = quantity_matrix(BASELINE_ACTIVITIES, engine.activities)
+    emissions, by_category, totals = engine.score(masked(quantities))
+    assert emissions[2, engine.activities.index('Heating Oil')] is np.ma.masked
+    assert np.ma.getmaskarray(by_category).tolist()[2] == [True, False, False, False]
+    assert np.ma.getmaskarray(totals).tolist() == [False, False, True]
+
+
+def test_category_totals_need_not_be_grouped():
+    engine = FootprintEngine(['Beef', 'Car', 'Rice', 'Train'], [2.0, 1.0, 3.0, 1.0], scale=1.0)
+    assert engine.categories == ['Diet', 'Transport']
+    emissions, by_category, totals = engine.score(np.array([[1.0, 10.0, 2.0, 20.0]]))
+    np.testing.assert_array_equal(emissions, [[2.0, 10.0, 6.0, 20.0]])
+    np.testing.assert_array_equal(by_category, [[8.0, 30.0]])
+    np.testing.assert_array_equal(totals, [38.0])
+
+
+def test_quantity_matrix_round_trip():
+    names, activities, matrix = quantity_matrix(BASELINE_ACTIVITIES)
+    assert 'Car' in activities
+    assert matrix[names.index('Agnel'), activities.index('Car')] == 0.0  # Left out: counts as nothing
+    assert np.isnan(matrix[names.index('Agnel'), activities.index('Heating Oil')])
+    data = matrix_to_data(names, activities, matrix)
+    assert data['Agnel']['Heating Oil'] is None
+    assert data['Jonathan'] == pytest.approx(BASELINE_ACTIVITIES['Jonathan'])
@@ -0,0 +1,48 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from chart_spec import CHART_SPECS, chart_files
+from footprint_graph import CHART_INPUTS, FootprintGraph, group_cohort, water_factor_per_litre
+
+
+@pytest.fixture(scope='module')
+def cohort():
+    return group_cohort()
+
+
+# Helper function to flatten chart data into one array; activities a pie module leaves out count as 0
+def _values(data, keys=None):
+    values = []
+    for name, row in data.items():
+        if isinstance(row, dict):
+            row = [row.get(key, 0.0) for key in keys or row]
+        values.extend(np.nan if value is None else value for value in row)
+    return np.array(values, dtype=np.float64)
+
+
+@pytest.mark.parametrize('chart', list(CHART_INPUTS))
+def test_chart_data_matches_the_chart_modules(cohort, chart):
+    graph = FootprintGraph(*cohort)
+    expected = importlib.import_module(CHART_SPECS[chart]['module']).load_data()
+    data = graph.chart_data(chart)
+    assert list(data) == list(expected)
+    keys = CHART_SPECS[chart].get('labels')
+    np.testing.assert_allclose(_values(data, keys), _values(expected, keys), equal_nan=True)
+    assert chart_files(chart, len(data)) == CHART_SPECS[chart]['files']  # The group fits on one page
+
+
+def test_set_marks_only_the_charts_that_read_the_value(cohort):
+    graph = FootprintGraph(*cohort)
+    graph.dirty.clear()
+    changed = graph.set('Jonathan', 'Beef', 1.0)
+    assert {'diet_pie', 'diet_bar', 'category_bar', 'total_bar'} <= changed
+    assert not changed & {'water_pie', 'water_bar', 'energy_bar', 'transport_bar'}
+    assert graph.set('Jonathan', 'Beef', 1.0) == set()
+    fresh = FootprintGraph(graph.engine, graph.names, graph.quantities)
+    np.testing.assert_allclose(graph.totals, fresh.totals)
+
+
+def test_water_factor_comes_from_the_workbook():
+    assert water_factor_per_litre() == pytest.approx((0.15311 + 0.18574) / 1000)
@@ -0,0 +1,261 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+from footprint import CATEGORIES
+from conversion_factors import load_factors
+from footprint_graph import activity_engine
+from footprint_service import MAX_BODY_BYTES, FootprintBatcher, FootprintService, RenderQueue
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return activity_engine()
+
+
+# Helper function to send raw requests over one connection and read a response to each
+async def _exchange(port, *requests):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    responses = []
+    try:
+        for request in requests:
+            writer.write(request)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers['content-length']))
+            responses.append((status, headers, body))
+    finally:
+        writer.close()
+    return responses
+
+
+# Helper function to build a request with a JSON body
+def _request(method, path, body=None, headers=''):
+    data = b'' if body is None else json.dumps(body).encode('utf-8')
+    return (f'{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(data)}\r\n{headers}\r\n'
+            .encode('latin-1') + data)
+
+
+# Helper function to run a coroutine function against a started service, passing it the port
+def _with_service(engine, test, max_delay=0.05, renders=None):
+    async def run():
+        service = FootprintService(FootprintBatcher(engine, max_delay=max_delay), renders)
+        server = await service.start('127.0.0.1', 0)
+        try:
+            return await test(service, server.sockets[0].getsockname()[1])
+        finally:
+            await service.stop()
+
+    return asyncio.run(run())
+
+
+def test_scores_match_the_engine(engine):
+    activities = {'Electricity': 311.2, 'Car': 1200.0, 'Beef': None}
+
+    async def test(service, port):
+        return await _exchange(port, _request('POST', '/footprint', {'activities': activities}))
+
+    [(status, _, body)] = _with_service(engine, test)
+    result = json.loads(body)
+    assert status == 200
+    quantities = np.zeros((1, len(engine.activities)))
+    for activity, value in activities.items():
+        quantities[0, engine.activities.index(activity)] = value or 0.0
+    _, by_category, totals = engine.score(quantities)
+    assert result['total'] == pytest.approx(totals[0])
+    assert list(result['categories']) == CATEGORIES
+    for category, value in result['categories'].items():
+        assert value == pytest.approx(by_category[0, engine.categories.index(category)])
+    assert result['missing'] == ['Beef']
+
+
+def test_concurrent_requests_share_a_batch(engine):
+    async def test(service, port):
+        items = [{'activities': {'Electricity': float(i)}} for i in range(20)]
+        listed = await _exchange(port, _request('POST', '/footprint', items))
+        single = await asyncio.gather(*(_exchange(port, _request('POST', '/footprint', item)) for item in items))
+        return listed, single, service.batcher.batches, service.batcher.requests
+
+    [(status, _, body)], single, batches, requests = _with_service(engine, test)
+    assert status == 200
+    assert [json.loads(response[0][2]) for response in single] == json.loads(body)
+    assert requests == 40
+    assert batches < 40
+
+
+def test_a_bad_item_fails_the_request_before_anything_is_queued(engine):
+    async def test(service, port):
+        body = [{'activities': {'Electricity': 1.0}}, {'activities': {'Jetpack': 1.0}}]
+        responses = await _exchange(port, _request('POST', '/footprint', body),
+                                    _request('POST', '/footprint', [{'activities': {'Car': 'far'}}]),
+                                    _request('POST', '/footprint', [{'quantities': {}}]))
+        await asyncio.sleep(0.1)
+        return responses, service.batcher.requests
+
+    responses, requests = _with_service(engine, test)
+    assert [status for status, _, _ in responses] == [400, 400, 400]
+    assert json.loads(responses[0][2]) == {'error': 'Unknown activity: Jetpack'}
+    assert requests == 0
+
+
+def test_quantities_are_taken_in_activity_units(engine):
+    table = load_factors()
+
+    async def test(service, port):
+        bodies = [{'activities': {'Car': 10}}, {'activities': {'Car': {'quantity': 10, 'unit': 'miles'}}},
+                  {'activities': {'Electricity': {'quantity': 2, 'unit': 'MWh'}, 'Shower': {'quantity': 1,
+                                                                                          'unit': 'm3'}}},
+                  {'activities': {'Beef': 120.0}}]
+        return await _exchange(port, _request('GET', '/units'), _request('POST', '/footprint', bodies))
+
+    [(_, _, units), (status, _, body)] = _with_service(engine, test)
+    units = json.loads(units)
+    assert (units['Car'], units['Train'], units['Shower'], units['Beef']) == ('km', 'passenger.km', 'litres',
+                                                                            'kgCO₂e')
+    totals = [result['total'] for result in json.loads(body)]
+    car = table.activity_factor('Car') / 1000
+    water = (table.activity_factor('Water Supply') + table.activity_factor('Water Treatment')) / 1000
+    np.testing.assert_allclose(totals, [10 * car, 16.09344 * car,
+                                        2000 * table.activity_factor('Electricity') / 1000 + water, 0.12])
+
+
+@pytest.mark.parametrize('activities, error', [
+    ({'Car': {'quantity': 10, 'unit': 'kWh'}}, 'Car: Cannot convert kWh to km'),
+    ({'Car': {'quantity': 10, 'unit': 'furlongs'}}, 'Car: Unknown unit: furlongs'),
+    ({'Car': {'quantity': 10}}, "Quantity for Car must be an object with 'quantity' and 'unit'"),
+    ({'Car': int('9' * 400)}, 'Quantity for Car must be a finite number or null'),
+    ({'Car': {'quantity': int('9' * 400), 'unit': 'km'}}, 'Quantity for Car must be a finite number or null'),
+    ({'Car': True}, 'Quantity for Car must be a finite number or null'),
+])
+def test_bad_quantities(engine, activities, error):
+    async def test(service, port):
+        return await _exchange(port, _request('POST', '/footprint', {'activities': activities}))
+
+    [(status, _, body)] = _with_service(engine, test)
+    assert (status, json.loads(body)) == (400, {'error': error})
+
+
+def test_malformed_bodies_and_handler_errors_get_a_response(engine, monkeypatch):
+    async def broken(body):
+        raise RuntimeError('bug')
+
+    async def test(service, port):
+        service.routes[('GET', '/health')] = broken
+        nested = b'[' * 100000
+        request = b'POST /footprint HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % len(nested) + nested
+        return (await _exchange(port, request))[0], (await _exchange(port, _request('GET', '/health')))[0]
+
+    monkeypatch.setattr('traceback.print_exc', lambda: None)
+    nested, broken = _with_service(engine, test)
+    assert (nested[0], json.loads(nested[2])) == (400, {'error': 'Request body is nested too deeply'})
+    assert (broken[0], json.loads(broken[2])) == (500, {'error': 'Internal server error'})
+
+
+@pytest.mark.parametrize('length, status', [('-1', 400), ('ten', 400), (str(MAX_BODY_BYTES + 1), 413)])
+def test_bad_content_lengths(engine, length, status):
+    async def test(service, port):
+        request = f'POST /footprint HTTP/1.1\r\nContent-Length: {length}\r\n\r\n'.encode('latin-1')
+        return await _exchange(port, request)
+
+    [(got, headers, _)] = _with_service(engine, test)
+    assert got == status
+    assert headers['connection'] == 'close'
+
+
+def test_routes_and_keep_alive(engine):
+    async def test(service, port):
+        return await _exchange(port, _request('GET', '/health'), _request('GET', '/footprint'),
+                               _request('GET', '/nowhere'), _request('POST', '/footprint', None, ''),
+                               _request('GET', '/metrics'))
+
+    responses = _with_service(engine, test)
+    assert [status for status, _, _ in responses] == [200, 405, 404, 400, 200]
+    assert json.loads(responses[0][2])['status'] == 'ok'
+    assert all(headers['connection'] == 'keep-alive' for _, headers, _ in responses)
+    assert b'footprint_stage_calls_total{stage="aggregation"}' in responses[-1][2]
+
+
+def test_render_queue_serves_rendered_files(engine, tmp_path):
+    async def test(service, port):
+        # Opened before any worker starts: a worker forked from the server would hold it open after the server
+        # closed it
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        data = {'Ann': [1.0, 2.0, 3.0], 'Bob': [0.5, None, 1.5]}
+        [(status, headers, body)] = await _exchange(port, _request('POST', '/render', {'chart': 'total_bar',
+                                                                                     'data': data}))
+        job = json.loads(body)
+        png = next(name for name in job['files'] if name.endswith('.png'))
+        full = service.renders.submit('total_bar', data)  # max_pending=2: this one fills the queue
+        responses = await _exchange(port, _request('POST', '/render', {'chart': 'total_bar', 'data': data}),
+                                    _request('POST', '/render', {'chart': 'sankey'}),
+                                    _request('GET', job['files'][png]),
+                                    _request('GET', f'/render/{job["job"]}'),
+                                    _request('GET', f'/render/{job["job"]}/other.png'),
+                                    _request('GET', '/render/unknown'))
+        await asyncio.shield(full.done)
+
+        writer.write(_request('GET', '/health', headers='Connection: close\r\n'))
+        await writer.drain()
+        await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+        return status, headers, job, responses
+
+    status, headers, job, responses = _with_service(engine, test,
+                                                    renders=RenderQueue(1, max_pending=2, root=str(tmp_path)))
+    assert status == 202
+    assert headers['location'] == f'/render/{job["job"]}'
+    assert [status for status, _, _ in responses] == [503, 400, 200, 200, 404, 404]
+    assert responses[0][1]['retry-after'] == '1'
+    assert responses[2][1]['content-type'] == 'image/png'
+    assert responses[2][2].startswith(b'\x89PNG')
+    assert json.loads(responses[3][2])['status'] == 'done'
+
+
+def test_render_queue_deletes_the_oldest_finished_jobs(engine, tmp_path):
+    async def test(service, port):
+        first = service.renders.submit('total_bar', {'Ann': [1.0, 2.0, 3.0]})
+        await asyncio.shield(first.done)
+        second = service.renders.submit('total_bar', {'Ann': [3.0, 2.0, 1.0]})
+        await asyncio.shield(second.done)
+        return first, second, list(service.renders.jobs)
+
+    first, second, jobs = _with_service(engine, test, renders=RenderQueue(1, max_finished=1, root=str(tmp_path)))
+    assert jobs == [second.id]
+    assert second.status == 'done'
+    assert sorted(p.name for p in tmp_path.iterdir()) == [second.id]
+
+
+def test_downloads_keep_their_job_until_sent(engine, tmp_path):
+    async def test(service, port):
+        first = service.renders.submit('total_bar', {'Ann': [1.0, 2.0, 3.0]})
+        await asyncio.shield(first.done)
+        reply = await service.render_status(None, f'{first.id}/{first.files[0]}')
+        second = service.renders.submit('total_bar', {'Ann': [3.0, 2.0, 1.0]})
+        await asyncio.shield(second.done)
+        held = sorted(service.renders.jobs), os.path.exists(reply.path)
+        reply.release()
+        return first, second, held, sorted(service.renders.jobs)
+
+    first, second, held, jobs = _with_service(engine, test, renders=RenderQueue(1, max_finished=1, root=str(tmp_path)))
+    assert held == (sorted([first.id, second.id]), True)
+    assert jobs == [second.id]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [second.id]
+
+
+def test_downloads_of_deleted_jobs_are_not_found(engine, tmp_path):
+    async def test(service, port):
+        job = service.renders.submit('total_bar', {'Ann': [1.0, 2.0, 3.0]})
+        # max_finished=0: the job is deleted as soon as it finishes, before the download can be sent
+        [(status, _, body)] = await _exchange(port, _request('GET', f'/render/{job.id}/{job.files[0]}'))
+        return job, status, json.loads(body)
+
+    job, status, body = _with_service(engine, test, renders=RenderQueue(1, max_finished=0, root=str(tmp_path)))
+    assert (status, body) == (404, {'error': f'Render job {job.id} has been deleted'})
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,76 @@
+import csv
+
+import numpy as np
+import pytest
+
+from footprint_graph import cohort_engine
+from group_aggregation import aggregate_part, group_by
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return cohort_engine()
+
+
+@pytest.fixture(scope='module')
+def records(tmp_path_factory, engine):
+    rng = np.random.default_rng(3)
+    count = 3000
+    people = rng.integers(0, 400, count)
+    activities = np.array(engine.activities, dtype=object)[rng.integers(0, len(engine.activities), count)]
+    quantities = rng.random(count) * 10
+    quantities[rng.random(count) < 0.02] = np.nan
+    regions = np.array([f'R{person % 3}' for person in people], dtype=object)
+    path = tmp_path_factory.mktemp('records') / 'records.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['person', 'category', 'activity', 'quantity', 'unit', 'region'])
+        for person, activity, quantity, region in zip(people, activities, quantities, regions):
+            writer.writerow([f'P{person}', '', activity, '' if np.isnan(quantity) else quantity, '', region])
+    return str(path), people, activities, quantities, regions
+
+
+# Helper function to work out per-region sums and person-total percentiles the slow way
+def _brute(engine, people, activities, quantities, regions):
+    totals = {}
+    for person, activity, quantity, region in zip(people, activities, quantities, regions):
+        if np.isnan(quantity):
+            continue
+        key = (region, person)
+        totals[key] = totals.get(key, 0.0) + quantity * engine.weights[engine.activities.index(activity)]
+    result = {}
+    for (region, _), total in totals.items():
+        result.setdefault(region, []).append(total)
+    return result
+
+
+@pytest.mark.parametrize('chunk_size', [97, 1000, 100_000])
+def test_matches_brute_force_for_any_chunk_size(engine, records, chunk_size):
+    path, people, activities, quantities, regions = records
+    aggregate = aggregate_part(path, ['region'], engine, chunk_size)
+    assert aggregate.skipped == int(np.isnan(quantities).sum())
+    statistics = aggregate.statistics((10, 50, 90))
+    expected = _brute(engine, people, activities, quantities, regions)
+    assert statistics.labels() == sorted(expected)
+    for i, region in enumerate(statistics.labels()):
+        assert statistics.people[i] == len(expected[region])
+        assert statistics.sum[i].sum() == pytest.approx(sum(expected[region]))
+        np.testing.assert_allclose(statistics.percentiles[i], np.percentile(expected[region], [10, 50, 90]))
+
+
+def test_process_pool_matches_one_process(engine, records):
+    path = records[0]
+    single = group_by(path, 'region', engine, max_workers=1).statistics()
+    pooled = group_by(path, ['region'], engine, chunk_size=250, max_workers=2).statistics()
+    assert single.labels() == pooled.labels()
+    np.testing.assert_allclose(single.sum, pooled.sum)
+    np.testing.assert_allclose(single.percentiles, pooled.percentiles)
+
+
+def test_chart_data(engine, records):
+    statistics = aggregate_part(records[0], ['region'], engine).statistics()
+    data = statistics.chart_data('mean')
+    assert list(data) == ['R0', 'R1', 'R2']
+    assert all(len(values) == len(engine.categories) for values in data.values())
+    with pytest.raises(ValueError):
+        statistics.chart_data('median')
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from footprint import FootprintEngine
+from imputation import impute, masked
+
+ACTIVITIES = ['Car', 'Beef', 'Water']
+VALUES = [[10.0, np.nan, np.nan],
+          [20.0, 4.0, np.nan],
+          [None, 6.0, np.nan]]
+
+
+def test_masked_marks_nan_and_none():
+    values = masked(VALUES)
+    np.testing.assert_array_equal(values.mask, [[False, True, True], [False, False, True], [True, False, True]])
+    assert masked(values) is values
+
+
+def test_zero_policy():
+    filled = impute(VALUES, 'zero')
+    assert not np.ma.getmaskarray(filled).any()
+    np.testing.assert_array_equal(filled, [[10.0, 0.0, 0.0], [20.0, 4.0, 0.0], [0.0, 6.0, 0.0]])
+
+
+def test_median_policy_keeps_unanswered_activities_masked():
+    filled = impute(VALUES, 'median')
+    np.testing.assert_array_equal(filled[:, :2], [[10.0, 5.0], [20.0, 4.0], [15.0, 6.0]])
+    assert np.ma.getmaskarray(filled)[:, 2].all()  # No one answered Water
+    assert impute(np.empty((0, 3)), 'median').shape == (0, 3)
+
+
+def test_default_policy():
+    filled = impute(VALUES, 'default', ACTIVITIES, {'Beef': 7.0, 'Car': 1.0})
+    np.testing.assert_array_equal(filled[:, :2], [[10.0, 7.0], [20.0, 4.0], [1.0, 6.0]])
+    assert np.ma.getmaskarray(filled)[:, 2].all()
+    with pytest.raises(ValueError):
+        impute(VALUES, 'default')
+    with pytest.raises(ValueError):
+        impute(VALUES, 'mean')
+
+
+def test_missing_answers_mask_only_their_totals():
+    engine = FootprintEngine(ACTIVITIES, [0.2, 27.0, 0.001], ['Transport', 'Diet', 'Water'])
+    _, by_category, totals = engine.score(masked(VALUES))
+    np.testing.assert_array_equal(by_category.mask, [[False, True, True], [False, False, True],
+                                                     [True, False, True]])
+    assert totals.mask.all()
+    _, by_category, totals = engine.score(impute(VALUES, 'zero'))
+    np.testing.assert_allclose(totals, [0.002, 0.112, 0.162])
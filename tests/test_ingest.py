@@ -0,0 +1,70 @@
+import csv
+
+import numpy as np
+import pytest
+
+from footprint_graph import activity_engine
+from ingest import chunk_to_matrix, iter_csv_chunks, split_file, stream_footprints
+
+
+# Helper function to write activity records to a CSV file, with an optional byte order mark before the header
+def _write_records(path, rows, bom=False):
+    with open(path, 'w', newline='', encoding='utf-8-sig' if bom else 'utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Person', 'Category', 'Activity', 'Quantity', 'Unit'])
+        writer.writerows(rows)
+    return str(path)
+
+
+ROWS = [
+    ('Ann', 'Water', 'Shower', '40', 'litres'),
+    ('Ann', 'Residential Energy', 'Electricity', '2', 'MWh'),
+    ('Bob', 'Water', 'Shower', '', 'litres'),
+    ('Bob', 'Transport', 'Walking', '3', 'km'),
+    ('Cat', 'Water', 'Shower', '0.5', 'cubic metres'),
+]
+
+
+@pytest.mark.parametrize('bom', [False, True])
+def test_csv_chunks(tmp_path, bom):
+    path = _write_records(tmp_path / 'records.csv', ROWS, bom)
+    chunks = list(iter_csv_chunks(path, chunk_size=2))
+    assert [len(chunk['person']) for chunk in chunks] == [2, 2, 1]
+    assert list(np.concatenate([chunk['person'] for chunk in chunks])) == [row[0] for row in ROWS]
+    quantities = np.concatenate([chunk['quantity'] for chunk in chunks])
+    np.testing.assert_array_equal(quantities, [40.0, 2.0, np.nan, 3.0, 0.5])
+
+
+def test_split_file_shares_cover_every_record(tmp_path):
+    path = _write_records(tmp_path / 'records.csv', ROWS * 20, bom=True)
+    people = [person for part in split_file(path, 3) for chunk in iter_csv_chunks(path, 7, part=part)
+              for person in chunk['person']]
+    assert people == [row[0] for row in ROWS * 20]
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return activity_engine()
+
+
+def test_missing_quantities_are_skipped_and_units_converted(tmp_path, engine):
+    chunk = next(iter_csv_chunks(_write_records(tmp_path / 'records.csv', ROWS)))
+    names, matrix, skipped = chunk_to_matrix(chunk, engine.activities, engine.units)
+    assert (names, skipped) == (['Ann', 'Bob', 'Cat'], 1)
+    assert not np.isnan(matrix).any()
+    shower, electricity = engine.activities.index('Shower'), engine.activities.index('Electricity')
+    np.testing.assert_allclose(matrix[:, shower], [40.0, 0.0, 500.0])
+    assert matrix[0, electricity] == pytest.approx(2000.0)  # MWh -> kWh
+
+
+def test_stream_footprints_counts_skipped_records(tmp_path, engine):
+    path = _write_records(tmp_path / 'records.csv', ROWS)
+    names, by_category, totals, skipped = stream_footprints(path, engine, chunk_size=2)
+    assert (names, skipped) == (['Ann', 'Bob', 'Cat'], 1)
+    assert np.isfinite(totals).all()
+    np.testing.assert_allclose(totals, by_category.sum(axis=1))
+    quantities = np.zeros((3, len(engine.activities)))
+    quantities[:, engine.activities.index('Shower')] = [40.0, 0.0, 500.0]
+    quantities[0, engine.activities.index('Electricity')] = 2000.0
+    quantities[1, engine.activities.index('Walking')] = 3.0
+    np.testing.assert_allclose(totals, engine.score(quantities)[2])
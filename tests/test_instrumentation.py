@@ -0,0 +1,99 @@
+import json
+import threading
+
+import pytest
+
+from instrumentation import STAGES, Instrumentation
+
+
+def test_every_stage_is_exported_from_the_start():
+    snapshot = Instrumentation().snapshot()
+    assert list(snapshot) == STAGES
+    assert all(values['calls'] == 0 and values['min_seconds'] == 0.0 for values in snapshot.values())
+
+
+def test_stage_as_context_manager_and_decorator():
+    metrics = Instrumentation()
+
+    @metrics.stage('aggregation')
+    def work():
+        with metrics.stage('layout'):
+            return 1
+
+    assert work() == 1
+    assert work() == 1
+    snapshot = metrics.snapshot()
+    assert snapshot['aggregation']['calls'] == 2
+    assert snapshot['layout']['calls'] == 2
+    assert snapshot['aggregation']['seconds'] >= snapshot['layout']['seconds']
+    assert snapshot['draw']['calls'] == 0
+
+
+def test_nested_calls_of_one_stage_and_threads():
+    metrics = Instrumentation()
+
+    def recurse(depth):
+        with metrics.stage('draw'):
+            if depth:
+                recurse(depth - 1)
+
+    threads = [threading.Thread(target=recurse, args=(3,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.snapshot()['draw']['calls'] == 16
+
+
+def test_merge_and_reset():
+    worker = Instrumentation()
+    worker.record('draw', 0.5)
+    worker.record('draw', 0.25)
+    worker.record('custom', 1.0)
+
+    metrics = Instrumentation()
+    metrics.record('draw', 1.0)
+    metrics.merge(worker.snapshot())
+    metrics.merge(worker.snapshot())
+    draw = metrics.snapshot()['draw']
+    assert draw['calls'] == 5
+    assert draw['seconds'] == pytest.approx(2.5)
+    assert (draw['min_seconds'], draw['max_seconds']) == (0.25, 1.0)
+    assert metrics.snapshot()['custom']['calls'] == 2
+
+    metrics.reset()
+    assert list(metrics.snapshot()) == STAGES
+    assert metrics.snapshot()['draw']['calls'] == 0
+
+
+def test_memory_peaks():
+    metrics = Instrumentation()
+    metrics.trace_memory()
+    try:
+        with metrics.stage('encode'):
+            block = bytearray(1_000_000)
+        del block
+    finally:
+        metrics.trace_memory(False)
+    assert metrics.snapshot()['encode']['peak_bytes'] >= 1_000_000
+
+
+def test_exports():
+    metrics = Instrumentation()
+    metrics.record('write', 0.125)
+    data = json.loads(metrics.to_json(host='test'))
+    assert data['host'] == 'test'
+    assert data['stages']['write']['calls'] == 1
+
+    text = metrics.to_prometheus()
+    assert '# TYPE footprint_stage_calls_total counter\n' in text
+    assert 'footprint_stage_calls_total{stage="write"} 1\n' in text
+    assert 'footprint_stage_seconds_total{stage="write"} 0.125\n' in text
+    assert text.count('footprint_stage_peak_bytes{stage=') == len(STAGES)
+
+
+def test_profile_reports():
+    metrics = Instrumentation()
+    with metrics.profile(limit=5) as report:
+        sorted(range(1000), key=lambda i: -i)
+    assert 'function calls' in report[0]
@@ -0,0 +1,68 @@
+import itertools
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from label_layout import find_overlaps, fits_in_wedge, place_pie_labels, resolve_overlaps, spread
+
+
+# Helper function to make random boxes (x0, y0, x1, y1) around the unit circle
+def _boxes(rng, count):
+    centres = rng.uniform(-1.5, 1.5, (count, 2))
+    sizes = rng.uniform(0.05, 0.4, (count, 2))
+    return [tuple(box) for box in np.hstack([centres - sizes / 2, centres + sizes / 2]).tolist()]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_find_overlaps_matches_brute_force(seed):
+    boxes = _boxes(np.random.default_rng(seed), 40)
+    expected = [(i, j) for i, j in itertools.combinations(range(len(boxes)), 2)
+                if boxes[i][0] < boxes[j][2] and boxes[j][0] < boxes[i][2]
+                and boxes[i][1] < boxes[j][3] and boxes[j][1] < boxes[i][3]]
+    assert sorted(find_overlaps(boxes)) == expected
+
+
+def test_spread_keeps_order_and_gap():
+    positions = spread([0.0, 0.05, 0.1, 2.0], [0.2, 0.2, 0.2, 0.2], gap=0.05)
+    assert positions[3] == 2.0  # Far enough away to stay put
+    np.testing.assert_allclose(np.diff(positions[:3]), 0.25)
+    assert np.mean(positions[:3]) == pytest.approx(0.05)  # Spread around where the labels wanted to be
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_resolved_boxes_clear_each_other_and_the_pie(seed):
+    boxes = _boxes(np.random.default_rng(seed), 8)
+    resolved = resolve_overlaps(boxes, gap=0.02, radius=1.0)
+    assert find_overlaps(resolved) == []
+    for (x0, y0, x1, y1), box in zip(resolved, boxes):
+        assert (x1 - x0, y1 - y0) == pytest.approx((box[2] - box[0], box[3] - box[1]))
+        nearest = np.hypot(min(max(0.0, x0), x1), min(max(0.0, y0), y1))
+        assert nearest >= 1.0 - 1e-9
+
+
+def test_fits_in_wedge():
+    assert fits_in_wedge((0.4, 0.4, 0.6, 0.5), 0, 90)
+    assert not fits_in_wedge((0.4, 0.4, 0.6, 0.5), 90, 180)
+    assert not fits_in_wedge((0.8, 0.8, 1.0, 0.9), 0, 90)  # Reaches past the rim
+    assert fits_in_wedge((-0.1, -0.1, 0.1, 0.1), 0, 360)
+
+
+# Helper function to draw one pie with small wedges whose labels go outside, returning its label positions
+def _label_positions(draw_first):
+    fig, ax = plt.subplots(figsize=(8, 4))
+    try:
+        wedges, _ = ax.pie([80, 1, 1, 1, 17], startangle=90)
+        texts = [ax.text(0, 0, f'{i}.0%', ha='center', va='center', fontsize=15) for i in range(len(wedges))]
+        lines = [ax.plot([0, 0], [0, 0], visible=False)[0] for _ in wedges]
+        if draw_first:
+            fig.canvas.draw()
+        place_pie_labels(ax, wedges, texts, lines, [True] * len(wedges))
+        return [text.get_position() for text in texts]
+    finally:
+        plt.close(fig)
+
+
+def test_labels_are_measured_on_the_drawn_scale():
+    # The equal aspect of a pie is applied at draw time; placing labels on a new figure must not depend on it
+    np.testing.assert_allclose(_label_positions(False), _label_positions(True))
@@ -0,0 +1,45 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from pie_geometry import PieGeometry, bisectors, leader_ends, wedge_angles
+
+
+@pytest.mark.parametrize('values', [[3.0, 1.0, 4.0, 1.0, 5.0], [0.0, 2.0, 0.0, 7.5], [1e-6, 1.0]])
+def test_wedges_match_matplotlib(values):
+    fig, ax = plt.subplots()
+    try:
+        wedges, _ = ax.pie(values, startangle=90)
+        fractions, theta1, theta2 = wedge_angles([values])
+        np.testing.assert_allclose(theta1[0], [wedge.theta1 for wedge in wedges])
+        np.testing.assert_allclose(theta2[0], [wedge.theta2 for wedge in wedges])
+        np.testing.assert_allclose(fractions[0], np.array(values) / sum(values))
+    finally:
+        plt.close(fig)
+
+
+def test_pies_are_computed_together():
+    values = np.array([[1.0, 1.0, 2.0], [0.0, 0.0, 0.0], [1.0, np.nan, 1.0]])
+    geometry = PieGeometry(values)
+    assert len(geometry) == 3
+    np.testing.assert_array_equal(geometry.missing, [False, False, True])
+    np.testing.assert_allclose(geometry.pcts[0], [25.0, 25.0, 50.0])
+    np.testing.assert_allclose(geometry.spans[0], [90.0, 90.0, 180.0])
+    assert not geometry.spans[1:].any()  # Empty and missing pies get zero-width wedges
+
+    # The first wedge runs from 12 o'clock to 9 o'clock, so its bisector points up and to the left
+    np.testing.assert_allclose(geometry.directions[0, 0], [-np.sqrt(0.5), np.sqrt(0.5)], atol=1e-12)
+    np.testing.assert_allclose(geometry.internal, 0.75 * geometry.directions)
+    np.testing.assert_allclose(geometry.external, 1.2 * geometry.directions)
+    np.testing.assert_allclose(np.linalg.norm(geometry.leader_starts, axis=-1), 0.9)
+    assert PieGeometry([1.0, 2.0]).values.shape == (1, 2)
+
+
+def test_bisectors():
+    np.testing.assert_allclose(bisectors([0.0, 90.0], [180.0, 270.0]), [[0.0, 1.0], [-1.0, 0.0]], atol=1e-12)
+
+
+def test_leader_ends_stop_at_the_label_box():
+    ends = leader_ends([[0.0, 0.0], [0.0, 0.0], [1.0, 1.0]], [[2.0, 0.0], [2.0, 1.0], [1.0, 1.0]],
+                       [[0.5, 0.25], [0.5, 0.25], [0.5, 0.25]], pad=0.1)
+    np.testing.assert_allclose(ends, [[1.4, 0.0], [1.4, 0.7], [1.0, 1.0]])
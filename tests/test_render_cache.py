@@ -0,0 +1,62 @@
+import os
+
+from render_cache import RenderCache, cache_key
+
+
+# Helper function to overwrite a file in place, as savefig and the SVG writer do
+def _rewrite(path, content):
+    with open(path, 'r+b') as f:
+        f.truncate(0)
+        f.write(content)
+
+
+def test_writes_to_outputs_never_reach_the_cache(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    output = tmp_path / 'out'
+    output.mkdir()
+    (output / 'chart.png').write_bytes(b'original')
+    key = cache_key('total_bar', {'Ann': [1.0]}, {})
+    cache.store(key, [str(output / 'chart.png')])
+
+    _rewrite(output / 'chart.png', b'other data')  # A later render without the cache
+    fetched = cache.fetch(key, str(tmp_path / 'again'), ['chart.png'])
+    assert open(fetched[0], 'rb').read() == b'original'
+
+    _rewrite(fetched[0], b'edited')
+    assert open(cache.fetch(key, str(tmp_path / 'third'), ['chart.png'])[0], 'rb').read() == b'original'
+
+
+def test_miss_and_key_changes(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    assert cache.fetch('0' * 64, str(tmp_path / 'out'), ['chart.png']) is None
+    assert cache_key('total_bar', {'Ann': [1.0]}, {}) != cache_key('total_bar', {'Ann': [2.0]}, {})
+    assert cache_key('total_bar', {'Ann': [1.0]}, {}) == cache_key('total_bar', {'Ann': [1.0]}, {})
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=250)
+    keys = []
+    for i in range(3):
+        path = tmp_path / f'chart{i}.png'
+        path.write_bytes(bytes(100))
+        keys.append(cache_key('total_bar', {'Ann': [float(i)]}, {}))
+        cache.store(keys[-1], [str(path)])
+        os.utime(os.path.join(cache.root, keys[-1][:2], keys[-1]), (i, i))  # Distinct use times
+    cache.evict()
+    assert cache.fetch(keys[0], str(tmp_path / 'out'), ['chart0.png']) is None
+    assert cache.fetch(keys[2], str(tmp_path / 'out'), ['chart2.png']) is not None
+
+
+def test_caches_sharing_a_root_keep_to_one_budget(tmp_path):
+    # Two workers, each with its own RenderCache on the same directory
+    workers = [RenderCache(str(tmp_path / 'cache'), max_bytes=450) for _ in range(2)]
+    for i in range(10):
+        path = tmp_path / f'chart{i}.png'
+        path.write_bytes(bytes(100))
+        key = cache_key('total_bar', {'Ann': [float(i)]}, {})
+        workers[i % 2].store(key, [str(path)])
+        os.utime(os.path.join(workers[0].root, key[:2], key), (i, i))
+    assert workers[0].evict() == workers[1].evict() == 400  # Each store measured what both had written
+    kept = [workers[0].fetch(cache_key('total_bar', {'Ann': [float(i)]}, {}), str(tmp_path / 'out'), [f'chart{i}.png'])
+            is not None for i in range(10)]
+    assert kept == [False] * 6 + [True] * 4
@@ -0,0 +1,80 @@
+import xml.etree.ElementTree as ET
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+from PIL import Image
+
+from svg_writer import figure_svg, save_figure
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+
+@pytest.fixture
+def figure():
+    fig, (pie, bar) = plt.subplots(1, 2, figsize=(6, 3))
+    pie.pie([3, 1, 2], labels=['Beef', 'Rice', 'Milk'], startangle=90, hatch=['', '//', ''])
+    pie.set_title('Diet')
+    bar.bar(['Car', 'Train'], [2.5, 0.0])
+    bar.errorbar([0], [2.5], yerr=[[0.5], [0.25]], fmt='none', color='black')
+    bar.text(1, 0.1, 'N/A', ha='center')
+    bar.set_ylabel('tCO₂e')
+    yield fig
+    plt.close(fig)
+
+
+# Helper function to parse an SVG file, failing on anything that isn't well-formed XML
+def _parse(path):
+    return ET.parse(path).getroot()
+
+
+def test_writes_png_and_svg_from_one_draw(figure, tmp_path):
+    paths = [str(tmp_path / 'chart.png'), str(tmp_path / 'chart.svg')]
+    assert save_figure(figure, paths) == paths
+    with Image.open(paths[0]) as image:
+        assert image.size == (600, 300)
+
+    root = _parse(paths[1])
+    assert root.tag == SVG + 'svg'
+    assert root.get('viewBox') == '0 0 432 216'
+    text = ''.join(root.itertext())
+    for label in ['Beef', 'Rice', 'Milk', 'Diet', 'N/A', 'tCO₂e']:
+        assert label in text
+    assert len(root.findall(f'.//{SVG}path')) >= 5  # Wedges, bars and the error bar
+
+
+def test_svg_only_and_tight(figure, tmp_path):
+    path = str(tmp_path / 'chart.svg')
+    save_figure(figure, [path], tight=True)
+    root = _parse(path)
+    width, height = (float(value) for value in root.get('viewBox').split()[2:])
+    assert 0 < width < 432 + 1 and 0 < height < 216 + 1
+    assert 'Diet' in ''.join(root.itertext())
+
+
+@pytest.mark.parametrize('rotation, ha', [(0, 'center'), (90, 'left'), (30, 'right')])
+def test_text_sits_on_matplotlibs_baselines(rotation, ha):
+    fig = plt.figure(figsize=(4, 4))
+    try:
+        text = fig.text(0.5, 0.5, 'Residential\nEnergy', rotation=rotation, ha=ha, va='center', fontsize=20)
+        fig.draw_without_rendering()
+        renderer = fig.canvas.get_renderer()
+        root = ET.fromstring(figure_svg(fig, renderer))
+        drawn = [(float(element.get('x')), float(element.get('y'))) for element in root.iter(SVG + 'text')]
+
+        # Where Text.draw puts each line's anchor point, in SVG points
+        _, lines, _ = text._get_layout(renderer)
+        origin = text.get_transform().transform(text.get_unitless_position())
+        direction = np.array([np.cos(np.deg2rad(rotation)), np.sin(np.deg2rad(rotation))])
+        fraction = {'left': 0.0, 'center': 0.5, 'right': 1.0}[ha]
+        expected = [origin + offset + direction * width * fraction for _, (width, _, _), offset in lines]
+        expected = [(x * 72 / fig.dpi, (fig.bbox.height - y) * 72 / fig.dpi) for x, y in expected]
+        np.testing.assert_allclose(drawn, expected, atol=72 / fig.dpi)  # Within a pixel
+    finally:
+        plt.close(fig)
+
+
+def test_saving_without_a_draw_event_is_an_error(figure, tmp_path, monkeypatch):
+    monkeypatch.setattr(figure, 'savefig', lambda path, **options: open(path, 'wb').close())
+    with pytest.raises(RuntimeError, match='draw event'):
+        save_figure(figure, [str(tmp_path / 'chart.png'), str(tmp_path / 'chart.svg')])
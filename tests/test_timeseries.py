@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from footprint_graph import cohort_engine
+from timeseries import FootprintTimeline
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return cohort_engine()
+
+
+# Helper function to add up records the slow way: {name: row} and the activity order give the dense matrix
+def _brute(timeline, names, activities, quantities, keep):
+    rows = [timeline.names.index(name) for name in names[keep]]
+    columns = [timeline.engine.activities.index(activity) for activity in activities[keep]]
+    result = np.zeros((len(timeline), len(timeline.engine.activities)))
+    np.add.at(result, (rows, columns), quantities[keep])
+    return result
+
+
+# Random batches of records that bring in new people on later dates, some of them late arrivals
+def _batches(engine, seed, count=8):
+    rng = np.random.default_rng(seed)
+    day = np.datetime64('2024-01-01')
+    for step in range(count):
+        size = int(rng.integers(1, 30))
+        day = day + int(rng.integers(0, 20))
+        dates = day - rng.integers(0, 10, size)
+        names = np.array([f'P{person}' for person in rng.integers(0, 5 + 10 * step, size)], dtype=object)
+        activities = np.array(engine.activities, dtype=object)[rng.integers(0, len(engine.activities), size)]
+        yield dates, names, activities, rng.random(size)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_windows_match_brute_force_as_people_join(engine, seed):
+    timeline = FootprintTimeline(engine)
+    batches = list(_batches(engine, seed))
+    for batch in batches:
+        timeline.add(*batch)
+    dates, names, activities, quantities = (np.concatenate(column) for column in zip(*batches))
+
+    windows = {
+        'all': np.ones(len(dates), dtype=bool),
+        'last:7': dates > timeline.latest - 7,
+        'last:30': dates > timeline.latest - 30,
+        'last:12': dates > timeline.latest - 12,  # Not tracked: added up from the days
+        str(dates[0]): dates == dates[0],
+        str(dates[0].astype('datetime64[M]')): dates.astype('datetime64[M]') == dates[0].astype('datetime64[M]'),
+    }
+    for window, keep in windows.items():
+        expected = _brute(timeline, names, activities, quantities, keep)
+        np.testing.assert_allclose(timeline.quantities(window), expected, atol=1e-9, err_msg=window)
+
+
+def test_missing_quantities_are_skipped(engine):
+    timeline = FootprintTimeline(engine)
+    timeline.add(['2024-03-01', '2024-03-02'], ['Ann', 'Bob'], ['Car', 'Beef'], [2.0, np.nan])
+    assert timeline.skipped == 1
+    assert timeline.names == ['Ann']
+    assert timeline.quantities('2024-03')[0, engine.activities.index('Car')] == 2.0
+
+
+def test_trailing_window_drops_old_days(engine):
+    timeline = FootprintTimeline(engine, rolling_days=(7,))
+    timeline.add(['2024-03-01'], ['Ann'], ['Car'], [5.0])
+    timeline.add(['2024-03-07'], ['Bob'], ['Car'], [1.0])
+    assert timeline.quantities('last:7').sum() == 6.0
+    timeline.add(['2024-03-08'], ['Cy'], ['Car'], [1.0])
+    assert timeline.quantities('last:7').sum() == 2.0
+    timeline.add(['2025-01-01'], ['Dee'], ['Car'], [3.0])
+    assert timeline.quantities('last:7').sum() == 3.0
+
+
+def test_units_are_converted(engine):
+    timeline = FootprintTimeline(engine)
+    timeline.add(['2024-03-01'], ['Ann'], ['Shower'], [2.0], units=['cubic metres'])
+    assert timeline.quantities()[0, engine.activities.index('Shower')] == 2000.0
+    with pytest.raises(ValueError):
+        timeline.add(['2024-03-01'], ['Ann'], ['Car'], [2.0], units=['litres'])
+
+
+def test_unknown_window(engine):
+    timeline = FootprintTimeline(engine)
+    with pytest.raises(ValueError):
+        timeline.quantities('yesterday')
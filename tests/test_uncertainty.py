@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from footprint import FootprintEngine
+from footprint_graph import group_cohort
+from uncertainty import propagate
+
+
+@pytest.fixture(scope='module')
+def cohort():
+    return group_cohort()
+
+
+def test_no_uncertainty_gives_the_point_values(cohort):
+    engine, names, quantities = cohort
+    result = propagate(engine, quantities, names, samples=200, factor_uncertainty=0.0)
+    np.testing.assert_allclose(result.totals.lower, result.totals.mean, rtol=1e-6)
+    np.testing.assert_allclose(result.categories.upper, result.categories.mean, rtol=1e-6)
+    np.testing.assert_array_equal(np.ma.getmaskarray(result.totals.lower), np.ma.getmaskarray(result.totals.mean))
+
+
+# A category of one activity has the activity's closed-form interval, with or without quantity noise
+@pytest.mark.parametrize('quantity_uncertainty', [0.0, 0.2])
+def test_samples_match_the_closed_form(quantity_uncertainty):
+    engine = FootprintEngine(['Beef', 'Car'], [1.0, 1.0], ['Diet', 'Transport'])
+    quantities = np.array([[1000.0, 0.0], [250.0, 4000.0]])
+    result = propagate(engine, quantities, samples=20_000, factor_uncertainty=0.3,
+                       quantity_uncertainty=quantity_uncertainty)
+    np.testing.assert_allclose(result.categories.lower, result.activities.lower, rtol=0.03)
+    np.testing.assert_allclose(result.categories.upper, result.activities.upper, rtol=0.03)
+
+
+def test_result_depends_only_on_the_seed(cohort):
+    engine, names, quantities = cohort
+    quantities = np.nan_to_num(np.tile(quantities, (20, 1)))
+    options = dict(samples=500, quantity_uncertainty=0.1, seed=7)
+    one = propagate(engine, quantities, **options, max_bytes=1 << 30, workers=1)
+    chunked = propagate(engine, quantities, **options, max_bytes=1 << 30, workers=2)
+    np.testing.assert_array_equal(one.totals.lower, chunked.totals.lower)
+    assert not np.array_equal(one.totals.lower, propagate(engine, quantities, samples=500, seed=8).totals.lower)
+
+
+def test_chart_data_matches_the_chart_modules(cohort):
+    engine, names, quantities = cohort
+    result = propagate(engine, quantities, names, samples=200)
+    data, errors = result.chart_data('transport_bar')
+    assert list(data) == ['Jonathan', 'Connor']  # Agnel neither drives nor takes the train
+    assert set(errors) == set(data)
+    data, errors = result.chart_data('total_bar')
+    assert all(len(bounds) == 2 for bounds in errors.values())
+    with pytest.raises(ValueError):
+        result.chart_data('water_pie')
+
+
+def test_result_does_not_depend_on_chunking(cohort):
+    engine, names, quantities = cohort
+    quantities = np.nan_to_num(np.tile(quantities, (100, 1)))
+    options = dict(samples=500, quantity_uncertainty=0.1, seed=7)
+    whole = propagate(engine, quantities, **options, max_bytes=1 << 30, workers=1)
+    per_person = 500 * 4 * (len(engine.categories) + 2)
+    chunked = propagate(engine, quantities, **options, max_bytes=2 * 64 * per_person, workers=2)  # 64 people a chunk
+    np.testing.assert_array_equal(whole.totals.lower, chunked.totals.lower)
+    np.testing.assert_array_equal(whole.categories.upper, chunked.categories.upper)
+    np.testing.assert_allclose(whole.cohort.upper, chunked.cohort.upper, rtol=1e-9)
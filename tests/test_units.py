@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from ingest import chunk_to_matrix
+from units import KG_CO2E, T_CO2E, UNSPECIFIED, conversion_factor, convert, convert_column, unit_code, unit_codes
+
+
+def test_conversion_factors():
+    assert conversion_factor(KG_CO2E, T_CO2E) == pytest.approx(1e-3)
+    assert conversion_factor('cubic metres', 'litres') == pytest.approx(1e3)
+    assert conversion_factor('miles', 'km') == pytest.approx(1.609344)
+    assert conversion_factor('kWh', 'kWh') == 1.0
+    assert conversion_factor('', 'litres') == 1.0  # A blank unit is taken as given
+    with pytest.raises(ValueError):
+        conversion_factor('kWh', 'litres')
+
+
+@pytest.mark.parametrize('spelling, unit', [('KWh', 'kWh'), ('passenger-km', 'passenger.km'), ('kg CO2e', KG_CO2E),
+                                            ('m³', 'cubic metres'), (' Litre ', 'litres'), ('pkm', 'passenger.km')])
+def test_aliases_and_spellings(spelling, unit):
+    assert unit_code(spelling) == unit_code(unit)
+
+
+def test_unknown_and_blank_units():
+    assert unit_code(None) == UNSPECIFIED
+    with pytest.raises(ValueError, match='furlongs'):
+        unit_code('furlongs')
+    codes = unit_codes(np.array(['kWh', 'Wh', 'kWh', ''], dtype=object))
+    np.testing.assert_array_equal(codes, [unit_code('kWh'), unit_code('Wh'), unit_code('kWh'), UNSPECIFIED])
+    np.testing.assert_array_equal(unit_codes(codes), codes)
+
+
+def test_convert_keeps_masks():
+    values = np.ma.masked_array([1.0, 2.0], mask=[False, True])
+    converted = convert(values, 'tonnes', 'kg')
+    np.testing.assert_array_equal(converted.mask, values.mask)
+    assert converted[0] == pytest.approx(1000.0)
+
+
+def test_convert_column():
+    converted = convert_column([1.0, 500.0, 2.0], ['kWh', 'Wh', ''], 'kWh')
+    np.testing.assert_allclose(converted, [1.0, 0.5, 2.0])
+    np.testing.assert_allclose(convert_column([1.0, 1.0], ['m3', 'miles'], ['litres', 'km']), [1000.0, 1.609344])
+
+
+def test_convert_column_names_every_incompatible_pair():
+    with pytest.raises(ValueError) as error:
+        convert_column([1.0, 2.0, 3.0], ['kWh', 'litres', 'kWh'], ['km', 'kg', 'km'])
+    assert str(error.value) == 'Incompatible units: kWh -> km, litres -> kg'
+
+
+def test_ingest_converts_to_activity_units_and_rejects_others():
+    chunk = {
+        'person': np.array(['Ann', 'Ann', 'Bob'], dtype=object),
+        'activity': np.array(['Electricity', 'Water', 'Water'], dtype=object),
+        'quantity': np.array([2000.0, 1.0, 3.0]),
+        'unit': np.array(['Wh', 'm3', 'litres'], dtype=object),
+    }
+    names, matrix, _ = chunk_to_matrix(chunk, ['Electricity', 'Water'], ['kWh', 'litres'])
+    assert names == ['Ann', 'Bob']
+    np.testing.assert_allclose(matrix, [[2.0, 1000.0], [0.0, 3.0]])
+
+    chunk['unit'][0] = 'km'
+    with pytest.raises(ValueError, match='km -> kWh'):
+        chunk_to_matrix(chunk, ['Electricity', 'Water'], ['kWh', 'litres'])
@@ -0,0 +1,253 @@
+import argparse
+import os
+
+import numpy as np
+
+from footprint_graph import CHART_INPUTS, FootprintGraph, cohort_engine
+from ingest import DATE_FIELD, DEFAULT_CHUNK_SIZE, activity_columns, activity_quantities, iter_chunks
+from instrumentation import stage
+
+# Calendar periods quantities are bucketed by, as numpy datetime64 units
+PERIODS = {'day': 'D', 'month': 'M', 'year': 'Y'}
+
+# Trailing windows (in days, up to the latest record) kept up to date as records arrive
+ROLLING_DAYS = (7, 30, 365)
+
+# Window covering every record so far
+CUMULATIVE = 'all'
+
+
+# Quantities of one calendar period, stored sparsely as (person row, activity column, quantity) triples so a
+# period only costs the people and activities it has records for. Added records wait in a list and are merged
+# into one triple per (person, activity) when read, or once they outnumber the merged ones.
+class _SparseBucket:
+    def __init__(self, activities):
+        self.activities = activities
+        self.keys = np.zeros(0, dtype=np.int64)  # row * activities + column, sorted and distinct
+        self.values = np.zeros(0)
+        self._pending = []
+        self._pending_size = 0
+
+    def add(self, rows, columns, values):
+        self._pending.append((rows.astype(np.int64) * self.activities + columns, values))
+        self._pending_size += len(values)
+        if self._pending_size > max(len(self.keys), 1024):
+            self._merge()
+
+    # Helper function to fold the pending records into the merged triples
+    def _merge(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self.keys] + [keys for keys, _ in self._pending])
+        values = np.concatenate([self.values] + [values for _, values in self._pending])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.values = np.bincount(inverse.reshape(-1), weights=values, minlength=len(self.keys))
+        self._pending, self._pending_size = [], 0
+
+    # The (rows, columns, values) triples of the period
+    def triples(self):
+        self._merge()
+        return self.keys // self.activities, self.keys % self.activities, self.values
+
+    # Add the period's quantities into a dense (people x activities) array, times sign
+    def add_to(self, totals, sign=1.0):
+        rows, columns, values = self.triples()
+        np.add.at(totals, (rows, columns), values * sign)
+
+
+# Dated activity records (daily meter readings, trips) folded into per-person quantity buckets for every day, month
+# and year, a running total and trailing windows. Each record updates only its own buckets and the windows it
+# falls in; as the latest day moves on, days leaving a trailing window are subtracted from it, so no update ever
+# rescans the history. Buckets are sparse (see _SparseBucket); only the running total and the trailing windows
+# are dense arrays over everyone. Windows are scored with the engine on demand, and missing quantities (NaN) are
+# skipped.
+class FootprintTimeline:
+    def __init__(self, engine=None, rolling_days=ROLLING_DAYS):
+        self.engine = cohort_engine() if engine is None else engine
+        self.names = []
+        self._rows = {}
+        self.buckets = {unit: {} for unit in PERIODS.values()}  # Unit -> period start -> _SparseBucket
+        self.cumulative = self._zeros(0)
+        self.rolling = {days: self._zeros(0) for days in rolling_days}
+        self.latest = None  # Latest day seen: the end of the trailing windows
+        self.skipped = 0  # Records without a quantity
+
+    def __len__(self):
+        return len(self.names)
+
+    # Helper function to make a quantity array for the given number of people
+    def _zeros(self, people):
+        return np.zeros((people, len(self.engine.activities)))
+
+    # Helper function to grow an array to hold everyone seen so far; capacity doubles so new people rarely cost a copy
+    def _fit(self, array):
+        if len(array) >= len(self.names):
+            return array
+        grown = self._zeros(max(len(self.names), 2 * len(array)))
+        grown[:len(array)] = array
+        return grown
+
+    # Helper function to map person names to rows, adding the people not seen before
+    def _person_rows(self, names):
+        distinct, codes = np.unique(names, return_inverse=True)
+        rows = np.empty(len(distinct), dtype=np.intp)
+        for i, name in enumerate(distinct):
+            row = self._rows.get(name)
+            if row is None:
+                row = self._rows[name] = len(self.names)
+                self.names.append(name)
+            rows[i] = row
+        return rows[codes]
+
+    # Helper function to move the end of the trailing windows to a later day, subtracting the days that drop out
+    def _advance(self, latest):
+        if self.latest is not None:
+            days_buckets = self.buckets[PERIODS['day']]
+            for days in self.rolling:
+                totals = self.rolling[days] = self._fit(self.rolling[days])  # Holds every row a bucket can have
+                if latest - self.latest >= days:
+                    totals[:] = 0.0  # Nothing in the window survives the jump
+                    continue
+                for day in np.arange(self.latest - days + 1, latest - days + 1):
+                    bucket = days_buckets.get(day)
+                    if bucket is not None:
+                        bucket.add_to(totals, -1.0)
+        self.latest = latest
+
+    # Add dated records: one day, person name, activity name and quantity per record, plus the unit of every
+    # quantity when it isn't the unit of its activity in the engine
+    @stage('aggregation')
+    def add(self, dates, names, activities, quantities, units=None):
+        dates = np.asarray(dates, dtype='datetime64').astype('datetime64[D]')
+        quantities = np.asarray(quantities, dtype=np.float64)
+        keep = ~np.isnan(quantities)
+        self.skipped += int(len(quantities) - keep.sum())
+        if not keep.all():
+            dates, quantities = dates[keep], quantities[keep]
+            names, activities = np.asarray(names, dtype=object)[keep], np.asarray(activities, dtype=object)[keep]
+            units = None if units is None else np.asarray(units, dtype=object)[keep]
+        if not len(quantities):
+            return
+        columns = activity_columns(activities, self.engine.activities)
+        if units is not None:
+            quantities = activity_quantities(quantities, units, columns, self.engine.units)
+        rows = self._person_rows(names)
+
+        latest = dates.max()
+        if self.latest is None or latest > self.latest:
+            self._advance(latest)
+
+        # Calendar buckets: records sorted by period so each bucket is updated from one slice
+        for unit, buckets in self.buckets.items():
+            periods = dates.astype(f'datetime64[{unit}]')
+            order = np.argsort(periods, kind='stable')
+            starts, counts = np.unique(periods[order], return_counts=True)
+            bounds = np.concatenate(([0], np.cumsum(counts)))
+            for start, first, last in zip(starts, bounds[:-1], bounds[1:]):
+                picked = order[first:last]
+                bucket = buckets.get(start)
+                if bucket is None:
+                    bucket = buckets[start] = _SparseBucket(len(self.engine.activities))
+                bucket.add(rows[picked], columns[picked], quantities[picked])
+
+        self.cumulative = self._fit(self.cumulative)
+        np.add.at(self.cumulative, (rows, columns), quantities)
+        for days in self.rolling:
+            totals = self.rolling[days] = self._fit(self.rolling[days])
+            inside = dates > self.latest - days
+            np.add.at(totals, (rows[inside], columns[inside]), quantities[inside])
+
+    # Add one chunk of dated records from ingest.iter_chunks(..., dated=True)
+    def add_chunk(self, chunk):
+        self.add(chunk[DATE_FIELD], chunk['person'], chunk['activity'], chunk['quantity'], chunk['unit'])
+
+    # Stream a whole dated activity file in, one chunk at a time
+    def ingest(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        for chunk in iter_chunks(path, chunk_size, dated=True):
+            self.add_chunk(chunk)
+        return self
+
+    # Starts of the periods with records: period is 'day', 'month' or 'year'
+    def periods(self, period):
+        return sorted(self.buckets[PERIODS[period]])
+
+    # Quantities (people x activities) over a window: 'all' for every record so far, 'last:30' for the trailing 30
+    # days up to the latest record, or a calendar day, month or year ('2024-03-05', '2024-03', '2024')
+    def quantities(self, window=CUMULATIVE):
+        people = len(self.names)
+        if window == CUMULATIVE:
+            return self._fit(self.cumulative)[:people].copy()
+        if isinstance(window, str) and window.startswith('last:'):
+            days = int(window[len('last:'):])
+            if days in self.rolling:
+                return self._fit(self.rolling[days])[:people].copy()
+            # Not a tracked window: add up its days
+            result = self._zeros(people)
+            if self.latest is not None:
+                days_buckets = self.buckets[PERIODS['day']]
+                for day in np.arange(self.latest - days + 1, self.latest + 1):
+                    bucket = days_buckets.get(day)
+                    if bucket is not None:
+                        bucket.add_to(result)
+            return result
+        try:
+            start = np.datetime64(window)
+        except ValueError as e:
+            raise ValueError(f'Unknown window {window!r}') from e
+        unit = np.datetime_data(start.dtype)[0]
+        if unit not in self.buckets:
+            raise ValueError(f'Window {window!r} is not a day, month or year')
+        result = self._zeros(people)
+        bucket = self.buckets[unit].get(start)
+        if bucket is not None:
+            bucket.add_to(result)
+        return result
+
+    # Per-activity, per-category and per-person emissions (tCO₂e by default) over a window
+    def score(self, window=CUMULATIVE):
+        return (list(self.names),) + self.engine.score(self.quantities(window))
+
+    # Per-person category totals over a window as {'Jonathan': [energy, water, transport, diet]}, the data of
+    # bar_charts.py and bar_chart_total.py
+    def category_totals(self, window=CUMULATIVE):
+        _, _, by_category, _ = self.score(window)
+        return {name: row for name, row in zip(self.names, by_category.tolist())}
+
+    # The data a chart expects (see footprint_graph.CHART_INPUTS) over a window
+    def chart_data(self, chart, window=CUMULATIVE):
+        return FootprintGraph(self.engine, self.names, self.quantities(window)).chart_data(chart)
+
+
+# Draw charts of one window of a dated activity file, each cohort in as many pages as it needs
+def render_window(timeline, charts, window=CUMULATIVE, output_dir='charts'):
+    from figure_pool import FigurePool, render_pages
+
+    os.makedirs(output_dir, exist_ok=True)
+    pool = FigurePool()
+    written = []
+    try:
+        for chart in charts:
+            for paths in render_pages(chart, timeline.chart_data(chart, window), output_dir, pool):
+                written.extend(paths)
+    finally:
+        pool.close()
+    return written
+
+
+if __name__ == '__main__':
+    from figure_pool import FigurePool
+
+    parser = argparse.ArgumentParser(description='Render the charts of one window of a dated activity file')
+    parser.add_argument('records', help='CSV or Parquet file of dated activity records')
+    parser.add_argument('--window', action='append',
+                        help="'all', 'last:DAYS', or a day, month or year such as 2024-03 (repeatable)")
+    parser.add_argument('--charts', nargs='+', default=None, help='charts to draw (default: all that support it)')
+    parser.add_argument('--output-dir', default='charts', help='each window is drawn into a subdirectory of this')
+    args = parser.parse_args()
+
+    timeline = FootprintTimeline().ingest(args.records)
+    charts = args.charts or [chart for chart in CHART_INPUTS if FigurePool.supports(chart)]
+    for window in args.window or [CUMULATIVE]:
+        directory = os.path.join(args.output_dir, window.replace(':', '_'))
+        written = render_window(timeline, charts, window, directory)
+        print(f'{window}: {len(written)} files in {directory}')
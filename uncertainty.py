@@ -0,0 +1,264 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from chart_spec import CHART_SPECS
+from footprint import CATEGORY_ACTIVITIES
+from footprint_graph import CHART_INPUTS
+from imputation import masked
+from instrumentation import stage
+
+# Relative standard uncertainty (standard deviation / value) of the emission factor behind each activity. The DEFRA
+# workbook publishes no per-factor uncertainty, so these are working assumptions by category: metered fuels are
+# well known, travel depends on vehicle and occupancy, food on farming system and origin. Pass measured values
+# to propagate() to replace them.
+CATEGORY_FACTOR_UNCERTAINTY = {
+    'Residential Energy': 0.05,
+    'Water': 0.10,
+    'Transport': 0.15,
+    'Diet': 0.30,
+}
+FACTOR_UNCERTAINTY = {activity: CATEGORY_FACTOR_UNCERTAINTY[category]
+                      for category, activities in CATEGORY_ACTIVITIES.items()
+                      for activity in activities}
+
+# Monte Carlo samples drawn unless the caller asks otherwise
+DEFAULT_SAMPLES = 10_000
+
+# Probability covered by the reported intervals
+DEFAULT_CONFIDENCE = 0.95
+
+# Memory the samples of all chunks in flight may use together; larger cohorts are simulated chunk by chunk
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+# People drawing their quantity noise from one random stream. Chunks hold whole blocks, so the samples are the same
+# however the cohort is chunked.
+SEED_BLOCK = 64
+
+# Charts that can show error bars, with what they show (see footprint_graph.CHART_INPUTS)
+ERROR_BAR_CHARTS = [chart for chart, spec in CHART_INPUTS.items() if not spec.get('quantities')]
+
+
+# Helper function to turn relative uncertainties (one for all, or a dictionary by activity) into the log-space
+# sigma and mu of mean-preserving lognormal multipliers, one per activity
+def _lognormal(uncertainty, activities):
+    if isinstance(uncertainty, dict):
+        relative = np.array([uncertainty.get(activity, 0.0) for activity in activities], dtype=np.float64)
+    else:
+        relative = np.full(len(activities), float(uncertainty or 0.0))
+    sigma = np.sqrt(np.log1p(relative ** 2))
+    return sigma, -sigma ** 2 / 2  # mu keeps the multiplier's mean at 1, so means stay the point values
+
+
+# Helper function to draw lognormal multipliers (float32) of the given shape, the activities on the last axis
+def _multipliers(rng, shape, sigma, mu):
+    values = rng.standard_normal(shape, dtype=np.float32)
+    values *= sigma.astype(np.float32)
+    values += mu.astype(np.float32)
+    return np.exp(values, out=values)
+
+
+# Helper function to find the lower and upper order statistics of every row of samples (people x samples), in place.
+# One vectorised float32 sort beats two partitions, since numpy only has a fast path for a single kth.
+def _bounds(samples, low, high):
+    samples.sort(axis=1)
+    return samples[:, low], samples[:, high]
+
+
+# Point values with lower and upper bounds of the confidence interval, masked where data is missing
+class Interval:
+    def __init__(self, mean, lower, upper):
+        self.mean = mean
+        self.lower = lower
+        self.upper = upper
+
+
+# Emissions (tCO₂e by default) with confidence intervals for every person: per activity, per category and in total,
+# plus the whole cohort's category totals and grand total
+class UncertaintyResult:
+    def __init__(self, names, engine, samples, confidence, activities, categories, totals, cohort):
+        self.names = list(names)
+        self.engine = engine
+        self.samples = samples
+        self.confidence = confidence
+        self.activities = activities  # people x activities
+        self.categories = categories  # people x categories
+        self.totals = totals  # people
+        self.cohort = cohort  # categories + the grand total
+
+    # Helper function to pick the values and bounds a chart shows, as (people x values) arrays and value labels
+    def _chart_values(self, chart):
+        spec = CHART_INPUTS[chart]
+        kind = spec['source'][0]
+        if chart not in ERROR_BAR_CHARTS:
+            raise ValueError(f'{chart} has no error bars; charts with them: {", ".join(ERROR_BAR_CHARTS)}')
+        if kind == 'activities':
+            order = spec.get('order', CATEGORY_ACTIVITIES[spec['source'][1]])
+            columns = [self.engine.activities.index(activity) for activity in order]
+            return [values[:, columns] for values in (self.activities.mean, self.activities.lower,
+                                                      self.activities.upper)], order
+        if kind == 'category':
+            column = self.engine.categories.index(spec['source'][1])
+            return [values[:, [column]] for values in (self.categories.mean, self.categories.lower,
+                                                       self.categories.upper)], None
+        if kind == 'total':
+            return [values[:, None] for values in (self.totals.mean, self.totals.lower, self.totals.upper)], None
+        return [self.categories.mean, self.categories.lower, self.categories.upper], None
+
+    # The data a bar chart expects and its error bars, {'name': (lower values, upper values)}, to draw with
+    # render_chart(chart, data, errors=errors). Charts of one bar per person get a single lower and upper value.
+    def chart_data(self, chart):
+        (mean, lower, upper), order = self._chart_values(chart)
+        spec = CHART_INPUTS[chart]
+        single = CHART_SPECS[chart]['type'] == 'total'
+        data, errors = {}, {}
+        for name, values, low, high in zip(self.names, masked(mean).tolist(), masked(lower).tolist(),
+                                           masked(upper).tolist()):
+            if spec.get('skip_empty') and not any(values):
+                continue  # Same people as FootprintGraph.chart_data
+            data[name] = dict(zip(order, values)) if spec.get('as_dict') else values
+            errors[name] = (low[0], high[0]) if single else (low, high)
+        return data, errors
+
+
+# Monte Carlo propagation of emission factor and quantity uncertainty through the footprint of a cohort.
+# quantities is (people x activities) in the engine's order, with NaN or masked values for missing answers;
+# factor_uncertainty and quantity_uncertainty are relative standard uncertainties (one for all, or a dictionary
+# by activity). Both are lognormal and mean-preserving, so the means are the point values. A sample draws one
+# multiplier per factor, shared by the whole cohort as the published factor would be, and one per quantity of
+# every person.
+#
+# Per-activity intervals follow in closed form (a product of lognormals is lognormal); category and total intervals
+# come from the samples, drawn for chunks of people at a time. The workers share max_bytes, so each chunk gets
+# max_bytes / workers (but holds at least SEED_BLOCK people). Without quantity uncertainty a chunk's samples are one
+# matrix product per category; with it, every activity adds its own (people x samples) block of noisy emissions to
+# its category, and activities nobody in a block of people has are skipped. Chunks run on worker threads; the result
+# only depends on seed.
+#
+# Quantity noise is slow. It takes one normal draw per person, sample and activity, and drawing them costs most of
+# the time: about 4 s per 1000 people at 10,000 samples on one core with the cohort engine's 17 activities, or
+# about 7 minutes for 100,000 people. That misses the target of seconds. Zero quantities are skipped, and more
+# workers divide the time.
+@stage('aggregation')
+def propagate(engine, quantities, names=None, samples=DEFAULT_SAMPLES, factor_uncertainty=None,
+              quantity_uncertainty=0.0, confidence=DEFAULT_CONFIDENCE, seed=0, max_bytes=DEFAULT_MAX_BYTES,
+              workers=None):
+    quantities = masked(quantities)
+    people, activity_count = quantities.shape
+    names = [f'Person {i + 1}' for i in range(people)] if names is None else list(names)
+    if factor_uncertainty is None:
+        factor_uncertainty = FACTOR_UNCERTAINTY
+    factor_sigma, factor_mu = _lognormal(factor_uncertainty, engine.activities)
+    quantity_sigma, quantity_mu = _lognormal(quantity_uncertainty, engine.activities)
+
+    # Point values and their missing-data masks, exactly as the engine scores them
+    emissions, by_category, totals = engine.score(quantities)
+    activity_missing = np.ma.getmaskarray(emissions)
+    category_missing = np.ma.getmaskarray(by_category)
+    total_missing = np.ma.getmaskarray(totals)
+    point = emissions.filled(0.0)
+
+    # Per-activity intervals: the factor and quantity multipliers combine into one lognormal
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    sigma = np.sqrt(factor_sigma ** 2 + quantity_sigma ** 2)
+    mu = factor_mu + quantity_mu
+    activity_interval = Interval(emissions, np.ma.array(point * np.exp(mu - z * sigma), mask=activity_missing),
+                                 np.ma.array(point * np.exp(mu + z * sigma), mask=activity_missing))
+
+    # Order statistics bounding the interval
+    low = int(round((1 - confidence) / 2 * (samples - 1)))
+    high = int(round((1 + confidence) / 2 * (samples - 1)))
+
+    seeds = np.random.SeedSequence(seed)
+    factors = _multipliers(np.random.default_rng(seeds.spawn(1)[0]), (samples, activity_count), factor_sigma,
+                           factor_mu)
+    columns = [np.flatnonzero(engine.activity_categories == c) for c in range(len(engine.categories))]
+    weighted = quantities.filled(0.0).astype(np.float32) * engine.weights.astype(np.float32)  # Missing count as 0
+    noisy = bool(quantity_sigma.any())
+
+    # Bytes each person takes in a chunk: samples of every category and the total, plus one activity's noisy
+    # emissions. Every worker holds a chunk at once.
+    per_person = samples * 4 * (len(columns) + 1 + (1 if noisy else 0))
+    workers = workers or os.cpu_count() or 1
+    chunk = max(SEED_BLOCK, max_bytes // workers // per_person // SEED_BLOCK * SEED_BLOCK)
+    starts = list(range(0, people, chunk))
+    workers = min(workers, len(starts))
+    block_seeds = seeds.spawn(-(-people // SEED_BLOCK) + 1)[1:]
+
+    category_lower = np.zeros((people, len(columns)))
+    category_upper = np.zeros((people, len(columns)))
+    total_lower = np.zeros(people)
+    total_upper = np.zeros(people)
+
+    def simulate(start):
+        stop = min(start + chunk, people)
+        chunk_quantities = weighted[start:stop]
+        size = stop - start
+        blocks = [(slice(row, min(row + SEED_BLOCK, size)), np.random.default_rng(block_seed))
+                  for row, block_seed in zip(range(0, size, SEED_BLOCK), block_seeds[start // SEED_BLOCK:])]
+        total = np.zeros((size, samples), dtype=np.float32)
+        cohort = np.zeros((samples, len(columns)))
+        for c, cols in enumerate(columns):
+            if noisy:
+                values = np.zeros((size, samples), dtype=np.float32)
+                for a in cols:
+                    if not chunk_quantities[:, a].any():
+                        continue
+                    if quantity_sigma[a]:
+                        # Quantity multipliers scaled in place by the quantity and the sampled factor. Each block
+                        # draws from its own stream; one with none of the activity draws nothing.
+                        term = np.zeros((size, samples), dtype=np.float32)
+                        for rows, rng in blocks:
+                            if chunk_quantities[rows, a].any():
+                                rng.standard_normal(out=term[rows], dtype=np.float32)
+                        term *= quantity_sigma[a].astype(np.float32)
+                        term += quantity_mu[a].astype(np.float32)
+                        np.exp(term, out=term)
+                        term *= factors[:, a]
+                        term *= chunk_quantities[:, a, None]
+                    else:
+                        term = np.multiply.outer(chunk_quantities[:, a], factors[:, a])
+                    values += term
+            else:
+                values = chunk_quantities[:, cols] @ factors[:, cols].T
+            total += values
+            cohort[:, c] = values.sum(axis=0, dtype=np.float64)
+            category_lower[start:stop, c], category_upper[start:stop, c] = _bounds(values, low, high)
+        total_lower[start:stop], total_upper[start:stop] = _bounds(total, low, high)
+        return cohort
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            cohort_samples = sum(executor.map(simulate, starts))
+    else:
+        cohort_samples = sum(map(simulate, starts))
+
+    # The cohort's totals (missing answers count as nothing), per category and overall
+    cohort_samples = np.column_stack([cohort_samples, cohort_samples.sum(axis=1)])
+    cohort_samples.sort(axis=0)
+    cohort_point = engine.category_totals(emissions=point).sum(axis=0)
+    cohort_point = np.append(cohort_point, cohort_point.sum())
+    cohort = Interval(cohort_point, cohort_samples[low], cohort_samples[high])
+
+    return UncertaintyResult(
+        names, engine, samples, confidence, activity_interval,
+        Interval(by_category, np.ma.array(category_lower, mask=category_missing),
+                 np.ma.array(category_upper, mask=category_missing)),
+        Interval(totals, np.ma.array(total_lower, mask=total_missing), np.ma.array(total_upper, mask=total_missing)),
+        cohort)
+
+
+if __name__ == '__main__':
+    from footprint_graph import group_cohort
+
+    engine, names, quantities = group_cohort()
+    result = propagate(engine, quantities, names)
+    print(f'{result.confidence:.0%} intervals from {result.samples} samples (tCO₂e)')
+    for i, name in enumerate(result.names):
+        if result.totals.mean[i] is np.ma.masked:
+            print(f'{name}: missing data')
+            continue
+        print(f'{name}: {result.totals.mean[i]:.2f} [{result.totals.lower[i]:.2f}, {result.totals.upper[i]:.2f}]')
+    print(f'Cohort: {result.cohort.mean[-1]:.2f} [{result.cohort.lower[-1]:.2f}, {result.cohort.upper[-1]:.2f}]')
@@ -0,0 +1,133 @@
+import numpy as np
+
+# Units of the emissions the engine works with
+KG_CO2E = 'kgCO₂e'
+T_CO2E = 'tCO₂e'
+
+# Units quantities can be held in: name -> (dimension, size in the dimension's first unit)
+UNITS = {
+    'kWh': ('energy', 1.0),
+    'Wh': ('energy', 1e-3),
+    'MWh': ('energy', 1e3),
+    'litres': ('volume', 1.0),
+    'ml': ('volume', 1e-3),
+    'cubic metres': ('volume', 1e3),
+    'km': ('distance', 1.0),
+    'm': ('distance', 1e-3),
+    'miles': ('distance', 1.609344),
+    'passenger.km': ('passenger distance', 1.0),
+    'passenger.miles': ('passenger distance', 1.609344),
+    'kg': ('mass', 1.0),
+    'g': ('mass', 1e-3),
+    'tonnes': ('mass', 1e3),
+    KG_CO2E: ('emissions', 1.0),
+    'gCO₂e': ('emissions', 1e-3),
+    T_CO2E: ('emissions', 1e3),
+}
+
+# Other spellings found in workbooks and activity files; case, spaces, dots, dashes and underscores are ignored,
+# so 'KWh', 'passenger-km' and 'kg CO2e' need no entry of their own
+UNIT_ALIASES = {
+    'l': 'litres',
+    'litre': 'litres',
+    'liters': 'litres',
+    'm3': 'cubic metres',
+    'm³': 'cubic metres',
+    'cubic metre': 'cubic metres',
+    'kilometres': 'km',
+    'mile': 'miles',
+    'pkm': 'passenger.km',
+    'kg food': 'kg',
+    'kilograms': 'kg',
+    'grams': 'g',
+    'tonne': 'tonnes',
+    't': 'tonnes',
+}
+
+# Names in code order: a unit's code is its position, and UNSPECIFIED stands for a blank or unknown unit, which
+# converts to and from anything unchanged
+UNIT_NAMES = list(UNITS)
+UNSPECIFIED = len(UNIT_NAMES)
+
+
+# Helper function to reduce a unit's spelling to the form it is looked up by
+def _normalise(text):
+    text = str(text).strip().lower().replace('₂', '2')
+    for separator in ' .-_':
+        text = text.replace(separator, '')
+    return text
+
+
+_LOOKUP = {_normalise(name): code for code, name in enumerate(UNIT_NAMES)}
+_LOOKUP.update({_normalise(alias): _LOOKUP[_normalise(name)] for alias, name in UNIT_ALIASES.items()})
+
+
+# Helper function to precompile every conversion into one (units + 1) x (units + 1) table: a value in the row's
+# unit times the entry is the value in the column's unit. Units of different dimensions give NaN; the last row
+# and column (UNSPECIFIED) are all 1.
+def _conversion_table():
+    dimensions = np.array([UNITS[name][0] for name in UNIT_NAMES], dtype=object)
+    sizes = np.array([UNITS[name][1] for name in UNIT_NAMES])
+    table = np.ones((len(UNIT_NAMES) + 1, len(UNIT_NAMES) + 1))
+    table[:-1, :-1] = np.where(dimensions[:, None] == dimensions[None, :], sizes[:, None] / sizes[None, :], np.nan)
+    return table
+
+
+CONVERSIONS = _conversion_table()
+
+
+# Code of one unit; blank (or None) is UNSPECIFIED
+def unit_code(unit):
+    if unit is None or not str(unit).strip():
+        return UNSPECIFIED
+    code = _LOOKUP.get(_normalise(unit))
+    if code is None:
+        raise ValueError(f'Unknown unit: {unit}')
+    return code
+
+
+# Codes of a whole column of unit names; every distinct name is looked up once. A column of codes is returned as is.
+def unit_codes(units):
+    units = np.asarray(units)
+    if np.issubdtype(units.dtype, np.integer):
+        return units.astype(np.intp, copy=False)
+    lookup = {}
+    positions = np.fromiter((lookup.setdefault(unit, len(lookup)) for unit in units.tolist()), dtype=np.intp,
+                            count=len(units))
+    codes = np.array([unit_code(unit) for unit in lookup], dtype=np.intp)
+    return codes[positions]
+
+
+# Factor converting values in one unit to another, e.g. conversion_factor('kgCO₂e', 'tCO₂e') -> 0.001
+def conversion_factor(from_unit, to_unit):
+    factor = CONVERSIONS[unit_code(from_unit), unit_code(to_unit)]
+    if np.isnan(factor):
+        raise ValueError(f'Cannot convert {from_unit} to {to_unit}')
+    return float(factor)
+
+
+# Values (an array, masked array or number) in one unit converted to another
+def convert(values, from_unit, to_unit):
+    factor = conversion_factor(from_unit, to_unit)
+    if np.ma.isMaskedArray(values):
+        return values * factor
+    return np.asarray(values, dtype=np.float64) * factor
+
+
+# A whole column of values, each in its own unit (names or codes), converted to one unit or a unit per value
+# (e.g. the unit of each record's activity) in a single multiply. Raises ValueError naming every pair of units
+# that can't be converted.
+def convert_column(values, units, to_units):
+    from_codes = unit_codes(units)
+    to_codes = unit_code(to_units) if isinstance(to_units, str) else unit_codes(to_units)
+    factors = CONVERSIONS[from_codes, to_codes]
+    bad = np.isnan(factors)
+    if bad.any():
+        pairs = np.unique(np.broadcast_to(from_codes, bad.shape)[bad] * (UNSPECIFIED + 1)
+                          + np.broadcast_to(to_codes, bad.shape)[bad])
+        raise ValueError('Incompatible units: ' + ', '.join(f'{UNIT_NAMES[pair // (UNSPECIFIED + 1)]} -> '
+                                                            f'{UNIT_NAMES[pair % (UNSPECIFIED + 1)]}'
+                                                            for pair in pairs.tolist()))
+    if np.ma.isMaskedArray(values):
+        return values * factors
+    return np.asarray(values, dtype=np.float64) * factors